@@ -1,10 +1,130 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+from utils.checkpoint import StateStore
+from utils.metrics import metrics, record_cache
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Токен обновляется заранее, если до его истечения осталось меньше, секунд
+TOKEN_REFRESH_MARGIN = float(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "600"))
+
+# Имя состояния (StateStore) с ключами таблиц {имя таблицы: ключ}
+SPREADSHEET_KEYS_STATE = "google_spreadsheet_keys"
+
+
+class GoogleClientManager:
+    """
+    Общие для процесса клиенты Google Sheets: одни учетные данные и один
+    gspread.Client на файл ключа сервисного аккаунта.
+
+    Токен доступа используется до истечения и обновляется заранее
+    (refresh_if_needed), поэтому задача не ждет обновления посреди записи.
+    Таблицы открываются по ключу. Ключ по имени таблицы ищется в Drive один раз
+    и сохраняется в StateStore.
+    """
+
+    def __init__(self, state: StateStore = None, refresh_margin: float = TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._state = state or StateStore()
+        self._clients: Dict[str, gspread.Client] = {}
+        self._credentials: Dict[str, Credentials] = {}
+        self._keys: Optional[Dict[str, str]] = None
+        self._lock = threading.RLock()
+
+    def client(self, credentials_path: str) -> gspread.Client:
+        """Клиент для файла ключа сервисного аккаунта с действующим токеном"""
+        with self._lock:
+            client = self._clients.get(credentials_path)
+            if client is None:
+                credentials = Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
+                self._credentials[credentials_path] = credentials
+                client = self._clients[credentials_path] = gspread.authorize(credentials)
+            self._refresh(credentials_path)
+            return client
+
+    def _refresh(self, credentials_path: str) -> bool:
+        """Обновляет токен, если его нет или он истекает в ближайшие refresh_margin секунд"""
+        credentials = self._credentials[credentials_path]
+        if credentials.token and credentials.expiry is not None:
+            # expiry в google-auth - наивное время UTC
+            remaining = (credentials.expiry - datetime.utcnow()).total_seconds()
+            if remaining > self.refresh_margin:
+                return False
+        credentials.refresh(Request())
+        metrics.inc("google_token_refreshes_total")
+        logger.debug("Токен Google обновлен, действует до %s UTC", credentials.expiry)
+        return True
+
+    def refresh_if_needed(self) -> int:
+        """
+        Заранее обновляет истекающие токены всех клиентов (вызывается из цикла планировщика).
+
+        Returns:
+            int: Количество обновленных токенов
+        """
+        refreshed = 0
+        with self._lock:
+            for credentials_path in list(self._credentials):
+                try:
+                    refreshed += self._refresh(credentials_path)
+                except Exception as e:
+                    logger.warning("Не удалось обновить токен Google для %s: %s", credentials_path, e)
+        return refreshed
+
+    def _spreadsheet_keys(self) -> Dict[str, str]:
+        if self._keys is None:
+            self._keys = self._state.load(SPREADSHEET_KEYS_STATE) or {}
+        return self._keys
+
+    def open(self, name: str, credentials_path: str) -> gspread.Spreadsheet:
+        """
+        Открывает таблицу по имени через сохраненный ключ.
+        Если ключа нет, таблица по ключу не найдена или переименована,
+        ключ ищется по имени в Drive и сохраняется заново.
+        """
+        client = self.client(credentials_path)
+        with self._lock:
+            key = self._spreadsheet_keys().get(name)
+
+        if key is not None:
+            try:
+                spreadsheet = client.open_by_key(key)
+                if spreadsheet.title == name:
+                    record_cache("spreadsheet_keys", hits=1)
+                    return spreadsheet
+                logger.warning("Таблица %s переименована в %s, поиск по имени", name, spreadsheet.title)
+            except gspread.SpreadsheetNotFound:
+                logger.warning("Таблица %s не найдена по сохраненному ключу, поиск по имени", name)
+
+        record_cache("spreadsheet_keys", misses=1)
+        spreadsheet = client.open(name)
+        with self._lock:
+            keys = self._spreadsheet_keys()
+            keys[name] = spreadsheet.id
+            self._state.save(SPREADSHEET_KEYS_STATE, keys)
+        logger.info("Таблица %s: ключ %s", name, spreadsheet.id)
+        return spreadsheet
+
+
+google_clients = GoogleClientManager()
+
 
 def authenticate_google_sheets(credentials_json_path: str) -> gspread.Client:
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    credentials = ServiceAccountCredentials.from_json_keyfile_name(credentials_json_path, scope)
-    return gspread.authorize(credentials)
+    return google_clients.client(credentials_json_path)
+
+
+def open_spreadsheet(name: str, credentials_json_path: str) -> gspread.Spreadsheet:
+    return google_clients.open(name, credentials_json_path)
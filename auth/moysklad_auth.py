@@ -1,18 +1,186 @@
 import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
 import requests
-from typing import Dict
-from requests import Response
-from datetime import datetime, timedelta
+
+from utils.checkpoint import CHECKPOINT_DIR, write_json_atomic
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://api.moysklad.ru/api/remap/1.2/security/token"
+
+# Логин и пароль МойСклад для получения токена ({"username": ..., "password": ...})
+MOYSKLAD_CREDENTIALS_PATH = os.getenv("MOYSKLAD_CREDENTIALS_PATH", "config/moysklad_credentials.json")
+# Кэш токена на диске (права 0600), пустое значение - только в памяти
+MOYSKLAD_TOKEN_CACHE = os.getenv("MOYSKLAD_TOKEN_CACHE", os.path.join(CHECKPOINT_DIR, "moysklad_token.json"))
+
 
 def get_access_token(username: str, password: str) -> str:
-    url = "https://api.moysklad.ru/api/remap/1.2/security/token"
+    url = TOKEN_URL
     credentials = f"{username}:{password}"
     encoded_credentials = base64.b64encode(credentials.encode()).decode()
     headers = {
         "Authorization": f"Basic {encoded_credentials}",
         "Accept-Encoding": "gzip"
     }
-    
+
     response = requests.post(url, headers=headers)
     response.raise_for_status()
-    return response.json().get("access_token") 
\ No newline at end of file
+    return response.json().get("access_token")
+
+
+class TokenManager:
+    """
+    Токен доступа учетной записи МойСклад (организации, utils.tenants).
+
+    Токен берется из памяти, из кэша на диске, из конфигурации или
+    запрашивается по логину и паролю (security/token). Срок действия токена
+    API не сообщает, поэтому токен считается действующим до ответа 401:
+    тогда _get вызывает refresh и повторяет запрос с новым токеном.
+
+    Токен передается по конвейеру строкой, поэтому замененные токены
+    запоминаются: authorize подставляет текущий токен вместо устаревшего,
+    и остальные запросы задачи не получают 401.
+    """
+
+    def __init__(self, credentials_path: str = MOYSKLAD_CREDENTIALS_PATH, cache_path: str = MOYSKLAD_TOKEN_CACHE,
+                 name: str = "default"):
+        self.name = name
+        self.credentials_path = credentials_path
+        self.cache_path = cache_path
+        self._token: Optional[str] = None
+        self._superseded = set()
+        self._lock = threading.Lock()
+
+    def _credentials(self) -> Optional[Dict[str, str]]:
+        if not self.credentials_path:
+            return None
+        try:
+            with open(self.credentials_path, "r", encoding="utf-8") as f:
+                credentials = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not credentials.get("username") or not credentials.get("password"):
+            raise ValueError(f"В {self.credentials_path} нет username или password")
+        return credentials
+
+    def _owner(self, credentials: Optional[Dict[str, str]]) -> str:
+        """Метка учетной записи для кэша: токен другой учетной записи не используется"""
+        username = credentials["username"] if credentials else ""
+        return hashlib.sha256(username.encode()).hexdigest()[:16]
+
+    def _load_cached(self) -> Optional[str]:
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            credentials = self._credentials()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать кэш токена МойСклад: %s", e)
+            return None
+        if cached.get("owner") != self._owner(credentials) or not cached.get("access_token"):
+            return None
+        return cached["access_token"]
+
+    def _save_cached(self, token: str, credentials: Dict[str, str]):
+        if not self.cache_path:
+            return
+        try:
+            write_json_atomic(self.cache_path, {"access_token": token, "owner": self._owner(credentials),
+                                                "obtained": int(time.time())}, mode=0o600)
+        except OSError as e:
+            logger.warning("Не удалось сохранить кэш токена МойСклад: %s", e)
+
+    def token(self, initial: str = None) -> str:
+        """
+        Действующий токен без лишних запросов к security/token.
+
+        Args:
+            initial: Токен из конфигурации (config.MOYSKLAD_TOKEN), используется,
+                если в памяти и на диске токена нет
+        """
+        with self._lock:
+            if self._token is None:
+                self._token = self._load_cached() or initial or None
+                if self._token is None:
+                    self._token = self._obtain()
+            return self._token
+
+    def _obtain(self) -> str:
+        credentials = self._credentials()
+        if credentials is None:
+            raise RuntimeError(f"Нет токена МойСклад и файла с логином и паролем {self.credentials_path}")
+        token = get_access_token(credentials["username"], credentials["password"])
+        if not token:
+            raise RuntimeError("security/token не вернул access_token")
+        metrics.inc("moysklad_token_refreshes_total", tenant=self.name)
+        self._save_cached(token, credentials)
+        logger.info("Получен новый токен МойСклад")
+        return token
+
+    def refresh(self, stale: str) -> Optional[str]:
+        """
+        Заменяет токен, на который API ответил 401. Если другой поток уже
+        заменил его, возвращает текущий токен без нового запроса.
+
+        Returns:
+            Новый токен или None, если получить его нельзя (нет логина и пароля)
+        """
+        with self._lock:
+            if self._token is not None and stale != self._token:
+                return self._token
+            try:
+                token = self._obtain()
+            except Exception as e:
+                logger.error("Не удалось обновить токен МойСклад: %s", e)
+                return None
+            self._superseded.add(stale)
+            self._token = token
+            return token
+
+    def owns(self, token: str) -> bool:
+        """Токен выдан этим менеджером (текущий или уже замененный)"""
+        return token == self._token or token in self._superseded
+
+    def authorize(self, headers: Optional[Dict]) -> Optional[Dict]:
+        """Заголовки с текущим токеном вместо замененного (без изменения исходного словаря)"""
+        if not self._superseded or not headers:
+            return headers
+        authorization = headers.get("Authorization", "")
+        if authorization.startswith("Bearer ") and authorization[7:] in self._superseded:
+            return {**headers, "Authorization": f"Bearer {self._token}"}
+        return headers
+
+
+moysklad_tokens = TokenManager()
+
+# Менеджеры токенов организаций (utils.tenants), включая moysklad_tokens
+_managers: Dict[str, TokenManager] = {moysklad_tokens.name: moysklad_tokens}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(name: str, credentials_path: Optional[str], cache_path: Optional[str]) -> TokenManager:
+    """Менеджер токенов организации name, создается при первом обращении"""
+    with _managers_lock:
+        manager = _managers.get(name)
+        if manager is None:
+            manager = _managers[name] = TokenManager(credentials_path, cache_path, name)
+        return manager
+
+
+def token_manager_for(token: str) -> Optional[TokenManager]:
+    """Менеджер, выдавший токен, или None для токена не из менеджеров (например, в бенчмарках)"""
+    for manager in list(_managers.values()):
+        if manager.owns(token):
+            return manager
+    return None
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import time
+from datetime import date
+
+from services.backfill import DEFAULT_SHARD_DAYS, backfill_sheet1
+from services.google_sheets_handler import get_product_codes_from_sheet
+from services.moysklad_api import fetch_product_details_by_codes
+from sheet_processor import open_spreadsheet, tenant_token
+from utils.checkpoint import CheckpointStore
+from utils.instrumentation import instrumentation
+from utils.logging_config import job_summary, setup_logging
+from utils.rate_limiter import MOYSKLAD_MAX_CONCURRENT
+from utils.tenants import DEFAULT_TENANT, load_tenants
+import config
+
+logger = logging.getLogger("backfill")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Заполнение Листа1 историей заказов и остатков")
+    parser.add_argument("--start", type=date.fromisoformat, help="Первая дата YYYY-MM-DD (по умолчанию из заголовка листа)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Последняя дата YYYY-MM-DD (по умолчанию из заголовка листа)")
+    parser.add_argument("--shard-days", type=int, default=DEFAULT_SHARD_DAYS, help="Размер шарда, дней")
+    parser.add_argument("--workers", type=int, default=MOYSKLAD_MAX_CONCURRENT, help="Параллельно загружаемых шардов")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Организация из TENANTS_PATH")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    started = time.monotonic()
+    ok = False
+    try:
+        with instrumentation.job_span("backfill"):
+            tenants = {tenant.name: tenant for tenant in load_tenants(config)}
+            if args.tenant not in tenants:
+                logger.error("Неизвестная организация %s, доступны: %s", args.tenant, ', '.join(tenants))
+                return 2
+            tenant = tenants[args.tenant]
+            worksheet = open_spreadsheet(tenant).sheet1
+            token = tenant_token(tenant)
+
+            product_codes = get_product_codes_from_sheet(worksheet)
+            # Нужны meta товаров, поэтому данные запрашиваются для всех кодов
+            products = fetch_product_details_by_codes(token, product_codes, {})
+
+            ok = backfill_sheet1(worksheet, token, products, args.start, args.end, args.shard_days, args.workers,
+                                 CheckpointStore(tenant.state_dir))
+        return 0 if ok else 1
+
+    except Exception:
+        logger.exception("Произошла ошибка")
+        return 1
+    finally:
+        logger.info("%s", instrumentation.format_summary("backfill"))
+        logger.info("%s", job_summary("backfill", time.monotonic() - started, ok))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+"""
+Сравнение агрегации страниц заказов (services.order_aggregation) в текущем
+процессе и в пуле процессов на синтетическом наборе (по умолчанию ~100 тыс. заказов).
+
+Страницы entity/customerorder (limit=100, expand с компонентами комплектов, как в
+fetch_orders_by_channels) формируются заранее, поэтому замеряется только разбор
+и агрегация, без загрузки. Результаты всех режимов сравниваются с агрегацией
+в текущем процессе.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_aggregation --orders 100000 --processes 2 4
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.moysklad_stub import SyntheticHandler
+from benchmarks.synthetic_data import generate_dataset, summarize
+from services.order_aggregation import OrderAggregate, OrderAggregator, shutdown_pool
+
+PAGE_LIMIT = 100
+EXPAND = "positions,positions.assortment,positions.assortment.components,state,salesChannel"
+
+
+def build_pages(dataset: Dict, limit: int = PAGE_LIMIT) -> List[bytes]:
+    """Тела ответов entity/customerorder по limit заказов"""
+    handler = SyntheticHandler(dataset)
+    _, data = handler("GET", "https://api.moysklad.ru/api/remap/1.2/entity/customerorder",
+                      {"expand": EXPAND, "limit": len(dataset["orders"])})
+    rows = data["rows"]
+    return [json.dumps({"meta": {"size": len(rows), "limit": limit, "offset": offset},
+                        "rows": rows[offset:offset + limit]}, ensure_ascii=False).encode()
+            for offset in range(0, len(rows), limit)]
+
+
+def aggregate(pages: List[bytes], processes: int) -> OrderAggregate:
+    aggregator = OrderAggregator(processes=processes, channels=True)
+    for content in pages:
+        aggregator.submit(content)
+    return aggregator.result()
+
+
+def same(left: OrderAggregate, right: OrderAggregate) -> bool:
+    return all(getattr(left, field) == getattr(right, field) for field in OrderAggregate.__slots__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Агрегация страниц заказов в процессе и в пуле процессов")
+    parser.add_argument("--orders", type=int, default=100000, help="Примерное количество заказов")
+    parser.add_argument("--products", type=int, default=5000, help="Количество товаров")
+    parser.add_argument("--days", type=int, default=90, help="Глубина истории, дней")
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4], help="Размеры пула")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого режима (берется лучший)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dataset = generate_dataset(args.products, days=args.days, orders_per_day=max(1, args.orders // args.days))
+    print(", ".join(f"{key}={value}" for key, value in summarize(dataset).items()))
+    pages = build_pages(dataset)
+    print(f"Страниц: {len(pages)}, {sum(len(page) for page in pages) / 1024 / 1024:.1f} МБ")
+
+    expected = None
+    baseline = None
+    print(f"{'режим':<12} {'лучшее, с':>10} {'первый, с':>10} {'ускорение':>10} {'совпадает':>10}")
+    for processes in [1] + args.processes:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = aggregate(pages, processes)
+            timings.append(time.perf_counter() - started)
+        if expected is None:
+            expected, baseline = result, min(timings)
+        mode = "процесс" if processes == 1 else f"пул x{processes}"
+        # Первый запуск пула включает запуск процессов
+        print(f"{mode:<12} {min(timings):>10.2f} {timings[0]:>10.2f} {baseline / min(timings):>9.2f}x "
+              f"{'да' if same(result, expected) else 'НЕТ':>10}")
+
+    shutdown_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
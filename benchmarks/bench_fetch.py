@@ -0,0 +1,153 @@
+"""
+Бенчмарк функций загрузки services.moysklad_api на локальной замене API МойСклад.
+
+Для каждой функции fetch_* измеряется время, количество запросов по эндпоинтам
+и объем ответов, с --memory - пиковая память и память, занятая результатом. Результат можно сохранить в JSON и сравнивать между изменениями.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_fetch --products 200 --latency 0.05 --json bench.json
+    python -m benchmarks.bench_fetch --fixtures fixtures/moysklad   # записанные ответы
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from benchmarks.moysklad_stub import FixtureHandler, ReplayAdapter, SyntheticHandler, install
+from benchmarks.synthetic_data import SALES_CHANNELS, generate_dataset
+from services import moysklad_api
+from utils.logging_config import setup_logging
+from utils.rate_limiter import MOYSKLAD_MAX_REQUESTS, MOYSKLAD_PERIOD
+
+TOKEN = "benchmark-token"
+
+STATUS_CHANNELS = {status: list(SALES_CHANNELS) for status in ("(Отгружено)", "(Доставляется)", "(Отменен, возврат)")}
+
+
+def build_cases(dataset: Dict, days: int) -> List[tuple]:
+    """Список (название, функция без аргументов) для замера"""
+    codes = [product["code"] for product in dataset["products"]] + [bundle["code"] for bundle in dataset["bundles"]]
+    now = datetime.now()
+    upper = f"{now.strftime('%Y-%m-%d')} 23:59:59"
+    lower = f"{(now - timedelta(days=days - 1)).strftime('%Y-%m-%d')} 00:00:00"
+    dates = [(now - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days)]
+    cache = {}
+
+    def product_details():
+        cache["products"] = moysklad_api.fetch_product_details_by_codes(TOKEN, codes, {})
+        return cache["products"]
+
+    def product_hrefs():
+        return [details.href for details in cache["products"].values() if details.type == "product"]
+
+    return [
+        ("fetch_product_details_by_codes", product_details),
+        ("fetch_orders_by_date_for_products",
+         lambda: moysklad_api.fetch_orders_by_date_for_products(TOKEN, upper, lower, codes)),
+        ("fetch_product_stock",
+         lambda: moysklad_api.fetch_product_stock(TOKEN, product_hrefs(), codes, dates=dates)),
+        ("fetch_customer_orders_for_products",
+         lambda: moysklad_api.fetch_customer_orders_for_products(TOKEN, upper, lower, cache["products"])),
+        ("fetch_changed_order_days",
+         lambda: moysklad_api.fetch_changed_order_days(TOKEN, lower, upper, lower)),
+        ("fetch_product_stock2", lambda: moysklad_api.fetch_product_stock2(TOKEN, codes)),
+        ("fetch_supplies_by_date_range",
+         lambda: moysklad_api.fetch_supplies_by_date_range(TOKEN, now.strftime("%Y-%m-%d"))),
+        ("fetch_orders_by_channels", lambda: moysklad_api.fetch_orders_by_channels(TOKEN, STATUS_CHANNELS)),
+        ("fetch_categories_costs", lambda: moysklad_api.fetch_categories_costs(TOKEN)),
+        ("fetch_stock_CHINA_in_transit", lambda: moysklad_api.fetch_stock_CHINA_in_transit(TOKEN)),
+    ]
+
+
+def run_case(adapter: ReplayAdapter, func: Callable, verbose: bool = False, memory: bool = False) -> Dict:
+    """Выполняет функцию и возвращает время, запросы и объем ответов"""
+    adapter.reset_stats()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    error = None
+    result = None
+    with output:
+        try:
+            result = func()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - started
+    retained = peak = 0
+    if memory:
+        # Пока результат жив, текущая память - это он и кэши, созданные функцией
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    del result
+    return {
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+        "seconds": round(seconds, 4),
+        "requests": adapter.total_requests,
+        "bytes": adapter.total_bytes,
+        "rate_limited": adapter.rate_limited,
+        "endpoints": dict(adapter.requests),
+        "error": error,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки данных МойСклад на локальной замене API")
+    parser.add_argument("--products", type=int, default=50, help="Количество товаров в синтетических данных")
+    parser.add_argument("--bundles", type=int, help="Количество комплектов (по умолчанию 10%% от товаров)")
+    parser.add_argument("--orders-per-day", type=int, help="Заказов в день (по умолчанию 20%% от товаров)")
+    parser.add_argument("--days", type=int, default=90, help="Период заказов и остатков, дней")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора данных")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке, секунды")
+    parser.add_argument("--server-limit", action="store_true",
+                        help=f"Отвечать 429 сверх {MOYSKLAD_MAX_REQUESTS} запросов за {MOYSKLAD_PERIOD:g} с")
+    parser.add_argument("--fixtures", help="Каталог записанных ответов вместо синтетических данных")
+    parser.add_argument("--only", nargs="*", help="Замерять только указанные функции")
+    parser.add_argument("--memory", action="store_true", help="Измерять память (tracemalloc, замедляет прогон)")
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать вывод функций")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Логи функций (уровень LOG_LEVEL) выводятся только с --verbose, предупреждения и ошибки - всегда
+    setup_logging(None if args.verbose else "WARNING")
+    dataset = generate_dataset(args.products, args.bundles, args.days, args.orders_per_day, seed=args.seed)
+    handler = FixtureHandler(args.fixtures) if args.fixtures else SyntheticHandler(dataset)
+    adapter = ReplayAdapter(handler, latency=args.latency, jitter=args.jitter,
+                            max_requests=MOYSKLAD_MAX_REQUESTS if args.server_limit else None,
+                            period=MOYSKLAD_PERIOD)
+    install(adapter)
+
+    results = {}
+    header = f"{'функция':<38} {'сек':>9} {'запросов':>9} {'КБ':>10} {'429':>5}"
+    print(header + (f" {'пик МБ':>8} {'рез. МБ':>8}" if args.memory else ""))
+    for name, func in build_cases(dataset, args.days):
+        if args.only and name not in args.only:
+            continue
+        result = run_case(adapter, func, args.verbose, args.memory)
+        results[name] = result
+        line = f"{name:<38} {result['seconds']:>9.3f} {result['requests']:>9} " \
+               f"{result['bytes'] / 1024:>10.1f} {result['rate_limited']:>5}"
+        if args.memory:
+            line += f" {result['peak_bytes'] / 1024 / 1024:>8.1f} {result['retained_bytes'] / 1024 / 1024:>8.1f}"
+        print(line + (f"  ОШИБКА {result['error']}" if result["error"] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+
+    return 1 if any(result["error"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
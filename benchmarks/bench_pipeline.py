@@ -0,0 +1,78 @@
+"""
+Нагрузочный прогон ночного конвейера (sheet_processor.run_nightly_pipeline)
+на синтетических данных: API МойСклад заменяется benchmarks.moysklad_stub,
+таблица - benchmarks.fake_sheets.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pipeline --products 2000 --orders-per-day 500 --latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.moysklad_stub import ReplayAdapter, SyntheticHandler, install
+from benchmarks.synthetic_data import build_spreadsheet, generate_dataset, summarize
+from utils.logging_config import setup_logging
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон ночного конвейера на синтетических данных")
+    parser.add_argument("--products", type=int, default=200, help="Количество товаров")
+    parser.add_argument("--orders-per-day", type=int, help="Заказов в день (по умолчанию 20%% от товаров)")
+    parser.add_argument("--days", type=int, default=90, help="Глубина истории, дней")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа МойСклад, секунды")
+    parser.add_argument("--workers", type=int, default=4, help="Потоков для стадий конвейера")
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать вывод конвейера")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Логи функций (уровень LOG_LEVEL) выводятся только с --verbose, предупреждения и ошибки - всегда
+    setup_logging(None if args.verbose else "WARNING")
+    # Состояние и контрольные точки прогона не должны попасть в рабочий каталог
+    os.environ.setdefault("CHECKPOINT_DIR", tempfile.mkdtemp(prefix="bench-pipeline-"))
+    os.environ["SHEET1_FULL_RECOMPUTE"] = "1"
+    from sheet_processor import run_nightly_pipeline
+    from utils.instrumentation import instrument_spreadsheet, instrumentation
+    from utils.job_executor import JobExecutor
+
+    dataset = generate_dataset(args.products, days=args.days, orders_per_day=args.orders_per_day)
+    print(", ".join(f"{key}={value}" for key, value in summarize(dataset).items()))
+
+    adapter = ReplayAdapter(SyntheticHandler(dataset), latency=args.latency)
+    install(adapter)
+    spreadsheet = build_spreadsheet(dataset, args.days)
+
+    executor = JobExecutor(max_workers=args.workers, name="bench")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    try:
+        with output, instrumentation.job_span("nightly"):
+            errors = run_nightly_pipeline(instrument_spreadsheet(spreadsheet), "benchmark-token", executor)
+    finally:
+        executor.shutdown()
+    elapsed = time.perf_counter() - started
+
+    print(f"Время: {elapsed:.1f} с")
+    print(f"МойСклад: {adapter.total_requests} запросов, {adapter.total_bytes / 1024 / 1024:.1f} МБ")
+    for endpoint, count in adapter.requests.most_common():
+        print(f"  {endpoint:<45} {count:>8}")
+    stats = spreadsheet.stats
+    print(f"Google Sheets: {stats.total_calls} вызовов, прочитано {stats.cells_read} ячеек, "
+          f"записано {stats.cells_written} ячеек, ожидание квоты {spreadsheet.quota.throttled_seconds:.0f} с")
+    for method, count in stats.calls.most_common():
+        print(f"  {method:<45} {count:>8}")
+    print(instrumentation.format_summary("nightly"))
+    if errors:
+        print(f"Стадии с ошибками: {', '.join(errors)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
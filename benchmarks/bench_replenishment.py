@@ -0,0 +1,71 @@
+"""
+Предложение закупки (services.replenishment) на синтетическом каталоге:
+жадное решение и MILP (PuLP, CBC) с ограничением времени при разных бюджетах.
+
+Спрос распределен по закону Ципфа, остаток - от 0 до 60 дней спроса, часть товаров
+с приемками и товаром в пути, MOQ - 1, 10 или 50 шт. Бюджет задается долей
+суммы, нужной для покрытия всей потребности.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_replenishment --skus 10000 --budget 0.3 0.7
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from services.replenishment import (
+    GREEDY, MILP, plan_greedy, plan_replenishment, replenishment_need
+)
+
+
+def generate_inputs(skus: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    demand = 20.0 / (rng.permutation(skus) + 1) ** 0.8
+    stock = np.floor(demand * rng.uniform(0, 60, skus))
+    incoming = np.where(rng.random(skus) < 0.1, np.floor(demand * rng.uniform(0, 30, skus)), 0.0)
+    transit = np.where(rng.random(skus) < 0.1, np.floor(demand * rng.uniform(0, 30, skus)), 0.0)
+    cost = np.round(rng.lognormal(6, 1, skus), 2)
+    moq = rng.choice([1.0, 10.0, 50.0], skus, p=[0.6, 0.3, 0.1])
+    # Товары без оценки спроса
+    demand[rng.random(skus) < 0.05] = np.nan
+    return demand, stock, incoming, transit, cost, moq
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Предложение закупки: жадное решение и MILP")
+    parser.add_argument("--skus", type=int, nargs="+", default=[1000, 10000], help="Размеры каталога")
+    parser.add_argument("--budget", type=float, nargs="+", default=[0.3, 0.7],
+                        help="Бюджет, доля суммы для покрытия всей потребности")
+    parser.add_argument("--horizon", type=int, default=60, help="Горизонт, дней")
+    parser.add_argument("--time-limit", type=int, default=60, help="Ограничение времени решателя, секунды")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"{'SKU':>7} {'бюджет':>7} {'с потребн.':>10} {'метод':>7} {'сек':>7} {'сумма':>12} {'непокрыто':>10}")
+    for skus in args.skus:
+        demand, stock, incoming, transit, cost, moq = generate_inputs(skus)
+        need = replenishment_need(demand, stock, incoming, transit, args.horizon)
+        full = float((np.maximum(need, moq) * (need > 0)) @ cost)
+        for share in args.budget:
+            budget = full * share
+            for method in (GREEDY, MILP):
+                started = time.perf_counter()
+                if method == GREEDY:
+                    quantities = plan_greedy(need, cost, moq, budget)
+                    total = float(quantities @ cost)
+                    shortage = float(np.maximum(need - quantities, 0).sum())
+                else:
+                    plan = plan_replenishment(need, cost, moq, budget, args.time_limit, max_milp_skus=skus)
+                    total, shortage, method = plan.cost, plan.shortage, plan.method
+                elapsed = time.perf_counter() - started
+                print(f"{skus:>7} {share:>7.0%} {int((need > 0).sum()):>10} {method:>7} {elapsed:>7.1f} "
+                      f"{total:>12.0f} {shortage:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Бенчмарк функций записи Листа1 на таблице в памяти (benchmarks.fake_sheets),
+заполненной синтетическими данными (benchmarks.synthetic_data).
+
+Для каждой функции и каждого размера каталога считаются вызовы API, прочитанные
+и записанные ячейки, объем данных и время ожидания квоты Sheets API.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sheets --skus 1000 10000 50000 --json sheets.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+from benchmarks.fake_sheets import FakeSpreadsheet
+from benchmarks.synthetic_data import build_sheet1_values, generate_dataset, orders_data_from_dataset
+from services import google_sheets_handler
+from services.records import Product
+from utils.logging_config import setup_logging
+
+HEADER_ROW = 5
+
+
+def build_cases(dataset: Dict, days: int) -> List[tuple]:
+    """Список (название, функция(worksheet)) для замера"""
+    today = date.fromisoformat(dataset["today"])
+    recent_days = [(today - timedelta(days=offset)).isoformat() for offset in (1, 0)]
+    full_data = orders_data_from_dataset(dataset, days)
+    recent = set(recent_days)
+    recent_data = [dict(item, orders_by_date={d: q for d, q in item["orders_by_date"].items() if d in recent},
+                        stock_by_date={d: q for d, q in item["stock_by_date"].items() if d in recent})
+                   for item in full_data]
+    products = {item["code"]: Product(item["code"], item["name"], item["category"], item["description"])
+                for item in full_data}
+
+    return [
+        ("get_product_codes_from_sheet", google_sheets_handler.get_product_codes_from_sheet),
+        ("update_product_details_in_sheet",
+         lambda ws: google_sheets_handler.update_product_details_in_sheet(ws, products)),
+        ("update_daily_stats_in_sheet",
+         lambda ws: google_sheets_handler.update_daily_stats_in_sheet(ws, full_data)),
+        ("update_daily_stats_days_in_sheet",
+         lambda ws: google_sheets_handler.update_daily_stats_days_in_sheet(ws, recent_data, recent_days)),
+        ("update_daily_stats_sliding_window", google_sheets_handler.update_daily_stats_sliding_window),
+    ]
+
+
+def run_case(values: List[List], func: Callable[..., object], verbose: bool = False) -> Dict:
+    """Выполняет функцию на свежей копии листа"""
+    spreadsheet = FakeSpreadsheet()
+    worksheet = spreadsheet.add_worksheet("Лист1", rows=len(values), cols=len(values[HEADER_ROW - 1]), values=values)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    error = None
+    started = time.perf_counter()
+    with output:
+        try:
+            func(worksheet)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    result = spreadsheet.stats.as_dict()
+    result.update({
+        "seconds": round(time.perf_counter() - started, 4),
+        "quota_wait_seconds": round(spreadsheet.quota.throttled_seconds, 1),
+        "error": error,
+    })
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк записи Листа1 на таблице в памяти")
+    parser.add_argument("--skus", type=int, nargs="+", default=[1000, 10000, 50000], help="Размеры каталога")
+    parser.add_argument("--days", type=int, default=90, help="Дней в блоке остатков/заказов")
+    parser.add_argument("--orders-per-day", type=int, help="Заказов в день (по умолчанию 20%% от товаров)")
+    parser.add_argument("--only", nargs="*", help="Замерять только указанные функции")
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать вывод функций")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Логи функций (уровень LOG_LEVEL) выводятся только с --verbose, предупреждения и ошибки - всегда
+    setup_logging(None if args.verbose else "WARNING")
+    results = {}
+    print(f"{'SKU':>7} {'функция':<36} {'сек':>8} {'вызовов':>8} {'прочит.':>10} {'записано':>10} {'МБ':>8}")
+    for num_skus in args.skus:
+        # Комплекты тоже занимают строки Листа1, поэтому товаров меньше на их количество
+        num_bundles = num_skus // 11
+        dataset = generate_dataset(num_skus - num_bundles, num_bundles, args.days, args.orders_per_day)
+        values = build_sheet1_values(dataset, args.days)
+        results[num_skus] = {}
+        for name, func in build_cases(dataset, args.days):
+            if args.only and name not in args.only:
+                continue
+            result = run_case(values, func, args.verbose)
+            results[num_skus][name] = result
+            megabytes = (result["bytes_sent"] + result["bytes_received"]) / 1024 / 1024
+            line = f"{num_skus:>7} {name:<36} {result['seconds']:>8.2f} {result['calls']:>8} " \
+                   f"{result['cells_read']:>10} {result['cells_written']:>10} {megabytes:>8.1f}"
+            print(line + (f"  ОШИБКА {result['error']}" if result["error"] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+
+    return 1 if any(r["error"] for by_name in results.values() for r in by_name.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Бенчмарк времени запуска: время импорта модулей точек входа (python -X importtime)
+и полное время запуска команд cli.py до выхода (--help, без обращения к API).
+
+Каждый замер выполняется в новом процессе интерпретатора, берется медиана
+по --repeat запускам. Для импорта sheet_processor и backfill нужен config.py
+(например, через PYTHONPATH).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup --repeat 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["cli", "sheet_processor", "backfill", "fill_dates", "format_columns"]
+
+COMMANDS = [
+    ["cli.py", "--help"],
+    ["cli.py", "run-job", "--help"],
+    ["cli.py", "backfill", "--help"],
+]
+
+# import time:       self [us] |  cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def parse_importtime(stderr: str, module: str) -> Tuple[int, int, List[Tuple[str, int]]]:
+    """
+    Разбирает вывод -X importtime для import module.
+
+    Returns:
+        (время импорта модуля в мкс, количество загруженных им модулей,
+         прямые импорты модуля [(имя, мкс)])
+    """
+    subtree = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        # Вложенные импорты выводятся раньше импортировавшего их модуля
+        level = (len(match.group(3)) - 1) // 2
+        name, cumulative = match.group(4), int(match.group(2))
+        if level == 0:
+            if name == module:
+                children = [(child, us) for child_level, child, us in subtree if child_level == 1]
+                return cumulative, len(subtree) + 1, children
+            subtree = []
+        else:
+            subtree.append((level, name, cumulative))
+    return 0, 0, []
+
+
+def measure_import(module: str, repeat: int) -> Dict:
+    """Время импорта модуля (без запуска интерпретатора): медиана и самые тяжелые прямые импорты"""
+    totals = []
+    loaded = 0
+    children = []
+    error = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=ROOT, env=_env(), capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"код {proc.returncode}"
+            break
+        total, loaded, children = parse_importtime(proc.stderr, module)
+        totals.append(total)
+    return {
+        "ms": round(statistics.median(totals) / 1000, 1) if totals else None,
+        "modules": loaded,
+        "heaviest": sorted(children, key=lambda item: item[1], reverse=True),
+        "error": error,
+    }
+
+
+def measure_command(argv: List[str], repeat: int) -> Dict:
+    """Время от запуска интерпретатора до выхода из команды"""
+    times = []
+    error = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable] + argv, cwd=ROOT, env=_env(), capture_output=True, text=True)
+        times.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"код {proc.returncode}"
+            break
+    return {"ms": round(statistics.median(times) * 1000, 1), "error": error}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк времени запуска точек входа")
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков на замер")
+    parser.add_argument("--top", type=int, default=5, help="Показать самые тяжелые импорты модуля")
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {"imports": {}, "commands": {}}
+
+    # Холодный запуск без __pycache__ не показателен, первый прогон только компилирует модули
+    subprocess.run([sys.executable, "-m", "compileall", "-q", ROOT], capture_output=True)
+
+    print(f"{'импорт':<38} {'мс':>8} {'модулей':>8}")
+    for module in MODULES:
+        result = measure_import(module, args.repeat)
+        results["imports"][module] = result
+        if result["error"]:
+            print(f"{module:<38} {'-':>8} {'-':>8}  ОШИБКА {result['error']}")
+            continue
+        print(f"{module:<38} {result['ms']:>8.1f} {result['modules']:>8}")
+        for name, us in result["heaviest"][:args.top]:
+            print(f"    {name:<34} {us / 1000:>8.1f}")
+
+    print()
+    print(f"{'команда':<38} {'мс':>8}")
+    for command in COMMANDS:
+        name = " ".join(command)
+        result = measure_command(command, args.repeat)
+        results["commands"][name] = result
+        print(f"{name:<38} {result['ms']:>8.1f}" + (f"  ОШИБКА {result['error']}" if result["error"] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "python": sys.version.split()[0], "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+
+    return 1 if any(result["error"] for group in results.values() for result in group.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""
+Хранящаяся в памяти замена таблицы gspread для бенчмарков функций записи листов.
+
+FakeSpreadsheet и FakeWorksheet реализуют методы gspread, которые используют
+services.google_sheets_handler и sheet_processor, считают вызовы API, количество
+прочитанных и записанных ячеек и объем данных, а также моделируют поминутные
+квоты Google Sheets API (по умолчанию 60 чтений и 60 записей в минуту на пользователя).
+
+Формулы не вычисляются: при любом value_render_option возвращается текст формулы.
+"""
+import json
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import gspread
+import requests
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+from gspread.worksheet import ValueRange
+
+READ = "read"
+WRITE = "write"
+
+# Режимы квоты: считать превышения, ждать как реальный клиент или падать с 429
+QUOTA_COUNT = "count"
+QUOTA_WAIT = "wait"
+QUOTA_RAISE = "raise"
+
+
+class SheetsQuota:
+    """
+    Скользящее окно квоты Sheets API по виртуальному времени: если запрос
+    превышает квоту, он "откладывается" до освобождения окна, и задержка
+    накапливается в throttled_seconds (в режиме wait - реально выдерживается).
+    """
+
+    def __init__(self, reads_per_minute: int = 60, writes_per_minute: int = 60, mode: str = QUOTA_COUNT,
+                 period: float = 60.0):
+        self.limits = {READ: reads_per_minute, WRITE: writes_per_minute}
+        self.mode = mode
+        self.period = period
+        self._calls = {READ: deque(), WRITE: deque()}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.throttled_seconds = 0.0
+        self.throttled_calls = 0
+
+    def reset(self):
+        with self._lock:
+            for calls in self._calls.values():
+                calls.clear()
+            self._started = time.monotonic()
+            self.throttled_seconds = 0.0
+            self.throttled_calls = 0
+
+    def check(self, kind: str):
+        with self._lock:
+            calls = self._calls[kind]
+            now = time.monotonic() - self._started + self.throttled_seconds
+            while calls and now - calls[0] >= self.period:
+                calls.popleft()
+            delay = 0.0
+            if len(calls) >= self.limits[kind]:
+                delay = calls[0] + self.period - now
+                if self.mode == QUOTA_RAISE:
+                    raise _quota_error(kind)
+                self.throttled_seconds += delay
+                self.throttled_calls += 1
+                calls.popleft()
+            calls.append(now + delay)
+        if delay and self.mode == QUOTA_WAIT:
+            time.sleep(delay)
+
+
+def _quota_error(kind: str) -> gspread.exceptions.APIError:
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": f"Quota exceeded for quota metric '{kind.title()} requests' per minute per user",
+    }}).encode("utf-8")
+    return gspread.exceptions.APIError(response)
+
+
+class SheetsStats:
+    """Счетчики вызовов API и объема данных"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.total_calls, "by_method": dict(self.calls),
+            "cells_read": self.cells_read, "cells_written": self.cells_written,
+            "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received,
+        }
+
+
+def _payload_size(values) -> int:
+    return len(json.dumps(values, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _format_value(value) -> str:
+    """Отображение значения при FORMATTED_VALUE"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _parse_user_entered(value):
+    """Как Sheets разбирает значение при USER_ENTERED: числа становятся числами"""
+    if isinstance(value, str) and value and not value.startswith("="):
+        try:
+            number = float(value.replace(",", "."))
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def _trim(rows: List[List[Any]]) -> List[List[Any]]:
+    """Как API: без пустых строк и ячеек в конце"""
+    trimmed = []
+    for row in rows:
+        end = len(row)
+        while end and row[end - 1] in ("", None):
+            end -= 1
+        trimmed.append(row[:end])
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class FakeWorksheet:
+    """Лист таблицы в памяти с API gspread.Worksheet (используемое подмножество)"""
+
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, sheet_id: int, rows: int = 1000, cols: int = 26,
+                 values: List[List[Any]] = None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.row_count = rows
+        self.col_count = cols
+        # Начальное содержимое не учитывается в статистике
+        self._cells: List[List[Any]] = [list(row) for row in values or []]
+        if self._cells:
+            self._ensure_size(len(self._cells), max(len(row) for row in self._cells))
+
+    # --- внутреннее хранилище ---
+
+    def _call(self, method: str, kind: str):
+        self.spreadsheet.quota.check(kind)
+        self.spreadsheet.stats.calls[method] += 1
+
+    def _ensure_size(self, rows: int, cols: int):
+        self.row_count = max(self.row_count, rows)
+        self.col_count = max(self.col_count, cols)
+        while len(self._cells) < rows:
+            self._cells.append([])
+        for r in range(rows):
+            row = self._cells[r]
+            if len(row) < cols:
+                row.extend([""] * (cols - len(row)))
+
+    def _write(self, row0: int, col0: int, values: Iterable[Iterable[Any]], raw: bool) -> int:
+        values = [list(row) for row in values]
+        if not values:
+            return 0
+        width = max(len(row) for row in values)
+        self._ensure_size(row0 + len(values), col0 + width)
+        written = 0
+        for r, row in enumerate(values):
+            target = self._cells[row0 + r]
+            for c, value in enumerate(row):
+                # None не меняет ячейку, как в Sheets API
+                if value is None:
+                    continue
+                target[col0 + c] = value if raw else _parse_user_entered(value)
+                written += 1
+        stats = self.spreadsheet.stats
+        stats.cells_written += written
+        stats.bytes_sent += _payload_size(values)
+        return written
+
+    def _read(self, bounds: Tuple[int, int, Optional[int], Optional[int]], formatted: bool = True) -> List[List[Any]]:
+        row0, col0, row1, col1 = bounds
+        row1 = len(self._cells) if row1 is None else min(row1, len(self._cells))
+        rows = []
+        for r in range(row0, row1):
+            row = self._cells[r]
+            end = len(row) if col1 is None else min(col1, len(row))
+            cells = row[col0:end]
+            rows.append([_format_value(v) for v in cells] if formatted else list(cells))
+        rows = _trim(rows)
+        stats = self.spreadsheet.stats
+        stats.cells_read += sum(len(row) for row in rows)
+        stats.bytes_received += _payload_size(rows)
+        return rows
+
+    def _bounds(self, range_name: Optional[str]) -> Tuple[int, int, Optional[int], Optional[int]]:
+        if not range_name:
+            return 0, 0, None, None
+        if "!" in range_name:
+            range_name = range_name.split("!", 1)[1]
+        grid = a1_range_to_grid_range(range_name.replace("'", ""))
+        return (grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0),
+                grid.get("endRowIndex"), grid.get("endColumnIndex"))
+
+    @staticmethod
+    def _formatted(value_render_option) -> bool:
+        return str(getattr(value_render_option, "value", value_render_option) or "FORMATTED_VALUE") != "UNFORMATTED_VALUE"
+
+    @staticmethod
+    def _is_raw(raw: bool, value_input_option) -> bool:
+        if value_input_option:
+            return str(getattr(value_input_option, "value", value_input_option)) == "RAW"
+        return raw
+
+    # --- чтение ---
+
+    def get_all_values(self, range_name: str = None, value_render_option=None, **kwargs) -> List[List[Any]]:
+        self._call("get_all_values", READ)
+        rows = self._read(self._bounds(range_name), self._formatted(value_render_option))
+        width = max((len(row) for row in rows), default=0)
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    def get(self, range_name: str = None, value_render_option=None, **kwargs) -> ValueRange:
+        self._call("get", READ)
+        rows = self._read(self._bounds(range_name), self._formatted(value_render_option))
+        return ValueRange.from_json({"range": f"{self.title}!{range_name or ''}", "majorDimension": "ROWS",
+                                     "values": rows})
+
+    def col_values(self, col: int, value_render_option=None) -> List[Any]:
+        self._call("col_values", READ)
+        rows = self._read((0, col - 1, None, col), self._formatted(value_render_option))
+        values = [row[0] if row else "" for row in rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def row_values(self, row: int, value_render_option=None, **kwargs) -> List[Any]:
+        self._call("row_values", READ)
+        rows = self._read((row - 1, 0, row, None), self._formatted(value_render_option))
+        return rows[0] if rows else []
+
+    def cell(self, row: int, col: int, value_render_option=None) -> gspread.Cell:
+        self._call("cell", READ)
+        rows = self._read((row - 1, col - 1, row, col), self._formatted(value_render_option))
+        return gspread.Cell(row, col, rows[0][0] if rows and rows[0] else "")
+
+    def range(self, *args) -> List[gspread.Cell]:
+        self._call("range", READ)
+        if len(args) == 4:
+            row0, col0, row1, col1 = args[0] - 1, args[1] - 1, args[2], args[3]
+        else:
+            row0, col0, row1, col1 = self._bounds(args[0] if args else None)
+            row1 = len(self._cells) if row1 is None else row1
+            col1 = self.col_count if col1 is None else col1
+        rows = self._read((row0, col0, row1, col1))
+        cells = []
+        for r in range(row0, row1):
+            row = rows[r - row0] if r - row0 < len(rows) else []
+            for c in range(col0, col1):
+                cells.append(gspread.Cell(r + 1, c + 1, row[c - col0] if c - col0 < len(row) else ""))
+        return cells
+
+    # --- запись ---
+
+    def update(self, values=None, range_name: str = None, raw: bool = True, value_input_option=None, **kwargs) -> Dict:
+        if isinstance(range_name, (list, tuple)) and isinstance(values, str):
+            # Старый порядок аргументов update(range_name, values), как в gspread
+            range_name, values = values, range_name
+        self._call("update", WRITE)
+        row0, col0, _, _ = self._bounds(range_name or "A1")
+        written = self._write(row0, col0, values, self._is_raw(raw, value_input_option))
+        return {"updatedRange": f"{self.title}!{range_name}", "updatedCells": written}
+
+    def update_cell(self, row: int, col: int, value) -> Dict:
+        self._call("update_cell", WRITE)
+        self._write(row - 1, col - 1, [[value]], raw=False)
+        return {"updatedRange": f"{self.title}!{rowcol_to_a1(row, col)}", "updatedCells": 1}
+
+    def update_cells(self, cell_list: List[gspread.Cell], value_input_option=None) -> Dict:
+        self._call("update_cells", WRITE)
+        raw = self._is_raw(True, value_input_option)
+        for cell in cell_list:
+            self._write(cell.row - 1, cell.col - 1, [[cell.value]], raw)
+        return {"updatedCells": len(cell_list)}
+
+    def batch_update(self, data: Iterable[Dict], raw: bool = True, value_input_option=None, **kwargs) -> Dict:
+        self._call("batch_update", WRITE)
+        raw = self._is_raw(raw, value_input_option)
+        written = 0
+        for item in data:
+            row0, col0, _, _ = self._bounds(item["range"])
+            written += self._write(row0, col0, item["values"], raw)
+        return {"totalUpdatedCells": written}
+
+    def batch_clear(self, ranges: Iterable[str]) -> Dict:
+        self._call("batch_clear", WRITE)
+        for range_name in ranges:
+            row0, col0, row1, col1 = self._bounds(range_name)
+            row1 = len(self._cells) if row1 is None else min(row1, len(self._cells))
+            for r in range(row0, row1):
+                row = self._cells[r]
+                end = len(row) if col1 is None else min(col1, len(row))
+                for c in range(col0, end):
+                    row[c] = ""
+        return {}
+
+    def add_cols(self, cols: int) -> Dict:
+        self._call("add_cols", WRITE)
+        self.col_count += cols
+        return {}
+
+    def clear(self) -> Dict:
+        self._call("clear", WRITE)
+        self._cells = []
+        return {}
+
+    def snapshot(self) -> List[List[str]]:
+        """Содержимое листа без учета в статистике"""
+        rows = _trim([[_format_value(v) for v in row] for row in self._cells])
+        width = max((len(row) for row in rows), default=0)
+        return [row + [""] * (width - len(row)) for row in rows]
+
+
+class FakeSpreadsheet:
+    """
+    Таблица в памяти с API gspread.Spreadsheet (используемое подмножество).
+
+    Args:
+        title: Название таблицы
+        quota: Модель квоты Sheets API, по умолчанию 60 чтений/60 записей в минуту с подсчетом превышений
+    """
+
+    def __init__(self, title: str = "Benchmark", quota: SheetsQuota = None):
+        self.title = title
+        self.id = f"fake-{title}"
+        self.quota = quota or SheetsQuota()
+        self.stats = SheetsStats()
+        self._worksheets: List[FakeWorksheet] = []
+        self.requests = Counter()  # Типы запросов spreadsheet.batch_update
+
+    def reset_stats(self):
+        self.stats = SheetsStats()
+        self.requests.clear()
+        self.quota.reset()
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, values: List[List[Any]] = None) -> FakeWorksheet:
+        worksheet = FakeWorksheet(self, title, len(self._worksheets), int(rows), int(cols), values)
+        self._worksheets.append(worksheet)
+        return worksheet
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.quota.check(READ)
+        self.stats.calls["worksheet"] += 1
+        for worksheet in self._worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self.quota.check(READ)
+        self.stats.calls["worksheets"] += 1
+        return list(self._worksheets)
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        self.quota.check(READ)
+        self.stats.calls["sheet1"] += 1
+        return self._worksheets[0]
+
+    def batch_update(self, body: Dict) -> Dict:
+        """Запросы форматирования учитываются, но не применяются"""
+        self.quota.check(WRITE)
+        self.stats.calls["spreadsheet.batch_update"] += 1
+        self.stats.bytes_sent += _payload_size(body)
+        for request in body.get("requests", []):
+            self.requests.update(request.keys())
+        return {"spreadsheetId": self.id, "replies": [{} for _ in body.get("requests", [])]}
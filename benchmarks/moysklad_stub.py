@@ -0,0 +1,429 @@
+"""
+Локальная замена API МойСклад для бенчмарков и отладки без обращения к сервису.
+
+ReplayAdapter подключается к сессии services.moysklad_api вместо сетевого
+транспорта requests и отвечает синтетическими (SyntheticHandler) или ранее
+записанными (FixtureHandler, RecordingAdapter) ответами. Адаптер имитирует
+задержку и лимиты МойСклад и считает запросы и объем ответов по эндпоинтам.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+BASE_URL = "https://api.moysklad.ru/api/remap/1.2/"
+TRANSIT_STORE_NAME = "В ПУТИ ИЗ КИТАЯ"
+
+_FILTER_OPERATORS = ("<=", ">=", "!=", "=", "<", ">")
+_UUID_RE = re.compile(r"/[0-9a-f]{8}-[0-9a-f-]{27}")
+
+
+def endpoint_name(url: str) -> str:
+    """Шаблон эндпоинта для статистики: идентификаторы заменяются на {id}"""
+    path = urlsplit(url).path
+    if "/api/remap/1.2/" in path:
+        path = path.split("/api/remap/1.2/", 1)[1]
+    return _UUID_RE.sub("/{id}", path).strip("/")
+
+
+def parse_filter(value: str) -> List[Tuple[str, str, str]]:
+    """Разбирает фильтр МойСклад 'a=b;c<=d' в список (поле, оператор, значение)"""
+    conditions = []
+    for part in value.split(";"):
+        if not part:
+            continue
+        for operator in _FILTER_OPERATORS:
+            field, sep, operand = part.partition(operator)
+            if sep and field and not any(ch in field for ch in "<>!="):
+                conditions.append((field, operator, operand))
+                break
+    return conditions
+
+
+def _compare(left, operator: str, right) -> bool:
+    if operator == "=":
+        return left == right
+    if operator == "!=":
+        return left != right
+    if operator == "<=":
+        return left <= right
+    if operator == ">=":
+        return left >= right
+    if operator == "<":
+        return left < right
+    return left > right
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Транспорт requests, отвечающий через handler(method, url, params) -> (status, body).
+
+    Args:
+        handler: Источник ответов (SyntheticHandler, FixtureHandler)
+        latency: Задержка ответа, секунды
+        jitter: Случайная добавка к задержке, секунды
+        max_requests, period: Лимит запросов за окно (как у МойСклад), превышение -> 429
+    """
+
+    def __init__(self, handler: Callable, latency: float = 0.0, jitter: float = 0.0,
+                 max_requests: Optional[int] = None, period: float = 3.0):
+        super().__init__()
+        self.handler = handler
+        self.latency = latency
+        self.jitter = jitter
+        self.max_requests = max_requests
+        self.period = period
+        self._timestamps = deque()
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.bytes = Counter()
+        self.rate_limited = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes.clear()
+            self.rate_limited = 0
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+    def _over_limit(self) -> bool:
+        if not self.max_requests:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._timestamps and now - self._timestamps[0] >= self.period:
+                self._timestamps.popleft()
+            if len(self._timestamps) >= self.max_requests:
+                self.rate_limited += 1
+                return True
+            self._timestamps.append(now)
+            return False
+
+    def send(self, request, **kwargs):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        endpoint = endpoint_name(request.url)
+        if self._over_limit():
+            status, body = 429, {"errors": [{"error": "Превышено ограничение на количество запросов", "code": 1049}]}
+            headers = {"X-Lognex-Retry-TimeInterval": str(int(self.period * 1000))}
+        else:
+            query = dict(parse_qsl(urlsplit(request.url).query, keep_blank_values=True))
+            status, body = self.handler(request.method, request.url.split("?")[0], query)
+            headers = {}
+
+        content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes[endpoint] += len(content)
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = content
+        response.headers.update({"Content-Type": "application/json;charset=utf-8", **headers})
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if status < 400 else "Error"
+        return response
+
+    def close(self):
+        pass
+
+
+def install(adapter: BaseAdapter, session: requests.Session = None) -> requests.Session:
+    """Подключает адаптер к сессии services.moysklad_api (или к переданной сессии)"""
+    if session is None:
+        from services import moysklad_api
+        session = moysklad_api._session
+    session.mount(BASE_URL.split("/api/")[0] + "/", adapter)
+    return session
+
+
+def uninstall(session: requests.Session = None):
+    """Возвращает сетевой транспорт"""
+    if session is None:
+        from services import moysklad_api
+        session = moysklad_api._session
+    session.mount(BASE_URL.split("/api/")[0] + "/", HTTPAdapter())
+
+
+def _fixture_key(method: str, url: str, params: Dict) -> str:
+    raw = json.dumps([method.upper(), url.split("?")[0], sorted(params.items())], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Сетевой транспорт, сохраняющий ответы в каталог для последующего воспроизведения"""
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        params = dict(parse_qsl(urlsplit(request.url).query, keep_blank_values=True))
+        key = _fixture_key(request.method, request.url, params)
+        try:
+            body = response.json()
+        except ValueError:
+            return response
+        with open(os.path.join(self.directory, f"{key}.json"), "w", encoding="utf-8") as f:
+            json.dump({"method": request.method, "url": request.url.split("?")[0], "params": params,
+                       "status": response.status_code, "body": body}, f, ensure_ascii=False)
+        return response
+
+
+class FixtureHandler:
+    """Отвечает записанными RecordingAdapter ответами, незаписанные запросы -> 404"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __call__(self, method: str, url: str, params: Dict) -> Tuple[int, Dict]:
+        path = os.path.join(self.directory, f"{_fixture_key(method, url, params)}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+        except FileNotFoundError:
+            return 404, {"errors": [{"error": f"Нет записанного ответа для {url}", "code": 404}]}
+        return fixture["status"], fixture["body"]
+
+
+def _meta(entity: str, entity_id: str, entity_type: str = None) -> Dict:
+    return {"href": f"{BASE_URL}entity/{entity}/{entity_id}", "type": entity_type or entity}
+
+
+class SyntheticHandler:
+    """
+    Отвечает на запросы эндпоинтов, которые использует services.moysklad_api,
+    по синтетическому набору данных: entity/product, entity/bundle, entity/store,
+    entity/customerorder, entity/supply (с позициями), entity/saleschannel,
+    report/stock/all, report/stock/bystore. Поддерживаются filter, limit/offset и expand.
+    """
+
+    def __init__(self, dataset: Dict):
+        self.dataset = dataset
+        self.products = {product["id"]: product for product in dataset["products"]}
+        self.bundles = {bundle["id"]: bundle for bundle in dataset["bundles"]}
+        self.stores = {store["id"]: store for store in dataset["stores"]}
+        self.supplies = {supply["id"]: supply for supply in dataset["supplies"]}
+        self.orders = sorted(dataset["orders"], key=lambda order: order["moment"])
+        self.by_code = {item["code"]: ("product", item) for item in dataset["products"]}
+        self.by_code.update({item["code"]: ("bundle", item) for item in dataset["bundles"]})
+        self.transit_store = next((store for store in dataset["stores"] if store["name"] == TRANSIT_STORE_NAME), None)
+
+    def __call__(self, method: str, url: str, params: Dict) -> Tuple[int, Dict]:
+        path = url.split("/api/remap/1.2/", 1)[-1].strip("/")
+        parts = path.split("/")
+        filters = parse_filter(params.get("filter", ""))
+        expand = set(params.get("expand", "").split(",")) - {""}
+
+        if parts[0] == "entity" and len(parts) == 2:
+            entity = parts[1]
+            if entity in ("product", "bundle"):
+                rows = self._assortment_rows(entity, filters, expand)
+            elif entity == "store":
+                rows = [self._store_json(store) for store in self.stores.values()
+                        if self._match({"name": store["name"]}, filters)]
+            elif entity == "customerorder":
+                return 200, self._page(self._orders(filters, expand, params), params)
+            elif entity == "supply":
+                rows = self._supplies(filters)
+            elif entity == "saleschannel":
+                rows = [{"name": name} for name in self.dataset["sales_channels"]]
+            else:
+                return 404, {"errors": [{"error": f"Неизвестная сущность {entity}"}]}
+            return 200, self._page(rows, params)
+
+        if parts[0] == "entity" and len(parts) >= 3:
+            return self._entity_item(parts)
+
+        if path == "report/stock/all":
+            return 200, self._page(self._stock_all(filters), params)
+        if path == "report/stock/bystore":
+            return 200, self._page(self._stock_by_store(filters), params)
+
+        return 404, {"errors": [{"error": f"Неизвестный эндпоинт {path}"}]}
+
+    @staticmethod
+    def _match(values: Dict, filters: List[Tuple[str, str, str]]) -> bool:
+        for field, operator, operand in filters:
+            if field in values and not _compare(values[field], operator, operand):
+                return False
+        return True
+
+    @staticmethod
+    def _page(rows: List[Dict], params: Dict) -> Dict:
+        limit = int(params.get("limit", 1000))
+        offset = int(params.get("offset", 0))
+        return {"meta": {"size": len(rows), "limit": limit, "offset": offset}, "rows": rows[offset:offset + limit]}
+
+    def _product_json(self, product: Dict) -> Dict:
+        return {
+            "meta": _meta("product", product["id"]), "id": product["id"], "code": product["code"],
+            "name": product["name"], "article": product["article"], "description": product["description"],
+            "pathName": product["pathName"], "buyPrice": product["buyPrice"],
+        }
+
+    def _bundle_json(self, bundle: Dict, expand_components: bool) -> Dict:
+        components_meta = {"href": f"{BASE_URL}entity/bundle/{bundle['id']}/components", "type": "bundlecomponent",
+                           "size": len(bundle["components"])}
+        data = {
+            "meta": _meta("bundle", bundle["id"]), "id": bundle["id"], "code": bundle["code"],
+            "name": bundle["name"], "article": bundle["article"], "description": bundle["description"],
+            "pathName": bundle["pathName"], "updated": bundle.get("updated", ""),
+            "components": {"meta": components_meta},
+        }
+        if expand_components:
+            data["components"]["rows"] = [
+                {"quantity": component["quantity"], "assortment": {"meta": _meta("product", component["product_id"])}}
+                for component in bundle["components"]
+            ]
+        return data
+
+    def _store_json(self, store: Dict) -> Dict:
+        return {"meta": _meta("store", store["id"]), "id": store["id"], "name": store["name"]}
+
+    def _assortment_rows(self, entity: str, filters, expand) -> List[Dict]:
+        items = self.products.values() if entity == "product" else self.bundles.values()
+        rows = []
+        for item in items:
+            if not self._match({"code": item["code"], "updated": item.get("updated", "")}, filters):
+                continue
+            if entity == "product":
+                rows.append(self._product_json(item))
+            else:
+                rows.append(self._bundle_json(item, "components" in expand))
+        return rows
+
+    def _assortment_json(self, position: Dict, expand: set) -> Dict:
+        if position["type"] == "product":
+            product = self.products[position["id"]]
+            if "positions.assortment" in expand:
+                return self._product_json(product)
+            return {"meta": _meta("product", product["id"])}
+        bundle = self.bundles[position["id"]]
+        if "positions.assortment" in expand:
+            return self._bundle_json(bundle, "positions.assortment.components" in expand)
+        return {"meta": _meta("bundle", bundle["id"])}
+
+    def _orders(self, filters, expand, params) -> List[Dict]:
+        rows = []
+        for order in self.orders:
+            values = {"moment": order["moment"][:19], "updated": order["updated"][:19]}
+            if not self._match(values, filters):
+                continue
+            data = {
+                "meta": _meta("customerorder", order["id"]), "id": order["id"],
+                "moment": order["moment"], "updated": order["updated"],
+                "state": {"meta": {"type": "state"}}, "salesChannel": {"meta": {"type": "saleschannel"}},
+                "positions": {"meta": {"href": f"{BASE_URL}entity/customerorder/{order['id']}/positions",
+                                       "size": len(order["positions"])}},
+            }
+            if "state" in expand:
+                data["state"] = {"name": order["state"]}
+            if "salesChannel" in expand:
+                data["salesChannel"] = {"name": order["salesChannel"]}
+            if "positions" in expand:
+                data["positions"]["rows"] = [
+                    {"quantity": position["quantity"], "assortment": self._assortment_json(position, expand)}
+                    for position in order["positions"]
+                ]
+            rows.append(data)
+        return rows
+
+    def _supplies(self, filters) -> List[Dict]:
+        rows = []
+        for supply in self.supplies.values():
+            values = {"moment": supply["moment"][:19], "store": f"{BASE_URL}entity/store/{supply['store_id']}"}
+            if not self._match(values, filters):
+                continue
+            rows.append({
+                "meta": _meta("supply", supply["id"]), "id": supply["id"], "moment": supply["moment"],
+                "positions": {"meta": {"href": f"{BASE_URL}entity/supply/{supply['id']}/positions",
+                                       "size": len(supply["positions"])}},
+            })
+        return rows
+
+    def _entity_item(self, parts: List[str]) -> Tuple[int, Dict]:
+        entity, entity_id = parts[1], parts[2]
+        if entity == "product" and entity_id in self.products:
+            return 200, self._product_json(self.products[entity_id])
+        if entity == "bundle" and entity_id in self.bundles:
+            if len(parts) == 4 and parts[3] == "components":
+                bundle = self._bundle_json(self.bundles[entity_id], True)
+                return 200, {"meta": bundle["components"]["meta"], "rows": bundle["components"]["rows"]}
+            return 200, self._bundle_json(self.bundles[entity_id], False)
+        if entity == "supply" and entity_id in self.supplies:
+            supply = self.supplies[entity_id]
+            position_rows = [{
+                "meta": {"href": f"{BASE_URL}entity/supply/{entity_id}/positions/{position['id']}"},
+                "id": position["id"], "quantity": position["quantity"],
+                "assortment": {"meta": _meta("product", position["product_id"])},
+            } for position in supply["positions"]]
+            if len(parts) == 4:
+                return 200, {"meta": {"size": len(position_rows)}, "rows": position_rows}
+            if len(parts) == 5:
+                for row in position_rows:
+                    if row["id"] == parts[4]:
+                        return 200, row
+        return 404, {"errors": [{"error": f"Объект {'/'.join(parts)} не найден"}]}
+
+    def _stock_all(self, filters) -> List[Dict]:
+        product_ids = None
+        moment = None
+        transit = False
+        for field, operator, operand in filters:
+            if field == "product" and operator == "=":
+                product_ids = product_ids or set()
+                product_ids.add(operand.split("?")[0].rstrip("/").rsplit("/", 1)[-1])
+            elif field == "moment":
+                moment = operand[:10]
+            elif field == "store" and operator == "=":
+                store_id = operand.rstrip("/").rsplit("/", 1)[-1]
+                transit = self.stores.get(store_id, {}).get("name") == TRANSIT_STORE_NAME
+
+        day = moment or date.today().isoformat()
+        rows = []
+        for product in self.products.values():
+            if product_ids is not None and product["id"] not in product_ids:
+                continue
+            if transit:
+                stock = self.dataset["transit_stock"].get(product["id"], 0)
+            else:
+                stock = self.dataset["stock"].get(product["id"], {}).get(day, 0)
+            rows.append({
+                "meta": {"href": f"{BASE_URL}entity/product/{product['id']}?expand=supplier", "type": "product"},
+                "code": product["code"], "name": product["name"], "stock": float(stock),
+                "price": float(product["buyPrice"]["value"]), "folder": product["folder"],
+            })
+        return rows
+
+    def _stock_by_store(self, filters) -> List[Dict]:
+        rows = []
+        for product_id, quantity in self.dataset["transit_stock"].items():
+            rows.append({
+                "meta": {"href": f"{BASE_URL}entity/product/{product_id}", "type": "product"},
+                "stockByStore": [{"name": TRANSIT_STORE_NAME, "stock": float(quantity)}],
+            })
+        return rows
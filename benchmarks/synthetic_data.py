@@ -0,0 +1,302 @@
+"""
+Генератор синтетических данных МойСклад для нагрузочного тестирования.
+
+generate_dataset строит согласованный набор: папки с иерархией, товары, комплекты
+с компонентами, склады (включая "В ПУТИ ИЗ КИТАЯ"), заказы покупателей со статусами
+и каналами продаж, приемки и остатки по дням, которые уменьшаются на заказанное
+количество и пополняются приемками. Набор используется benchmarks.moysklad_stub
+(SyntheticHandler) и для заполнения листов benchmarks.fake_sheets (build_spreadsheet).
+
+Запуск из корня репозитория (сводка по набору, при необходимости - сохранение в JSON):
+    python -m benchmarks.synthetic_data --products 10000 --orders-per-day 3000 --json dataset.json
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from benchmarks.fake_sheets import FakeSpreadsheet
+from benchmarks.moysklad_stub import TRANSIT_STORE_NAME
+from services.stock_grid import StockGrid
+
+FOLDERS = {
+    "Одежда": ["Куртки", "Футболки", "Брюки", "Платья"],
+    "Обувь": ["Кроссовки", "Ботинки", "Сандалии"],
+    "Аксессуары": ["Сумки", "Ремни", "Очки", "Часы"],
+    "Дом": ["Текстиль", "Посуда", "Декор"],
+    "Электроника": ["Наушники", "Зарядные устройства", "Чехлы"],
+}
+# Статусы и доли заказов; свежие заказы чаще в статусе "Доставляется"
+STATES = {"Отгружено": 0.70, "Доставляется": 0.15, "Отменен": 0.10, "Возврат": 0.05}
+SALES_CHANNELS = {"Сайт": 0.35, "Ozon": 0.25, "Wildberries": 0.30, "Розница": 0.10}
+# Коэффициенты спроса по дням недели (пн..вс)
+WEEKDAY_FACTORS = (1.10, 1.00, 1.00, 1.00, 1.10, 0.85, 0.75)
+
+
+def _uuid(rng: random.Random) -> str:
+    value = "%032x" % rng.getrandbits(128)
+    return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+def _moment(day: date, seconds: int) -> str:
+    return (datetime.combine(day, datetime.min.time()) + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S.000")
+
+
+def _weighted(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate_dataset(num_products: int = 1000, num_bundles: int = None, days: int = 90, orders_per_day: int = None,
+                     future_supplies: int = None, future_days: int = 30, seed: int = 1, today: date = None) -> Dict:
+    """
+    Генерирует набор данных в формате benchmarks.moysklad_stub.SyntheticHandler.
+
+    Args:
+        num_products (int): Количество товаров
+        num_bundles (int): Количество комплектов, по умолчанию 10% от товаров
+        days (int): Глубина истории заказов и остатков, дней
+        orders_per_day (int): Среднее количество заказов в день, по умолчанию 20% от товаров
+        future_supplies (int): Количество будущих приемок, по умолчанию 5% от товаров
+        future_days (int): Горизонт будущих приемок, дней
+        seed (int): Зерно генератора, одинаковое зерно дает одинаковый набор
+        today (date): Текущая дата набора
+
+    Returns:
+        Dict: Набор данных; дополнительно содержит "orders_by_date" {код: {дата: количество}}
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    num_bundles = max(1, num_products // 10) if num_bundles is None else num_bundles
+    orders_per_day = max(1, num_products // 5) if orders_per_day is None else orders_per_day
+    future_supplies = max(1, num_products // 20) if future_supplies is None else future_supplies
+
+    folders = [{"name": sub, "pathName": top} for top, subs in FOLDERS.items() for sub in subs]
+    stores = [{"id": _uuid(rng), "name": "Основной склад"}, {"id": _uuid(rng), "name": "Склад маркетплейсов"},
+              {"id": _uuid(rng), "name": TRANSIT_STORE_NAME}]
+    main_store, transit_store = stores[0], stores[-1]
+
+    products = []
+    for i in range(num_products):
+        folder = folders[rng.randrange(len(folders))]
+        products.append({
+            "id": _uuid(rng), "code": f"P{i:06d}", "name": f"{folder['name']} {i}", "article": f"A-{i:06d}",
+            "description": f"Артикул A-{i:06d}" if rng.random() < 0.6 else "",
+            "pathName": f"{folder['pathName']}/{folder['name']}", "folder": folder,
+            "buyPrice": {"value": rng.randint(50, 8000) * 100},
+        })
+
+    bundles = []
+    for i in range(num_bundles):
+        components = rng.sample(products, k=min(rng.randint(2, 4), len(products)))
+        updated = today - timedelta(days=rng.randint(0, 365))
+        bundles.append({
+            "id": _uuid(rng), "code": f"B{i:05d}", "name": f"Комплект {i}", "article": "", "description": "",
+            "pathName": "Комплекты", "updated": _moment(updated, rng.randint(0, 86399)),
+            "components": [{"product_id": product["id"], "quantity": rng.randint(1, 3)} for product in components],
+        })
+
+    # Популярность по закону Ципфа: небольшая часть ассортимента дает большую часть заказов
+    assortment = [("product", product) for product in products] + [("bundle", bundle) for bundle in bundles]
+    rng.shuffle(assortment)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(len(assortment))))
+
+    products_by_id = {product["id"]: product for product in products}
+    orders = []
+    orders_by_date = {item["code"]: {} for _, item in assortment}
+    demand = {product["code"]: {} for product in products}  # С учетом компонентов комплектов
+    now = datetime.combine(today, datetime.min.time())
+
+    for day_offset in range(days, 0, -1):
+        day = today - timedelta(days=day_offset)
+        day_str = day.isoformat()
+        count = max(0, int(rng.gauss(orders_per_day * WEEKDAY_FACTORS[day.weekday()], orders_per_day * 0.1)))
+        for _ in range(count):
+            seconds = rng.randint(0, 86399)
+            moment = datetime.combine(day, datetime.min.time()) + timedelta(seconds=seconds)
+            state = _weighted(rng, STATES)
+            if day_offset <= 3 and state == "Отгружено" and rng.random() < 0.5:
+                state = "Доставляется"
+            updated = moment
+            if rng.random() < 0.15:
+                updated = min(moment + timedelta(hours=rng.randint(1, 72)), now)
+
+            positions = []
+            chosen = {}
+            for kind, item in rng.choices(assortment, cum_weights=cum_weights, k=rng.choice((1, 1, 1, 2, 2, 3, 4))):
+                chosen[item["id"]] = (kind, item)
+            for kind, item in chosen.values():
+                quantity = rng.choice((1, 1, 1, 1, 2, 2, 3))
+                positions.append({"type": kind, "id": item["id"], "quantity": quantity})
+                by_date = orders_by_date[item["code"]]
+                by_date[day_str] = by_date.get(day_str, 0) + quantity
+                if kind == "product":
+                    components = [(item, 1)]
+                else:
+                    components = [(products_by_id[c["product_id"]], c["quantity"]) for c in item["components"]]
+                for product, per_unit in components:
+                    product_demand = demand[product["code"]]
+                    product_demand[day_str] = product_demand.get(day_str, 0) + quantity * per_unit
+
+            orders.append({
+                "id": _uuid(rng), "moment": moment.strftime("%Y-%m-%d %H:%M:%S.000"),
+                "updated": updated.strftime("%Y-%m-%d %H:%M:%S.000"),
+                "state": state, "salesChannel": _weighted(rng, SALES_CHANNELS), "positions": positions,
+            })
+
+    # Остатки на конец дня: уменьшаются на спрос, при падении ниже точки заказа приходит партия
+    stock = {}
+    for product in products:
+        level = rng.randint(10, 200)
+        reorder_point = rng.randint(5, 30)
+        by_day = {}
+        product_demand = demand[product["code"]]
+        for day_offset in range(days, -1, -1):
+            day_str = (today - timedelta(days=day_offset)).isoformat()
+            level = max(0, level - product_demand.get(day_str, 0))
+            if level < reorder_point and rng.random() < 0.3:
+                level += rng.randint(20, 150)
+            by_day[day_str] = level
+        stock[product["id"]] = by_day
+
+    supplies = []
+    for _ in range(future_supplies):
+        store = transit_store if rng.random() < 0.2 else main_store
+        supply_day = today + timedelta(days=rng.randint(1, future_days))
+        supplies.append({
+            "id": _uuid(rng), "moment": _moment(supply_day, rng.randint(8, 18) * 3600), "store_id": store["id"],
+            "positions": [{"id": _uuid(rng), "product_id": product["id"], "quantity": rng.randint(10, 200)}
+                          for product in rng.sample(products, k=min(rng.randint(1, 8), len(products)))],
+        })
+
+    transit_stock = {product["id"]: rng.randint(5, 100)
+                     for product in rng.sample(products, k=max(1, num_products // 10))}
+
+    return {
+        "products": products, "bundles": bundles, "stores": stores, "folders": folders, "orders": orders,
+        "supplies": supplies, "stock": stock, "transit_stock": transit_stock,
+        "sales_channels": list(SALES_CHANNELS), "states": list(STATES),
+        "orders_by_date": orders_by_date, "today": today.isoformat(),
+    }
+
+
+def _codes(dataset: Dict) -> List[str]:
+    return [product["code"] for product in dataset["products"]] + [bundle["code"] for bundle in dataset["bundles"]]
+
+
+def orders_data_from_dataset(dataset: Dict, days: int = 90) -> List[Dict]:
+    """Ожидаемый результат fetch_customer_orders_for_products для товаров и комплектов набора"""
+    today = date.fromisoformat(dataset["today"])
+    window = {(today - timedelta(days=offset)).isoformat() for offset in range(days)}
+    stock_by_code = {product["code"]: dataset["stock"][product["id"]] for product in dataset["products"]}
+    result = []
+    for item in dataset["products"] + dataset["bundles"]:
+        code = item["code"]
+        stock_by_date = {day: qty for day, qty in stock_by_code.get(code, {}).items() if day in window}
+        orders_by_date = {day: qty for day, qty in dataset["orders_by_date"][code].items() if day in window}
+        result.append({
+            "code": code, "name": item["name"], "category": item["pathName"], "description": item["description"],
+            "orders_by_date": orders_by_date, "stock_by_date": stock_by_date,
+            "stock": stock_by_date.get(today.isoformat(), 0),
+        })
+    return result
+
+
+def build_sheet1_values(dataset: Dict, days: int = 90, details: float = 0.9) -> List[List]:
+    """
+    Лист1: строки 1-4 служебные, заголовок в строке 5, товары с 6 строки,
+    блок остатков/заказов с колонки E за days дней, заполненный по данным набора.
+
+    Args:
+        details (float): Доля товаров с уже заполненными категорией/названием
+    """
+    today = date.fromisoformat(dataset["today"])
+    codes = _codes(dataset)
+    grid = StockGrid(codes, [(today - timedelta(days=offset)).toordinal() for offset in range(days - 1, -1, -1)])
+    grid.apply_orders_data(orders_data_from_dataset(dataset, days))
+    block = grid.to_values(include_header=True)
+
+    items = {item["code"]: item for item in dataset["products"] + dataset["bundles"]}
+    rows = [[""] * 4 for _ in range(4)]
+    rows.append(["Код", "Категория", "Наименование", "Описание"] + block[0])
+    for i, (code, values) in enumerate(zip(codes, block[1:])):
+        item = items[code]
+        filled = (i * 7919) % 1000 < details * 1000
+        info = [item["pathName"], item["name"], item["description"]] if filled else ["", "", ""]
+        rows.append([code] + info + values)
+    return rows
+
+
+def build_sheet6_values(dataset: Dict, future_days: int = 30) -> List[List]:
+    """Лист6: даты приемок в строке 2 начиная с E, коды товаров с 4-й строки"""
+    today = date.fromisoformat(dataset["today"])
+    dates = [(today + timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(future_days + 1)]
+    rows = [["", "", "", ""], ["", "", "", ""] + dates, ["Код", "Наименование", "Категория", "Остаток"]]
+    rows.extend([product["code"], product["name"], product["pathName"], ""] for product in dataset["products"])
+    return rows
+
+
+def build_sheet5_values(dataset: Dict, days: int = 30) -> List[List]:
+    """Лист5: даты в строке 1 начиная с B, в колонке A статусы с каналами, 'Остатки' и 'Заказано В пути' по категориям"""
+    today = date.fromisoformat(dataset["today"])
+    rows = [[""] + [(today - timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(days, 0, -1)]]
+    for state in ("(Отгружено)", "(Доставляется)", "(Отменен, возврат)"):
+        rows.append([state])
+        rows.extend([channel] for channel in dataset["sales_channels"])
+    rows.append(["\\"])
+    categories = sorted({folder["name"] for folder in dataset["folders"]}
+                        | {folder["pathName"] for folder in dataset["folders"]} | {"Всего"})
+    rows.append(["Остатки"])
+    rows.extend([category] for category in categories)
+    rows.append(["Заказано В пути"])
+    rows.extend([category] for category in sorted({product["pathName"] for product in dataset["products"]}))
+    return rows
+
+
+def build_spreadsheet(dataset: Dict, days: int = 90, future_days: int = 30, quota=None) -> FakeSpreadsheet:
+    """Таблица в памяти с Листом1, Листом6 и Листом5, заполненными по набору"""
+    spreadsheet = FakeSpreadsheet(quota=quota)
+    for title, values in (("Лист1", build_sheet1_values(dataset, days)),
+                          ("Лист6", build_sheet6_values(dataset, future_days)),
+                          ("Лист5", build_sheet5_values(dataset))):
+        spreadsheet.add_worksheet(title, rows=len(values), cols=max(len(row) for row in values), values=values)
+    return spreadsheet
+
+
+def summarize(dataset: Dict) -> Dict:
+    """Размеры набора"""
+    return {
+        "products": len(dataset["products"]), "bundles": len(dataset["bundles"]),
+        "folders": len(dataset["folders"]), "stores": len(dataset["stores"]),
+        "orders": len(dataset["orders"]), "positions": sum(len(order["positions"]) for order in dataset["orders"]),
+        "supplies": len(dataset["supplies"]), "stock_points": sum(len(by_day) for by_day in dataset["stock"].values()),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных МойСклад")
+    parser.add_argument("--products", type=int, default=1000, help="Количество товаров")
+    parser.add_argument("--bundles", type=int, help="Количество комплектов (по умолчанию 10%% от товаров)")
+    parser.add_argument("--orders-per-day", type=int, help="Заказов в день (по умолчанию 20%% от товаров)")
+    parser.add_argument("--days", type=int, default=90, help="Глубина истории, дней")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+    parser.add_argument("--json", help="Сохранить набор в JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dataset = generate_dataset(args.products, args.bundles, args.days, args.orders_per_day, seed=args.seed)
+    for key, value in summarize(dataset).items():
+        print(f"{key:<14} {value:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(dataset, f, ensure_ascii=False)
+        print(f"Набор сохранен в {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
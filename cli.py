@@ -0,0 +1,129 @@
+"""
+Точка входа с подкомандами:
+
+    python cli.py schedule                  # планировщик задач (по умолчанию в main.py)
+    python cli.py run-job nightly           # однократный запуск задачи
+    python cli.py enqueue sheet3            # поставить задачу в очередь (utils.task_queue)
+    python cli.py worker --concurrency 2    # исполнитель задач очереди
+    python cli.py backfill --start 2024-10-01
+    python cli.py fill-dates
+    python cli.py format-columns
+
+Модули подкоманд (gspread, google-auth, pytz, schedule, services.*) импортируются
+только при запуске подкоманды, поэтому разбор аргументов и --help не загружают их.
+Время запуска замеряет benchmarks/bench_startup.py.
+"""
+import argparse
+import sys
+
+from utils.tenants import JOB_NAMES
+
+
+def cmd_schedule(args, rest) -> int:
+    from sheet_processor import process_all_sheets
+    from utils.logging_config import setup_logging
+    from utils.metrics_server import start_metrics_server
+
+    setup_logging()
+    start_metrics_server()
+    return 0 if process_all_sheets() == 0 else 1
+
+
+def cmd_run_job(args, rest) -> int:
+    from sheet_processor import run_job
+    from utils.logging_config import setup_logging
+
+    setup_logging()
+    return run_job(args.job, args.tenant)
+
+
+def cmd_enqueue(args, rest) -> int:
+    from sheet_processor import enqueue_jobs
+    from utils.logging_config import setup_logging
+
+    setup_logging()
+    return enqueue_jobs(args.job, args.tenant, args.queue)
+
+
+def cmd_worker(args, rest) -> int:
+    from sheet_processor import run_worker
+    from utils.logging_config import setup_logging
+    from utils.metrics_server import start_metrics_server
+    from utils.task_queue import DEFAULT_TASK_QUEUE_PATH, TASK_QUEUE_PATH, TaskQueue
+
+    setup_logging()
+    if not args.once:
+        start_metrics_server()
+    queue = TaskQueue(args.queue or TASK_QUEUE_PATH or DEFAULT_TASK_QUEUE_PATH)
+    return run_worker(queue, args.concurrency, args.once)
+
+
+def cmd_backfill(args, rest) -> int:
+    import backfill
+
+    return backfill.main(rest)
+
+
+def cmd_fill_dates(args, rest) -> int:
+    import fill_dates
+
+    fill_dates.main()
+    return 0
+
+
+def cmd_format_columns(args, rest) -> int:
+    import format_columns
+
+    format_columns.main()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Синхронизация МойСклад и Google Sheets")
+    commands = parser.add_subparsers(dest="command", metavar="команда")
+    commands.required = True
+
+    command = commands.add_parser("schedule", help="Запустить планировщик задач")
+    command.set_defaults(handler=cmd_schedule)
+
+    command = commands.add_parser("run-job", help="Выполнить одну задачу и завершиться")
+    command.add_argument("job", choices=JOB_NAMES, help="Задача")
+    command.add_argument("--tenant", action="append",
+                         help="Организация из TENANTS_PATH (можно несколько раз), по умолчанию - все")
+    command.set_defaults(handler=cmd_run_job)
+
+    command = commands.add_parser("enqueue", help="Поставить задачу в очередь для исполнителей")
+    command.add_argument("job", choices=JOB_NAMES, help="Задача")
+    command.add_argument("--tenant", action="append",
+                         help="Организация из TENANTS_PATH (можно несколько раз), по умолчанию - все")
+    command.add_argument("--queue", help="Файл очереди (по умолчанию TASK_QUEUE_PATH или checkpoints/tasks.sqlite3)")
+    command.set_defaults(handler=cmd_enqueue)
+
+    command = commands.add_parser("worker", help="Выполнять задачи из очереди")
+    command.add_argument("--concurrency", type=int, default=1, help="Задач одновременно (по умолчанию 1)")
+    command.add_argument("--once", action="store_true", help="Выполнить готовые задачи и завершиться")
+    command.add_argument("--queue", help="Файл очереди (по умолчанию TASK_QUEUE_PATH или checkpoints/tasks.sqlite3)")
+    command.set_defaults(handler=cmd_worker)
+
+    # Аргументы backfill разбирает backfill.py (python cli.py backfill --help)
+    command = commands.add_parser("backfill", add_help=False, help="Заполнить Лист1 историей заказов и остатков")
+    command.set_defaults(handler=cmd_backfill, passthrough=True)
+
+    command = commands.add_parser("fill-dates", help="Заполнить даты заголовка Листа3 на 90 дней")
+    command.set_defaults(handler=cmd_fill_dates)
+
+    command = commands.add_parser("format-columns", help="Установить ширину столбцов блока остатков Листа1")
+    command.set_defaults(handler=cmd_format_columns)
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if rest and not getattr(args, "passthrough", False):
+        parser.error(f"неизвестные аргументы: {' '.join(rest)}")
+    return args.handler(args, rest)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
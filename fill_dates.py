@@ -1,7 +1,11 @@
-from google.oauth2.service_account import Credentials
-import gspread
+import logging
 from datetime import datetime, timedelta
 
+from auth.google_auth import open_spreadsheet
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
 def fill_dates_in_worksheet(worksheet):
     """
     Заполняет даты в формате дд.мм.гггг начиная с колонки E2 вправо на 90 дней.
@@ -25,36 +29,29 @@ def fill_dates_in_worksheet(worksheet):
         # Обновляем ячейки на листе
         worksheet.update_cells(cell_list)
         
-        print("Даты успешно заполнены на 90 дней.")
+        logger.info("Даты успешно заполнены на 90 дней.")
         
     except Exception as e:
-        print(f"Произошла ошибка при заполнении дат: {str(e)}")
+        logger.error("Произошла ошибка при заполнении дат: %s", e)
 
 def main():
+    setup_logging()
     # Настройки
     CREDENTIALS_PATH = "./cred.json"
     SHEET_NAME = "test"
     WORKSHEET_NAME = "Лист3"
     
     try:
-        # Аутентификация
-        credentials = Credentials.from_service_account_file(
-            CREDENTIALS_PATH,
-            scopes=['https://spreadsheets.google.com/feeds',
-                   'https://www.googleapis.com/auth/drive']
-        )
-        client = gspread.authorize(credentials)
-        
-        # Открываем таблицу и лист
-        spreadsheet = client.open(SHEET_NAME)
+        # Открываем таблицу (общий клиент и сохраненный ключ таблицы) и лист
+        spreadsheet = open_spreadsheet(SHEET_NAME, CREDENTIALS_PATH)
         worksheet = spreadsheet.worksheet(WORKSHEET_NAME)
         
-        print("Начинаем заполнение дат...")
+        logger.info("Начинаем заполнение дат...")
         fill_dates_in_worksheet(worksheet)
-        print("Заполнение завершено!")
+        logger.info("Заполнение завершено!")
         
     except Exception as e:
-        print(f"Произошла ошибка: {str(e)}")
+        logger.error("Произошла ошибка: %s", e)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
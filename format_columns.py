@@ -1,5 +1,9 @@
-from google.oauth2.service_account import Credentials
-import gspread
+import logging
+
+from auth.google_auth import open_spreadsheet
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 def adjust_sliding_window_columns(worksheet):
     """
@@ -61,35 +65,28 @@ def adjust_sliding_window_columns(worksheet):
             "requests": column_updates
         })
         
-        print(f"Ширина столбцов успешно обновлена для {num_pairs} пар столбцов")
+        logger.info("Ширина столбцов успешно обновлена для %s пар столбцов", num_pairs)
         
     except Exception as e:
-        print(f"Произошла ошибка при обновлении ширины столбцов: {str(e)}")
+        logger.error("Произошла ошибка при обновлении ширины столбцов: %s", e)
 
 def main():
+    setup_logging()
     # Настройки
     CREDENTIALS_PATH = "./cred.json"
     SHEET_NAME = "test"
     
     try:
-        # Аутентификация
-        credentials = Credentials.from_service_account_file(
-            CREDENTIALS_PATH,
-            scopes=['https://spreadsheets.google.com/feeds',
-                   'https://www.googleapis.com/auth/drive']
-        )
-        client = gspread.authorize(credentials)
-        
-        # Открываем таблицу
-        spreadsheet = client.open(SHEET_NAME)
+        # Открываем таблицу (общий клиент и сохраненный ключ таблицы)
+        spreadsheet = open_spreadsheet(SHEET_NAME, CREDENTIALS_PATH)
         worksheet = spreadsheet.sheet1
         
-        print("Начинаем обновление ширины столбцов...")
+        logger.info("Начинаем обновление ширины столбцов...")
         adjust_sliding_window_columns(worksheet)
-        print("Обновление завершено!")
+        logger.info("Обновление завершено!")
         
     except Exception as e:
-        print(f"Произошла ошибка: {str(e)}")
+        logger.error("Произошла ошибка: %s", e)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,7 @@
-from sheet_processor import process_all_sheets
+import sys
 
-def main():
-    process_all_sheets()
+from cli import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Запуск без аргументов (CMD в Dockerfile) - планировщик задач
+    sys.exit(main(sys.argv[1:] or ["schedule"]))
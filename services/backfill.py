@@ -0,0 +1,144 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from services.google_sheets_handler import update_daily_stats_in_sheet
+from services.moysklad_api import (
+    build_product_stats, fetch_orders_by_date_for_products, fetch_product_stock, fetch_url_stock_CHINA_in_transit
+)
+from services.records import Product
+from services.stock_grid import StockGrid
+from utils.checkpoint import CheckpointStore, make_run_key
+from utils.job_executor import OK, Job, JobExecutor
+from utils.rate_limiter import MOYSKLAD_MAX_CONCURRENT
+
+logger = logging.getLogger(__name__)
+
+# Размер шарда по умолчанию, дней
+DEFAULT_SHARD_DAYS = 7
+
+
+def split_date_range(start: date, end: date, shard_days: int = DEFAULT_SHARD_DAYS) -> List[Tuple[date, date]]:
+    """Разбивает диапазон дат [start, end] на шарды по shard_days дней"""
+    shards = []
+    shard_start = start
+    while shard_start <= end:
+        shard_end = min(shard_start + timedelta(days=shard_days - 1), end)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end + timedelta(days=1)
+    return shards
+
+
+def _fetch_shard(access_token: str, shard: Tuple[date, date], products: Dict[str, Product], product_hrefs: List[str],
+                 china_transit_url: str, checkpoint: CheckpointStore, run_key: str) -> Dict:
+    """Загружает заказы и остатки одного шарда; готовый шард сохраняется и повторно не загружается"""
+    shard_start, shard_end = shard
+    job = f"backfill-{shard_start.isoformat()}-{shard_end.isoformat()}"
+    done = checkpoint.load(job, run_key)
+    if done:
+        return done
+
+    codes = list(products)
+    orders = fetch_orders_by_date_for_products(access_token, f"{shard_end.isoformat()} 23:59:59",
+                                               f"{shard_start.isoformat()} 00:00:00", codes)
+    days = [(shard_start + timedelta(days=i)).isoformat() for i in range((shard_end - shard_start).days + 1)]
+    stock = fetch_product_stock(access_token, product_hrefs, codes, china_transit_url, dates=days)
+
+    result = {"orders_by_date": orders["orders_by_date"], "stock_by_date": stock}
+    checkpoint.save(job, run_key, result, force=True)
+    return result
+
+
+def backfill_history(access_token: str, products: Dict[str, Product], start: date, end: date,
+                     shard_days: int = DEFAULT_SHARD_DAYS, max_workers: int = MOYSKLAD_MAX_CONCURRENT,
+                     checkpoint: CheckpointStore = None) -> Optional[List[Dict]]:
+    """
+    Загружает историю заказов и остатков за длинный период, разбивая его на шарды,
+    которые загружаются параллельно. Общий лимитер запросов МойСклад соблюдает
+    лимиты учетной записи независимо от количества потоков.
+
+    Готовые шарды сохраняются в checkpoint, поэтому повторный запуск после ошибки
+    загружает только недостающие шарды, а результат не зависит от количества запусков.
+
+    Args:
+        access_token (str): Токен доступа
+        products (Dict[str, Product]): Товары с href (результат fetch_product_details_by_codes)
+        start (date): Первая дата периода
+        end (date): Последняя дата периода
+        shard_days (int): Размер шарда, дней
+        max_workers (int): Количество параллельно загружаемых шардов
+        checkpoint (CheckpointStore): Хранилище готовых шардов
+
+    Returns:
+        List[Dict]: Данные в формате fetch_customer_orders_for_products или None, если часть шардов не загружена
+    """
+    checkpoint = checkpoint or CheckpointStore()
+    china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
+    product_hrefs = sorted({details.href for details in products.values() if details.href})
+    run_key = make_run_key(list(products), product_hrefs)
+
+    shards = split_date_range(start, end, shard_days)
+    logger.info("Backfill %s - %s: %s шардов по %s дней", start.isoformat(), end.isoformat(), len(shards), shard_days)
+
+    results = {}
+
+    def make_job(shard):
+        def run():
+            results[shard] = _fetch_shard(access_token, shard, products, product_hrefs, china_transit_url,
+                                          checkpoint, run_key)
+        return Job(f"{shard[0].isoformat()}-{shard[1].isoformat()}", run)
+
+    executor = JobExecutor(max_workers=max_workers, name="backfill")
+    try:
+        status = executor.run_graph([make_job(shard) for shard in shards])
+    finally:
+        executor.shutdown()
+
+    failed = [name for name, job_status in status.items() if job_status != OK]
+    if failed:
+        logger.warning("Не загружены шарды: %s. Повторный запуск загрузит только их.", ', '.join(failed))
+        return None
+
+    # Шарды не пересекаются по датам, поэтому объединение - простое присваивание
+    orders_by_date = {code: {} for code in products}
+    stocks_by_date = {code: {} for code in products}
+    for shard in shards:
+        for code, by_date in results[shard]["orders_by_date"].items():
+            orders_by_date[code].update(by_date)
+        for code, by_date in results[shard]["stock_by_date"].items():
+            stocks_by_date[code].update(by_date)
+
+    return build_product_stats(products, orders_by_date, stocks_by_date)
+
+
+def backfill_sheet1(worksheet, access_token: str, products: Dict[str, Product], start: date = None, end: date = None,
+                    shard_days: int = DEFAULT_SHARD_DAYS, max_workers: int = MOYSKLAD_MAX_CONCURRENT,
+                    checkpoint: CheckpointStore = None) -> bool:
+    """
+    Заполняет блок остатков/заказов Листа1 историей. По умолчанию период берется
+    из дат в заголовке листа (все колонки блока, в том числе окно 180 дней).
+    Запись - присваивание значений по датам, повторный запуск дает тот же результат.
+
+    Returns:
+        bool: True, если все шарды загружены и лист обновлен
+    """
+    if start is None or end is None:
+        grid = StockGrid.from_sheet_values(worksheet.get_all_values(), max_days=None)
+        dates = [day for day in grid.dates() if day]
+        if not dates:
+            logger.warning("В заголовках листа нет дат, укажите период явно")
+            return False
+        start = start or min(dates)
+        end = end or max(dates)
+
+    checkpoint = checkpoint or CheckpointStore()
+    orders_data = backfill_history(access_token, products, start, end, shard_days, max_workers, checkpoint)
+    if orders_data is None:
+        return False
+
+    update_daily_stats_in_sheet(worksheet, orders_data, max_days=None)
+
+    for shard_start, shard_end in split_date_range(start, end, shard_days):
+        checkpoint.clear(f"backfill-{shard_start.isoformat()}-{shard_end.isoformat()}")
+    logger.info("Backfill завершен")
+    return True
@@ -0,0 +1,154 @@
+"""
+Состав комплектов МойСклад: {href комплекта: ((href компонента, количество), ...)}.
+
+Индекс загружается из entity/bundle (expand=components) и хранится в StateStore,
+поэтому заказы загружаются без positions.assortment.components: состав каждого
+комплекта берется из индекса, а не повторяется в каждой позиции каждого заказа.
+При обновлении запрашиваются только комплекты с updated не раньше
+последнего известного (services.moysklad_api.refresh_bundle_index), раз в
+BUNDLE_INDEX_FULL_REFRESH секунд индекс перестраивается целиком, чтобы убрать
+удаленные комплекты.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.checkpoint import CHECKPOINT_DIR, StateStore
+from utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_INDEX_STATE = "bundle_components"
+# Полное перестроение индекса, секунды
+BUNDLE_INDEX_FULL_REFRESH = float(os.getenv("BUNDLE_INDEX_FULL_REFRESH", str(7 * 24 * 60 * 60)))
+
+Components = Tuple[Tuple[str, float], ...]
+
+
+def components_from_json(rows: Iterable[Dict]) -> Components:
+    """Компоненты из строк components (ответ entity/bundle с expand=components или .../components)"""
+    return tuple((row.get("assortment", {}).get("meta", {}).get("href", "").split("?", 1)[0],
+                  float(row.get("quantity", 1)))
+                 for row in rows)
+
+
+class BundleIndex:
+    """Состав комплектов с сохранением в StateStore (см. описание модуля)"""
+
+    def __init__(self, state: StateStore = None):
+        self._state = state or StateStore()
+        self._bundles: Dict[str, Components] = {}
+        self._updated: Dict[str, str] = {}
+        self.synced: Optional[str] = None  # Наибольший updated загруженных комплектов
+        self.rebuilt_at = 0.0              # Время последнего полного перестроения (unix)
+        self._loaded = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        state = self._state.load(BUNDLE_INDEX_STATE)
+        if not state:
+            return
+        self._bundles = {href: tuple((component, quantity) for component, quantity in components)
+                         for href, components in state.get("bundles", {}).items()}
+        self._updated = state.get("updated", {})
+        self.synced = state.get("synced")
+        self.rebuilt_at = state.get("rebuilt_at", 0.0)
+        logger.info("Индекс комплектов: %s комплектов, обновлен по %s", len(self._bundles), self.synced)
+
+    def save(self):
+        self._state.save(BUNDLE_INDEX_STATE, {
+            "bundles": {href: [list(component) for component in components]
+                        for href, components in self._bundles.items()},
+            "updated": self._updated,
+            "synced": self.synced,
+            "rebuilt_at": self.rebuilt_at,
+        })
+
+    def needs_rebuild(self) -> bool:
+        self.load()
+        return self.synced is None or time.time() - self.rebuilt_at > BUNDLE_INDEX_FULL_REFRESH
+
+    def update(self, rows: List[Dict], rebuild: bool = False) -> int:
+        """
+        Добавляет или заменяет комплекты из ответа entity/bundle (expand=components).
+
+        Args:
+            rows: Комплекты
+            rebuild: rows - все комплекты, остальные удаляются
+
+        Returns:
+            int: Количество новых или измененных комплектов
+        """
+        self.load()
+        if rebuild:
+            self._bundles, self._updated = {}, {}
+            self.rebuilt_at = time.time()
+        changed = 0
+        for row in rows:
+            href = row.get("meta", {}).get("href", "").split("?", 1)[0]
+            updated = row.get("updated", "")
+            if self._updated.get(href) != updated or href not in self._bundles:
+                changed += 1
+            self._bundles[href] = components_from_json(row.get("components", {}).get("rows", []))
+            self._updated[href] = updated
+            # updated - время сервера, поэтому водяной знак не зависит от часов этого процесса
+            if updated and (self.synced is None or updated[:19] > self.synced):
+                self.synced = updated[:19]
+        return changed
+
+    def set(self, href: str, components: Components):
+        """Состав комплекта, загруженный отдельно (комплект появился после обновления индекса)"""
+        self.load()
+        self._bundles[href] = components
+
+    def components(self, href: str) -> Optional[Components]:
+        self.load()
+        return self._bundles.get(href)
+
+    def missing(self, hrefs: Iterable[str]) -> List[str]:
+        """Комплекты из hrefs, которых нет в индексе"""
+        self.load()
+        return sorted({href for href in hrefs if "/entity/bundle/" in href and href not in self._bundles})
+
+    def expand(self, quantities: Dict[str, float]) -> Dict[str, float]:
+        """
+        Количество товаров с комплектами, разложенными на компоненты.
+        Комплект, которого нет в индексе, остается как есть.
+        """
+        self.load()
+        expanded = {}
+        hits = misses = 0
+        for href, quantity in quantities.items():
+            components = self._bundles.get(href) if "/entity/bundle/" in href else None
+            if components is None:
+                misses += "/entity/bundle/" in href
+                expanded[href] = expanded.get(href, 0.0) + quantity
+                continue
+            hits += 1
+            for component, per_bundle in components:
+                expanded[component] = expanded.get(component, 0.0) + quantity * per_bundle
+        if hits or misses:
+            record_cache("bundle_index", hits, misses)
+        return expanded
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._bundles)
+
+
+_indexes: Dict[str, BundleIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bundle_index(state_dir: str = CHECKPOINT_DIR) -> BundleIndex:
+    """Индекс комплектов учетной записи с состоянием в state_dir (у организаций свои, utils.tenants)"""
+    with _indexes_lock:
+        index = _indexes.get(state_dir)
+        if index is None:
+            index = _indexes[state_dir] = BundleIndex(StateStore(state_dir))
+        return index
@@ -0,0 +1,251 @@
+"""
+Куб себестоимости заказов (статус, канал продаж, день) -> сумма для Листа5.
+
+Себестоимость каждого заказа хранится в SQLite вместе с кубом сумм. Куб
+обновляется разницей: при повторной загрузке измененного заказа его прежний
+вклад вычитается, новый прибавляется. Поэтому за ночь загружаются только
+заказы, измененные после водяного знака (services.moysklad_api.update_cost_cube),
+а сумма за любой период - запрос к кубу.
+
+Себестоимость заказа считается по себестоимости товаров на момент загрузки
+заказа и дальше не пересчитывается.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from utils.checkpoint import CHECKPOINT_DIR
+from utils.date_handler import ISO_DAY_FORMAT, day_ordinal, format_day
+
+logger = logging.getLogger(__name__)
+
+COST_CUBE_FILE = "cost_cube.sqlite3"
+# Глубина куба, дней (как у fetch_orders_by_channels)
+COST_CUBE_DAYS = int(os.getenv("COST_CUBE_DAYS", "90"))
+# Полное перестроение куба, секунды: убирает удаленные заказы, которые не видны
+# по количеству, и пересчитывает себестоимость по текущим ценам
+COST_CUBE_FULL_REFRESH = float(os.getenv("COST_CUBE_FULL_REFRESH", str(7 * 24 * 60 * 60)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_costs (
+    id TEXT PRIMARY KEY,
+    updated TEXT NOT NULL,
+    state TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    day TEXT NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS order_costs_day ON order_costs(day);
+CREATE TABLE IF NOT EXISTS cube (
+    state TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    day TEXT NOT NULL,
+    cost REAL NOT NULL,
+    orders INTEGER NOT NULL,
+    PRIMARY KEY (state, channel, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cube_day ON cube(day);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Статусы, которые Лист5 показывает одной строкой
+COMBINED_STATE = "(Отменен, возврат)"
+COMBINED_STATES = ("Отменен", "Возврат")
+
+
+class OrderCost(NamedTuple):
+    """Себестоимость заказа"""
+    id: str
+    updated: str  # updated МойСклад ("YYYY-MM-DD HH:MM:SS")
+    state: str
+    channel: str
+    day: str      # YYYY-MM-DD
+    cost: float
+
+
+class CostCube:
+    """Куб себестоимости в файле SQLite (см. описание модуля)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._transaction() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def watermark(self) -> Optional[str]:
+        """Наибольший updated загруженных заказов ("YYYY-MM-DD HH:MM:SS") или None для пустого куба"""
+        return self._get_meta("watermark")
+
+    def needs_rebuild(self) -> bool:
+        rebuilt_at = self._get_meta("rebuilt_at")
+        return rebuilt_at is None or time.time() - float(rebuilt_at) > COST_CUBE_FULL_REFRESH
+
+    def apply(self, orders: Iterable[OrderCost], rebuild: bool = False) -> int:
+        """
+        Добавляет новые и заменяет измененные заказы.
+
+        Args:
+            orders: Себестоимость заказов
+            rebuild: orders - все заказы, прежнее содержимое удаляется
+
+        Returns:
+            int: Количество заказов
+        """
+        orders = list(orders)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+            watermark = row[0] if row and not rebuild else None
+            if rebuild:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('rebuilt_at', ?)", (str(time.time()),))
+                conn.execute("DELETE FROM order_costs")
+                conn.execute("DELETE FROM cube")
+                conn.executemany("INSERT OR REPLACE INTO order_costs VALUES (?, ?, ?, ?, ?, ?)", orders)
+                conn.execute("INSERT INTO cube SELECT state, channel, day, SUM(cost), COUNT(*) "
+                             "FROM order_costs GROUP BY state, channel, day")
+            else:
+                for order in orders:
+                    old = conn.execute("SELECT state, channel, day, cost FROM order_costs WHERE id = ?",
+                                       (order.id,)).fetchone()
+                    if old is not None:
+                        conn.execute("UPDATE cube SET cost = cost - ?, orders = orders - 1 "
+                                     "WHERE state = ? AND channel = ? AND day = ?", (old[3],) + tuple(old[:3]))
+                    conn.execute("INSERT OR REPLACE INTO order_costs VALUES (?, ?, ?, ?, ?, ?)", order)
+                    conn.execute("INSERT INTO cube VALUES (?, ?, ?, ?, 1) ON CONFLICT (state, channel, day) "
+                                 "DO UPDATE SET cost = cost + excluded.cost, orders = orders + 1",
+                                 (order.state, order.channel, order.day, order.cost))
+                conn.execute("DELETE FROM cube WHERE orders <= 0")
+
+            # updated - время сервера МойСклад, водяной знак не зависит от часов этого процесса
+            latest = max((order.updated for order in orders), default=None)
+            if latest and (watermark is None or latest > watermark):
+                watermark = latest
+            if watermark:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (watermark,))
+        return len(orders)
+
+    def prune(self, before_day: str) -> int:
+        """Удаляет заказы раньше before_day (YYYY-MM-DD)"""
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM order_costs WHERE day < ?", (before_day,)).rowcount
+            conn.execute("DELETE FROM cube WHERE day < ?", (before_day,))
+        return deleted
+
+    def count(self, start_day: str, end_day: str) -> int:
+        """Количество заказов за дни start_day..end_day (YYYY-MM-DD) включительно"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT COALESCE(SUM(orders), 0) FROM cube WHERE day BETWEEN ? AND ?",
+                               (start_day, end_day)).fetchone()
+        return int(row[0])
+
+    def query(self, start_day: str, end_day: str) -> Dict[Tuple[str, str, str], float]:
+        """{(статус, канал, YYYY-MM-DD): сумма} за дни start_day..end_day включительно"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT state, channel, day, cost FROM cube WHERE day BETWEEN ? AND ?",
+                                (start_day, end_day)).fetchall()
+        return {(state, channel, day): cost for state, channel, day, cost in rows}
+
+    def totals(self, start_day: str, end_day: str) -> Dict[Tuple[str, str], float]:
+        """{(статус, канал): сумма} за период start_day..end_day включительно"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT state, channel, SUM(cost) FROM cube WHERE day BETWEEN ? AND ? "
+                                "GROUP BY state, channel", (start_day, end_day)).fetchall()
+        return {(state, channel): cost for state, channel, cost in rows}
+
+    def sales_report(self, status_channels: Dict[str, List[str]],
+                     dates: List[str]) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Отчет для update_sales_report_in_sheet5 за даты листа (как fetch_orders_by_channels):
+        "(Отменен)" и "(Возврат)" входят в строку "(Отменен, возврат)".
+
+        Args:
+            status_channels: {"(статус)": [каналы]} из Листа5
+            dates: Даты заголовка Листа5 (дд.мм.гггг)
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, float]]]: {статус: {канал: {дд.мм.гггг: сумма}}}
+        """
+        report = {status: {channel: {} for channel in channels} for status, channels in status_channels.items()
+                  if status not in ("(Отменен)", "(Возврат)")}
+        days = [ordinal for ordinal in (day_ordinal(value) for value in dates) if ordinal is not None]
+        if not days:
+            return report
+        cells = self.query(format_day(min(days), ISO_DAY_FORMAT), format_day(max(days), ISO_DAY_FORMAT))
+        for (state, channel, day), cost in cells.items():
+            if round(cost, 2) <= 0:
+                continue
+            status = COMBINED_STATE if state in COMBINED_STATES else f"({state})"
+            amounts = report.get(status, {}).get(channel)
+            if amounts is None:
+                continue
+            date_str = format_day(day_ordinal(day))
+            amounts[date_str] = round(amounts.get(date_str, 0.0) + cost, 2)
+        return report
+
+
+def order_fields(order: Dict) -> OrderCost:
+    """
+    Поля куба из строки ответа entity/customerorder (expand=positions,state,salesChannel),
+    себестоимость - 0 (см. with_cost). Строку ответа после этого можно не хранить.
+    """
+    return OrderCost(
+        id=order.get("id", ""),
+        updated=order.get("updated", "")[:19],
+        state=order.get("state", {}).get("name", ""),
+        channel=order.get("salesChannel", {}).get("name", ""),
+        day=order.get("moment", "").split(" ")[0],
+        cost=0.0,
+    )
+
+
+def with_cost(order: OrderCost, quantities: Dict[str, float], costs: Dict[str, float]) -> OrderCost:
+    """
+    Заказ с себестоимостью.
+
+    Args:
+        order: Поля заказа (order_fields)
+        quantities: {href товара: количество} - позиции заказа, комплекты разложены на компоненты
+        costs: {href товара: себестоимость}
+    """
+    # Как в fetch_orders_by_channels: себестоимость заказа округляется вниз до целого
+    return order._replace(cost=int(sum(costs.get(href, 0.0) * quantity for href, quantity in quantities.items())))
+
+
+def order_cost(order: Dict, quantities: Dict[str, float], costs: Dict[str, float]) -> OrderCost:
+    """Себестоимость заказа (строка ответа entity/customerorder), см. with_cost"""
+    return with_cost(order_fields(order), quantities, costs)
+
+
+_cubes: Dict[str, CostCube] = {}
+_cubes_lock = threading.Lock()
+
+
+def get_cost_cube(state_dir: str = CHECKPOINT_DIR) -> CostCube:
+    """Куб учетной записи с файлом в state_dir (у организаций свои, utils.tenants)"""
+    with _cubes_lock:
+        cube = _cubes.get(state_dir)
+        if cube is None:
+            cube = _cubes[state_dir] = CostCube(os.path.join(state_dir, COST_CUBE_FILE))
+        return cube
@@ -0,0 +1,82 @@
+"""
+Оценка спроса по истории остатков и заказов Листа1 (services.stock_grid) сразу
+для всех товаров: массивы NumPy (товары × дни) вместо формул в листе.
+
+Для каждого товара считаются:
+    - средний спрос в день за полные дни окна (сегодняшний день не учитывается);
+    - спрос без дефицита: среднее только по дням, когда товар был в наличии
+      (остаток на конец дня больше нуля или в этот день были заказы);
+    - дней запаса: последний известный остаток / спрос без дефицита;
+    - дата окончания остатка: сегодня + целое число дней запаса.
+"""
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from utils.date_handler import NO_DATE, format_days, today_ordinal
+
+# Заголовки колонок показателей (строка заголовков Листа1, справа от блока остатков/заказов)
+DEMAND_HEADER = ["Спрос/день", "Спрос/день без дефицита", "Дней запаса", "Закончится"]
+
+
+class DemandStats(NamedTuple):
+    """Показатели спроса, массивы по товарам (NaN - нет данных)"""
+    average: np.ndarray   # Средний спрос в день
+    adjusted: np.ndarray  # Средний спрос в дни с остатком
+    stock: np.ndarray     # Последний известный остаток
+    cover: np.ndarray     # Дней запаса (inf - спроса нет)
+    stockout: np.ndarray  # Порядковый номер дня окончания остатка, NO_DATE - не ожидается
+
+
+def demand_stats(stock: np.ndarray, orders: np.ndarray, ordinals: np.ndarray,
+                 as_of: Optional[int] = None) -> DemandStats:
+    """
+    Считает показатели спроса.
+
+    Args:
+        stock: Остатки на конец дня (товары, дни), пустые ячейки - NaN
+        orders: Заказы (товары, дни), пустые ячейки - NaN (заказов не было)
+        ordinals: Порядковые номера дней колонок, NO_DATE - дата не распознана
+        as_of: Текущий день (по умолчанию - сегодня)
+
+    Returns:
+        DemandStats: Показатели по товарам
+    """
+    as_of = today_ordinal() if as_of is None else as_of
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    complete = (ordinals != NO_DATE) & (ordinals < as_of)
+
+    sold = np.nan_to_num(orders[:, complete], nan=0.0)
+    day_stock = stock[:, complete]
+    # NaN-остаток (не заполнен) день не исключает
+    in_stock = ~(day_stock <= 0) | (sold > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average = sold.sum(axis=1) / complete.sum()
+        adjusted = sold.sum(axis=1) / in_stock.sum(axis=1)
+
+    # Последний известный остаток не позже текущего дня
+    known = ~np.isnan(stock) & (ordinals != NO_DATE) & (ordinals <= as_of)
+    has_stock = known.any(axis=1)
+    current = np.full(len(stock), np.nan)
+    if has_stock.any():
+        last = known.shape[1] - 1 - np.argmax(known[:, ::-1], axis=1)
+        current[has_stock] = np.maximum(stock[has_stock, last[has_stock]], 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cover = np.where(adjusted > 0, current / adjusted, np.where(np.isnan(adjusted), np.nan, np.inf))
+    cover = np.where(np.isnan(current), np.nan, cover)
+    finite = np.isfinite(cover)
+    stockout = np.full(len(cover), NO_DATE, dtype=np.int64)
+    stockout[finite] = as_of + np.floor(cover[finite]).astype(np.int64)
+    return DemandStats(average, adjusted, current, cover, stockout)
+
+
+def demand_values(stats: DemandStats) -> List[List]:
+    """Значения колонок DEMAND_HEADER по строкам товаров: пустые показатели -> ""."""
+    columns = []
+    for values, digits in ((stats.average, 2), (stats.adjusted, 2), (stats.cover, 1)):
+        cells = np.round(np.where(np.isfinite(values), values, 0.0), digits).astype(object)
+        cells[~np.isfinite(values)] = ""
+        columns.append(cells.tolist())
+    columns.append(format_days(stats.stockout))
+    return [list(row) for row in zip(*columns)]
@@ -1,8 +1,18 @@
-from typing import List, Dict
+import logging
+import re
+from typing import List, Dict, Sequence
 from datetime import datetime, timedelta
 import string
 import gspread
 
+from services.records import Product
+from services.demand import DEMAND_HEADER, demand_stats, demand_values
+from services.replenishment import REPLENISHMENT_HEADER
+from services.stock_grid import ORDERS, StockGrid
+from utils.date_handler import NO_DATE, day_ordinals, shift_date, today_ordinal
+
+logger = logging.getLogger(__name__)
+
 def get_column_letter(column_number):
     """Преобразует номер столбца в буквенное обозначение"""
     result = ""
@@ -16,12 +26,12 @@ def get_product_codes_from_sheet(worksheet) -> List[str]:
     codes = worksheet.col_values(1)
     return [code for code in codes[5:] if code.strip()]
 
-def get_products_with_details(worksheet, start_row: int = 6) -> Dict[str, Dict]:
+def get_products_with_details(worksheet, start_row: int = 6) -> Dict[str, Product]:
     """
     Gets information about products that are already filled in the table.
     
     Returns:
-        Dict[str, Dict]: {code: {name, category, description}}
+        Dict[str, Product]: {code: Product(code, name, category, description)}
     """
     # Get all values from relevant columns
     all_values = worksheet.get_all_values()
@@ -39,15 +49,16 @@ def get_products_with_details(worksheet, start_row: int = 6) -> Dict[str, Dict]:
                 
             # If at least the name is filled, consider the product info complete
             if len(row) >= 3 and row[2].strip():
-                products[code] = {
-                    "name": row[2].strip(),
-                    "category": row[1].strip() if len(row) >= 2 else "",
-                    "description": row[3].strip() if len(row) >= 4 else ""
-                }
+                products[code] = Product(
+                    code=code,
+                    name=row[2].strip(),
+                    category=row[1].strip() if len(row) >= 2 else "",
+                    description=row[3].strip() if len(row) >= 4 else ""
+                )
     
     return products
 
-def update_product_details_in_sheet(worksheet, products: Dict[str, Dict], start_row: int = 6):
+def update_product_details_in_sheet(worksheet, products: Dict[str, Product], start_row: int = 6):
     """
     Updates only unfilled product information in the sheet using batch updates.
     """
@@ -61,13 +72,13 @@ def update_product_details_in_sheet(worksheet, products: Dict[str, Dict], start_
         if not code.strip() or code in existing_products:
             continue
             
-        product = products.get(code, {})
+        product = products.get(code)
         if product:
             # Create gspread Cell objects for each update
             cells_to_update.extend([
-                gspread.Cell(idx, 2, product.get('category', '')),   # Column B
-                gspread.Cell(idx, 3, product.get('name', '')),       # Column C
-                gspread.Cell(idx, 4, product.get('description', '')) # Column D
+                gspread.Cell(idx, 2, product.category or ''),   # Column B
+                gspread.Cell(idx, 3, product.name or ''),       # Column C
+                gspread.Cell(idx, 4, product.description or '') # Column D
             ])
     
     # Perform batch update if there are cells to update
@@ -82,138 +93,120 @@ def shift_data_left_and_add_new_values(row_data, orders_data, product_idx):
     ]
     return row_data
 
+def demand_stats_update(worksheet, all_data: List[List[str]], grid: StockGrid) -> Dict:
+    """
+    Обновление для batch_update с показателями спроса (services.demand) по истории grid.
+    Колонки показателей - справа от блока остатков/заказов: на месте заголовка
+    DEMAND_HEADER, если он уже есть, иначе после последней заполненной колонки заголовка.
+    """
+    stats = demand_stats(*grid.history())
+    logger.info("Показатели спроса: %s товаров", len(grid.row_index))
+    return _columns_update(worksheet, all_data, grid, DEMAND_HEADER, demand_values(stats))
+
+
+def update_replenishment_in_sheet(worksheet, all_data: List[List[str]], grid: StockGrid,
+                                  quantities: Sequence[float], costs: Sequence[float]):
+    """
+    Записывает предложение закупки (services.replenishment) в колонки REPLENISHMENT_HEADER
+    Листа1 справа от показателей спроса. quantities и costs - по строкам grid.codes.
+    """
+    rows = [[int(quantity), round(quantity * cost, 2)] if quantity > 0 else ["", ""]
+            for quantity, cost in zip(quantities, costs)]
+    worksheet.batch_update([_columns_update(worksheet, all_data, grid, REPLENISHMENT_HEADER, rows)])
+
+
+def _columns_update(worksheet, all_data: List[List[str]], grid: StockGrid, header_cells: List[str],
+                    rows: List[List]) -> Dict:
+    """
+    Обновление для batch_update колонок с заголовком header_cells справа от блока
+    остатков/заказов: на месте заголовка, если он уже есть, иначе после последней
+    заполненной колонки строки заголовков. Строки без кода товара не меняются.
+    """
+    header = all_data[grid.header_row - 1] if len(all_data) >= grid.header_row else []
+    if header_cells[0] in header:
+        first_col = header.index(header_cells[0]) + 1
+    else:
+        filled = [idx for idx, cell in enumerate(header, start=1) if cell.strip()]
+        first_col = max(filled + [grid.first_col + 2 * grid.num_days - 1]) + 1
+    last_col = first_col + len(header_cells) - 1
+    if worksheet.col_count < last_col:
+        worksheet.add_cols(last_col - worksheet.col_count)
+
+    rows = [values if code else [None] * len(header_cells) for code, values in zip(grid.codes, rows)]
+    last_row = grid.header_row + len(rows)
+    return {
+        'range': f'{get_column_letter(first_col)}{grid.header_row}:{get_column_letter(last_col)}{last_row}',
+        'values': [header_cells] + rows
+    }
+
+
 def update_daily_stats_in_sheet(worksheet, orders_data: List[Dict], max_days: int = 90):
+    """
+    Обновляет блок остатков/заказов (E..GB) и показатели спроса по обновленной
+    истории (services.demand). Данные листа загружаются в StockGrid, новые значения
+    записываются векторно; в лист уходят только измененные ячейки строк с кодом
+    товара - по прямоугольнику на отрезок соседних строк.
+    """
     # Получаем все данные с листа
     all_data = worksheet.get_all_values()
-    header_row = all_data[4]
-
-    print("Анализ заголовков:")
-    date_col_map = {}
-    
-    # Перебираем все столбцы начиная с F (индекс 5)
-    for col_idx in range(5, 184, 2):  # шаг 2, так как даты через столбец
-        if col_idx >= len(header_row):
-            break
-            
-        date_str = header_row[col_idx].strip()
-        if date_str:
-            try:
-                print(f"Обработка даты из заголовка: {date_str}")
-                header_date = datetime.strptime(date_str, "%d.%m.%Y")
-                date_str_iso = header_date.strftime("%Y-%m-%d")
-                # Сохраняем и колонку с датой, и колонку для остатка (на 1 левее)
-                date_col_map[date_str_iso] = {
-                    'orders_col': col_idx + 1,
-                    'stock_col': col_idx
-                }
-                print(f"Добавлена дата: {date_str_iso} -> столбцы {get_column_letter(col_idx)} (остаток) и {get_column_letter(col_idx + 1)} (заказы)")
-            except ValueError as e:
-                print(f"Ошибка при обработке даты {date_str}: {e}")
-                continue
-
-    print(f"\nНайдено {len(date_col_map)} дат в заголовках:")
-    for date, cols in sorted(date_col_map.items()):
-        print(f"Дата: {date}, Столбец остатков: {get_column_letter(cols['stock_col'])}, Столбец заказов: {get_column_letter(cols['orders_col'])}")
+    grid = StockGrid.from_sheet_values(all_data, max_days=max_days)
 
-    product_map = {item['code']: item for item in orders_data}
-    updates = []
+    dates = [day for day in grid.dates() if day]
+    if dates:
+        logger.info("Найдено %s дат в заголовках: %s - %s", len(dates), dates[0].strftime('%d.%m.%Y'), dates[-1].strftime('%d.%m.%Y'))
+    else:
+        logger.warning("В заголовках не найдено дат")
 
-    # Перебираем строки с продуктами начиная с 6-й
-    for row_idx in range(5, len(all_data)):
-        row_values = all_data[row_idx]
-        product_code = row_values[0].strip()
+    grid.apply_orders_data(orders_data)
+    updates = grid.changed_ranges()
+    logger.info("Всего подготовлено обновлений: %s ячеек, %s диапазонов", int(grid.changed.sum()), len(updates))
 
-        if not product_code or product_code not in product_map:
-            continue
+    if updates:
+        worksheet.batch_update(updates + [demand_stats_update(worksheet, all_data, grid)])
+        logger.info("Обновление выполнено успешно")
+    else:
+        logger.info("Нет данных для обновления")
 
-        order_info = product_map[product_code]
-        print(f"\nОбработка товара {product_code}")
 
-        orders_by_date = order_info.get("orders_by_date", {})
-        stock_by_date = order_info.get("stock_by_date", {})
-        
-        print(f"Найдено {len(orders_by_date)} дат заказов для товара")
-        matches = 0
-        
-        for date_str, cols in date_col_map.items():
-            # Обновляем количество заказов
-            if date_str in orders_by_date:
-                quantity = orders_by_date[date_str]
-                order_cell = f'{get_column_letter(cols["orders_col"])}{row_idx+1}'
-                updates.append({
-                    'range': order_cell,
-                    'values': [[int(quantity)]]
-                })
-                matches += 1
+def update_daily_stats_days_in_sheet(worksheet, orders_data: List[Dict], days: List[str], max_days: int = 90):
+    """
+    Обновляет в блоке остатков/заказов только колонки указанных дней (YYYY-MM-DD).
+    Заказы за эти дни пересчитаны полностью, поэтому у товаров без заказов ячейки очищаются.
+    """
+    all_data = worksheet.get_all_values()
+    grid = StockGrid.from_sheet_values(all_data, max_days=max_days)
 
-            # Обновляем остаток
-            if date_str in stock_by_date:
-                stock = stock_by_date[date_str]
-                stock_cell = f'{get_column_letter(cols["stock_col"])}{row_idx+1}'
-                updates.append({
-                    'range': stock_cell,
-                    'values': [[int(stock)]]
-                })
+    ordinals = day_ordinals(days)
+    missing = [day for day, slot in zip(days, grid.slots_for(ordinals)) if slot < 0]
+    if missing:
+        logger.warning("Дни отсутствуют в заголовках листа и пропущены: %s", ', '.join(missing))
 
-        print(f"Найдено совпадений дат: {matches} из {len(orders_by_date)}")
+    grid.clear_days(ORDERS, ordinals)
+    grid.apply_orders_data(orders_data)
 
-    print(f"\nВсего подготовлено обновлений: {len(updates)}")
-    
+    updates = grid.changed_ranges()
     if updates:
-        worksheet.batch_update(updates)
-        print("Обновление выполнено успешно")
+        worksheet.batch_update(updates + [demand_stats_update(worksheet, all_data, grid)])
+        logger.info("Обновлены колонки за %s дней", len(days) - len(missing))
     else:
-        print("Нет данных для обновления")
+        logger.info("Нет данных для обновления")
 
 
-def update_daily_stats_sliding_window(worksheet):
+def update_daily_stats_sliding_window(worksheet, days: int = 1):
+    """Сдвигает блок остатков/заказов на days дней влево и добавляет новые даты справа"""
     # Получаем все данные с листа
     all_data = worksheet.get_all_values()
-    header_row = all_data[4]
-    
-    print("Начало обработки sliding windows...")
-    
-    # Находим последнюю дату в заголовках (крайний правый столбец с датой)
-    last_date_str = header_row[-1].strip()
-    last_date = datetime.strptime(last_date_str, "%d.%m.%Y")
-    
-    # Вычисляем новую дату (следующий день)
-    new_date = last_date + timedelta(days=1)
-    new_date_str = new_date.strftime("%d.%m.%Y")
-    
-    print(f"Последняя дата: {last_date.strftime('%d.%m.%Y')}")
-    print(f"Новая дата: {new_date_str}")
-    
-    # Формируем обновления для сдвига данных
-    updates = []
-    
-    # Перебираем все строки начиная с 5-й (где данные)
-    for row_idx, row in enumerate(all_data[4:], start=5):
-        # Сдвигаем данные влево, начиная с колонки E (индекс 4)
-        for col_idx in range(4, len(row)-2):  # -2 чтобы оставить место для новых столбцов
-            cell_value = row[col_idx+2]  # Берем значение из столбца справа
-            updates.append({
-                'range': f'{get_column_letter(col_idx+1)}{row_idx}',
-                'values': [[cell_value]]
-            })
-    
-    # Добавляем новые столбцы справа
-    last_col = len(header_row) - 1
-    
-    # Обновляем заголовки для новых столбцов
-    updates.append({
-        'range': f'{get_column_letter(last_col)}{5}',
-        'values': [['Ост.']]
-    })
-    updates.append({
-        'range': f'{get_column_letter(last_col+1)}{5}',
-        'values': [[new_date_str]]
-    })
-    
+    grid = StockGrid.from_sheet_values(all_data, max_days=None)
+
+    logger.info("Начало обработки sliding windows...")
+    logger.info("Последняя дата: %s", grid.dates()[-1].strftime('%d.%m.%Y'))
+
+    grid.shift(days)
+    logger.info("Новая дата: %s", grid.dates()[-1].strftime('%d.%m.%Y'))
+
     # Выполняем все обновления одним запросом
-    if updates:
-        worksheet.batch_update(updates)
-        print("Обновление sliding windows выполнено успешно")
+    worksheet.update(values=grid.to_values(include_header=True), range_name=grid.a1_range(include_header=True))
+    logger.info("Обновление sliding windows выполнено успешно")
 
 
 
@@ -223,12 +216,12 @@ def get_product_codes_from_sheet2(worksheet) -> List[str]:
     codes = worksheet.col_values(3)  # Column C
     return [code for code in codes[3:] if code.strip()]
 
-def get_products_with_details_sheet2(worksheet, start_row: int = 4) -> Dict[str, Dict]:
+def get_products_with_details_sheet2(worksheet, start_row: int = 4) -> Dict[str, Product]:
     """
     Gets information about products that are already filled in Sheet2.
     
     Returns:
-        Dict[str, Dict]: {code: {category, product_type, name}}
+        Dict[str, Product]: {code: Product(code, name, category, product_type=тип товара из колонки B)}
     """
     all_values = worksheet.get_all_values()
     data_rows = all_values[start_row-1:]
@@ -243,15 +236,16 @@ def get_products_with_details_sheet2(worksheet, start_row: int = 4) -> Dict[str,
                 
             # If name is filled, consider the product info complete
             if row[3].strip():
-                products[code] = {
-                    "category": row[0].strip(),      # Column A
-                    "product_type": row[1].strip(),  # Column B
-                    "name": row[3].strip()           # Column D
-                }
+                products[code] = Product(
+                    code=code,
+                    name=row[3].strip(),             # Column D
+                    category=row[0].strip(),         # Column A
+                    product_type=row[1].strip()      # Column B
+                )
     
     return products
 
-def update_product_details_in_sheet2(worksheet, products: Dict[str, Dict], start_row: int = 4):
+def update_product_details_in_sheet2(worksheet, products: Dict[str, Product], start_row: int = 4):
     """Updates unfilled product information in Sheet2"""
     codes = worksheet.col_values(3)  # Column C
     existing_products = get_products_with_details_sheet2(worksheet)
@@ -262,12 +256,12 @@ def update_product_details_in_sheet2(worksheet, products: Dict[str, Dict], start
         if not code.strip() or code in existing_products:
             continue
             
-        product = products.get(code, {})
+        product = products.get(code)
         if product:
             cells_to_update.extend([
-                gspread.Cell(idx, 1, product.get('category', '')),     # Column A
-                gspread.Cell(idx, 2, product.get('product_type', '')), # Column B
-                gspread.Cell(idx, 4, product.get('name', ''))          # Column D
+                gspread.Cell(idx, 1, product.category or ''),  # Column A
+                gspread.Cell(idx, 2, product.product_type or ''),  # Column B (тип товара заполняется вручную)
+                gspread.Cell(idx, 4, product.name or '')       # Column D
             ])
     
     if cells_to_update:
@@ -302,7 +296,7 @@ def update_daily_stats_in_sheet2(worksheet, orders_data: List[Dict], start_row:
     if cells_to_update:
         worksheet.update_cells(cells_to_update)
 
-def update_sheet3(worksheet, products: Dict[str, Dict], start_row: int = 3):
+def update_sheet3(worksheet, products: Dict[str, Product], start_row: int = 3):
     """
     Заполняет Лист3 данными о товарах: Код (A), Товар (B), Название (C).
     
@@ -319,23 +313,23 @@ def update_sheet3(worksheet, products: Dict[str, Dict], start_row: int = 3):
         for idx, (code, details) in enumerate(products.items(), start=start_row):
             row = [
                 code,
-                details.get("category", ""),
-                details.get("name", "")
+                details.category or "",
+                details.name or ""
             ]
             data.append(row)
         
         # Определяем диапазон для обновления
         end_row = start_row + len(products)
-        print("end_row: ", end_row)
+        logger.debug("end_row: %s", end_row)
         range_name = f'A{start_row}:C{end_row}'
         
         # Обновляем данные в Лист3
         worksheet.update(range_name, data)
         
-        print(f"Лист3 обновлен: {len(products)} записей добавлено.")
+        logger.info("Лист3 обновлен: %s записей добавлено.", len(products))
         
     except Exception as e:
-        print(f"Ошибка при обновлении Лист3: {str(e)}")
+        logger.error("Ошибка при обновлении Лист3: %s", e)
         raise
 
 def update_sheet3_acceptances(worksheet, acceptance_data: Dict[str, Dict[datetime, int]], 
@@ -381,10 +375,10 @@ def update_sheet3_acceptances(worksheet, acceptance_data: Dict[str, Dict[datetim
         for update in updates:
             worksheet.update(update['range'], update['values'])
 
-        print(f"Лист3 обновлен данными о приемках.")
+        logger.info("Лист3 обновлен данными о приемках.")
         
     except Exception as e:
-        print(f"Ошибка при обновлении приемок Лист3: {str(e)}")
+        logger.error("Ошибка при обновлении приемок Лист3: %s", e)
         raise
 
 def get_column_number(column_letter: str) -> int:
@@ -410,24 +404,18 @@ def get_supply_dates_from_sheet3(worksheet) -> Dict[str, List[str]]:
         Dict[str, List[str]]: {код_товара: [будущие_даты]}
     """
     # Получаем текущую дату
-    current_date = datetime.now().date()
+    current_day = today_ordinal()
     
     # Получаем заголовки с датами (начиная с G2)
     dates_row = worksheet.row_values(2)[4:]  # G2 и правее
     
-    # Фильтруем только будущие даты
+    # Фильтруем только будущие даты (пустые и неразборчивые ячейки -> NO_DATE)
     future_dates = []
     future_date_indices = []  # Индексы для определения колонок
-    for idx, date_str in enumerate(dates_row):
-        if not date_str.strip():
-            continue
-        try:
-            date = datetime.strptime(date_str, "%d.%m.%Y").date()
-            if date >= current_date:
-                future_dates.append(date_str)
-                future_date_indices.append(idx)
-        except ValueError:
-            continue
+    for idx, (date_str, day) in enumerate(zip(dates_row, day_ordinals(dates_row))):
+        if day != NO_DATE and day >= current_day:
+            future_dates.append(date_str)
+            future_date_indices.append(idx)
     
     # Получаем коды товаров
     all_values = worksheet.get_all_values()
@@ -458,8 +446,7 @@ def sheet3_sliding_window(worksheet, num_dates: int = 180):
 
     # Если есть даты для сдвига
     if dates:
-        rightmost_date = datetime.strptime(dates[-1], "%d.%m.%Y")
-        new_date = (rightmost_date + timedelta(days=1)).strftime("%d.%m.%Y")
+        new_date = shift_date(dates[-1], 1)
 
         updates = []
         
@@ -524,7 +511,7 @@ def update_supply_quantities_in_sheet3(worksheet, supplies_data: Dict[str, Dict[
     date_to_column = {}
     for idx, date_str in enumerate(dates_row[4:], start=0):  # Начинаем с E колонки (индекс 4)
         if date_str.strip():  # Пропускаем пустые ячейки
-            date_to_column[date_str] = chr(69 + idx)  # E = 69 в ASCII
+            date_to_column[date_str] = 5 + idx  # E - 5-я колонка
     
     # Обновляем количества
     value_updates = []
@@ -535,11 +522,10 @@ def update_supply_quantities_in_sheet3(worksheet, supplies_data: Dict[str, Dict[
             product_dates = supplies_data[product_code]
             for date_str, quantity in product_dates.items():
                 if date_str in date_to_column:
-                    column_letter = date_to_column[date_str]
-                    col_idx = ord(column_letter) - ord('A')
+                    col = date_to_column[date_str]
                     
                     # Получаем текущее значение напрямую из ячейки
-                    cell = worksheet.cell(row_idx, col_idx + 1)  # +1 так как gspread использует индексацию с 1
+                    cell = worksheet.cell(row_idx, col)
                     current_value = cell.value if cell.value else ""
                     
                     # Если есть формула, добавляем к ней новое значение
@@ -553,7 +539,7 @@ def update_supply_quantities_in_sheet3(worksheet, supplies_data: Dict[str, Dict[
                         except (ValueError, AttributeError):
                             new_value = quantity
                     
-                    cell_addr = f"{column_letter}{row_idx}"
+                    cell_addr = f"{get_column_letter(col)}{row_idx}"
                     value_updates.append({
                         'range': cell_addr,
                         'values': [[new_value]]
@@ -562,7 +548,7 @@ def update_supply_quantities_in_sheet3(worksheet, supplies_data: Dict[str, Dict[
     # Применяем обновления батчем
     if value_updates:
         worksheet.batch_update(value_updates)
-        print(f"Обновлены данные о приемках для {len(value_updates)} ячеек")
+        logger.info("Обновлены данные о приемках для %s ячеек", len(value_updates))
 
 def get_sales_channels_and_statuses(worksheet) -> Dict[str, List[str]]:
     """
@@ -593,21 +579,34 @@ def get_sales_channels_and_statuses(worksheet) -> Dict[str, List[str]]:
     return status_channels
 
 
+def _sheet_number(value: str):
+    """Число из отформатированного значения ячейки ('1 234,50 ₽' -> 1234.5) или None"""
+    text = re.sub(r'[^\d,.\-]', '', value).replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
 def update_sales_report_in_sheet5(worksheet, report: Dict[str, Dict[str, Dict[str, float]]], current_date: str):
     """
     Updates Sheet5 with the sales report data for multiple dates.
+    Only cells whose value differs from the report are written; cells of
+    dates missing from the report are cleared.
 
     Args:
         worksheet: Google Sheets worksheet for Sheet5.
         report: Dictionary with statuses as keys and channel/date amounts as values.
         current_date: Current date in format dd.mm.yyyy
     """
+    all_values = worksheet.get_all_values()
+
     # Get all statuses and channels with their row numbers
     channel_rows = {}
     current_status = None
 
-    for idx, cell in enumerate(worksheet.col_values(1), start=1):
-        cell = cell.strip()
+    for idx, row_values in enumerate(all_values, start=1):
+        cell = row_values[0].strip() if row_values else ''
         if cell.startswith('\\'):
             break
         if not cell or cell.startswith('#'):
@@ -618,40 +617,34 @@ def update_sales_report_in_sheet5(worksheet, report: Dict[str, Dict[str, Dict[st
         elif current_status and cell:
             channel_rows[(current_status, cell)] = idx
 
-    # Get existing dates from header
-    dates = get_dates_from_header(worksheet)
+    # Get existing dates from header (same columns as get_dates_from_header)
+    header = all_values[0][1:] if all_values else []
+    dates = [date.strip() for date in header if date.strip()]
 
-    # First clear existing values for all channels and dates
-    clear_updates = []
+    updates = []
     for (status, channel), row in channel_rows.items():
-        for date_str in dates:
-            date_col = dates.index(date_str) + 2  # +2 because we start from column B
-            clear_updates.append({
+        date_amounts = report.get(status, {}).get(channel, {})
+        row_values = all_values[row - 1]
+        for date_col, date_str in enumerate(dates, start=2):  # +2 because we start from column B
+            amount = date_amounts.get(date_str)
+            current = row_values[date_col - 1].strip() if date_col <= len(row_values) else ''
+            if amount is None:
+                if not current:
+                    continue
+                value = ''
+            else:
+                current_number = _sheet_number(current) if current else None
+                if current_number is not None and abs(current_number - amount) < 0.005:
+                    continue
+                value = amount
+            updates.append({
                 'range': f'{get_column_letter(date_col)}{row}',
-                'values': [['']]  # Clear cell by setting empty value
+                'values': [[value]]
             })
 
-    if clear_updates:
-        worksheet.batch_update(clear_updates)
-
-    # Prepare batch updates with new values
-    updates = []
-    for status, channels in report.items():
-        for channel, date_amounts in channels.items():
-            row = channel_rows.get((status, channel))
-            if row:
-                for date_str, amount in date_amounts.items():
-                    if date_str not in dates:
-                        continue
-
-                    date_col = dates.index(date_str) + 2  # +2 because we start from column B
-                    updates.append({
-                        'range': f'{get_column_letter(date_col)}{row}',
-                        'values': [[amount]]
-                    })
-
     if updates:
         worksheet.batch_update(updates)
+    logger.info("Лист5, продажи: изменено ячеек %s", len(updates))
 
 
 def get_dates_from_header(worksheet) -> List[str]:
@@ -703,7 +696,7 @@ def update_categories_costs_in_sheet5(worksheet, categories_costs: Dict[str, flo
     try:
         start_row = col_a_values.index('Остатки') + 1
     except ValueError:
-        print("Название 'Остатки' не найдено в столбце A")
+        logger.warning("Название 'Остатки' не найдено в столбце A")
         return
 
     # Получаем все категории из столбца A до строки "Заказано В пути", игнорируя строки со знаком #
@@ -728,9 +721,9 @@ def update_categories_costs_in_sheet5(worksheet, categories_costs: Dict[str, flo
     if updates:
         try:
             worksheet.update_cells(updates)
-            print(f"Обновлены данные о себестоимости для {len(categories_costs)} категорий")
+            logger.info("Обновлены данные о себестоимости для %s категорий", len(categories_costs))
         except Exception as e:
-            print(f"Ошибка при обновлении данных о себестоимости: {str(e)}")
+            logger.error("Ошибка при обновлении данных о себестоимости: %s", e)
             raise
 
 def update_transits_costs_in_sheet5(worksheet, categories_costs: Dict[str, float]):
@@ -767,7 +760,7 @@ def update_transits_costs_in_sheet5(worksheet, categories_costs: Dict[str, float
     try:
         start_row = col_a_values.index('Заказано В пути') + 1
     except ValueError:
-        print("Название 'Заказано В пути' не найдено в столбце A")
+        logger.warning("Название 'Заказано В пути' не найдено в столбце A")
         return
 
     # Получаем все категории из столбца A после строки "Заказано В пути", игнорируя строки со знаком #
@@ -792,9 +785,9 @@ def update_transits_costs_in_sheet5(worksheet, categories_costs: Dict[str, float
     if updates:
         try:
             worksheet.update_cells(updates)
-            print(f"Обновлены данные о товарах в пути для {len(categories_costs)} категорий")
+            logger.info("Обновлены данные о товарах в пути для %s категорий", len(categories_costs))
         except Exception as e:
-            print(f"Ошибка при обновлении данных о товарах в пути: {str(e)}")
+            logger.error("Ошибка при обновлении данных о товарах в пути: %s", e)
             raise
 
 
@@ -822,10 +815,8 @@ def update_daily_stats_in_sheet5_sliding_window(worksheet, num_dates: int = 180)
 
     # Если есть даты для сдвига
     if dates:
-        # Получаем самую правую дату и преобразуем ее
-        rightmost_date = datetime.strptime(dates[-1], "%d.%m.%Y")
         # Добавляем один день к самой правой дате
-        new_date = (rightmost_date + timedelta(days=1)).strftime("%d.%m.%Y")
+        new_date = shift_date(dates[-1], 1)
 
         updates = []
 
@@ -888,9 +879,9 @@ def fill_dates_sheet5(worksheet, days: int = 180):
         # Обновляем даты в таблице
         worksheet.update(update_range, [dates])
 
-        print(f"Даты успешно заполнены. Добавлено {len(dates)} дат с {dates[0]} по {dates[-1]}")
+        logger.info("Даты успешно заполнены. Добавлено %s дат с %s по %s", len(dates), dates[0], dates[-1])
 
     except Exception as e:
-        print(f"Ошибка при заполнении дат: {str(e)}")
+        logger.error("Ошибка при заполнении дат: %s", e)
         raise
 
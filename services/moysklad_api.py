@@ -1,8 +1,88 @@
-from typing import List, Dict
+import logging
+from typing import Callable, Iterable, List, Dict, Optional
 import requests, time
 from datetime import datetime, timedelta
 
+from auth.moysklad_auth import token_manager_for
+from services.bundle_index import BundleIndex, components_from_json, get_bundle_index
+from services.cost_cube import COST_CUBE_DAYS, CostCube, order_fields, with_cost
+from services.order_aggregation import OrderAggregate, OrderAggregator
+from services.records import (
+    Product, Supply, SupplyPosition, clean_href, order_positions, product_from_json, stock_rows
+)
+from utils.checkpoint import CheckpointStore, make_run_key
+from utils.date_handler import ISO_DAY_FORMAT, day_ordinal, format_day, format_days, today_ordinal
 from utils.error_handler import print_api_errors
+from utils.instrumentation import MOYSKLAD, endpoint_name, instrumentation, params_shape
+from utils.logging_config import SAMPLE
+from utils.metrics import record_cache, record_rows
+from utils.rate_limiter import get_rate_limiter
+from utils.symbols import symbols
+
+logger = logging.getLogger(__name__)
+
+# Повторы запроса после ответа 429 (превышен лимит МойСклад)
+MAX_RATE_LIMIT_RETRIES = 5
+
+_session = requests.Session()
+
+
+def _get(url: str, headers: Dict = None, params: Dict = None) -> requests.Response:
+    """
+    GET-запрос к API МойСклад через общую сессию (keep-alive) с соблюдением
+    лимитов учетной записи. При ответе 429 ждет время из заголовка
+    X-Lognex-Retry-TimeInterval и повторяет запрос. При ответе 401 один раз
+    обновляет токен через менеджер, выдавший токен, и повторяет запрос с новым токеном.
+    Запрос вместе с повторами и ожиданием лимитов учитывается в instrumentation.
+    """
+    authorization = (headers or {}).get("Authorization", "")
+    tokens = token_manager_for(authorization[len("Bearer "):])
+    if tokens is not None:
+        headers = tokens.authorize(headers)
+    # Лимиты МойСклад действуют на учетную запись: у каждой организации свой лимитер,
+    # он не меняется при обновлении токена
+    limiter = get_rate_limiter(f"tenant:{tokens.name}" if tokens is not None else authorization)
+    start_ns = time.time_ns()
+    attempt = 0
+    latency = 0.0
+    waited = 0.0
+    response = None
+    error = None
+    token_refreshed = False
+    try:
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            waited += limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = _session.get(url, headers=headers, params=params)
+            finally:
+                latency += time.monotonic() - started
+                limiter.release()
+            if response.status_code == 401 and not token_refreshed and tokens is not None:
+                token_refreshed = True
+                stale = headers.get("Authorization", "")[len("Bearer "):]
+                token = tokens.refresh(stale)
+                if token and token != stale:
+                    logger.warning("Токен МойСклад отклонен (401), запрос повторяется с новым токеном")
+                    headers = {**headers, "Authorization": f"Bearer {token}"}
+                    continue
+                return response
+            if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            retry_after = float(response.headers.get("X-Lognex-Retry-TimeInterval", 3000)) / 1000
+            logger.warning("Превышен лимит запросов МойСклад, повтор через %.1f с", retry_after)
+            limiter.pause(retry_after)
+        return response
+    except requests.RequestException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        instrumentation.record_request(
+            MOYSKLAD, endpoint_name(url), "GET", params_shape(params),
+            response.status_code if response is not None else 0,
+            len(response.content) if response is not None else 0,
+            latency, attempt, waited, error, start_ns
+        )
 
 
 def fetch_products_by_codes(access_token: str, product_codes: List[str]) -> List[Dict]:
@@ -16,7 +96,7 @@ def fetch_products_by_codes(access_token: str, product_codes: List[str]) -> List
     for code in product_codes:
         try:
             params = {"filter": f"code={code}"}
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             
@@ -30,9 +110,11 @@ def fetch_products_by_codes(access_token: str, product_codes: List[str]) -> List
 
 
 
-def fetch_product_details_by_codes(access_token: str, product_codes: List[str], existing_products: Dict[str, Dict]) -> Dict[str, Dict]:
+def fetch_product_details_by_codes(access_token: str, product_codes: List[str],
+                                   existing_products: Dict[str, Product]) -> Dict[str, Product]:
     """
     Получает информацию о товарах и комплектах.
+    Из ответа API сохраняются только поля Product, href очищается от параметров.
     """
     # Фильтруем коды, оставляя только те, для которых нет информации
     new_codes = [code for code in product_codes if code not in existing_products]
@@ -53,21 +135,12 @@ def fetch_product_details_by_codes(access_token: str, product_codes: List[str],
     for code in new_codes:
         try:
             params = {"filter": f"code={code}"}
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             
             if data.get("rows"):
-                product = data["rows"][0]
-                products_dict[code] = {
-                    "id": product.get("id"),
-                    "name": product.get("name"),
-                    "category": product.get("pathName", "Без категории"),
-                    "description": product.get("description", ""),
-                    "article": product.get("article", ""),
-                    "meta": product.get("meta"),
-                    "type": "product"  # Добавляем тип для различения
-                }
+                products_dict[code] = product_from_json(data["rows"][0], "product")
             else:
                 not_found_codes.append(code)
         except requests.HTTPError as e:
@@ -82,32 +155,42 @@ def fetch_product_details_by_codes(access_token: str, product_codes: List[str],
         for code in not_found_codes:
             try:
                 params = {"filter": f"code={code}"}
-                response = requests.get(bundle_url, headers=headers, params=params)
+                response = _get(bundle_url, headers=headers, params=params)
                 response.raise_for_status()
                 data = response.json()
                 
                 if data.get("rows"):
-                    bundle = data["rows"][0]
-                    products_dict[code] = {
-                        "id": bundle.get("code"),
-                        "name": bundle.get("name"),
-                        "category": bundle.get("pathName", "Без категории"),
-                        "description": bundle.get("description", ""),
-                        "article": bundle.get("article", ""),
-                        "meta": bundle.get("meta"),
-                        "type": "bundle"  # Добавляем тип для различения
-                    }
+                    products_dict[code] = product_from_json(data["rows"][0], "bundle")
                 else:
-                    print(f"Code {code} not found in both products and bundles")
+                    logger.warning("Code %s not found in both products and bundles", code)
             except requests.HTTPError as e:
                 print_api_errors(e.response)
-                print(f"Error fetching bundle with code {code}")
+                logger.error("Error fetching bundle with code %s", code)
                 continue
     
     return products_dict
 
-def fetch_customer_orders_for_products(access_token: str, start_date: str, end_date: str, products: Dict[str, Dict]) -> List[Dict]:
-    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
+def fetch_orders_by_date_for_products(access_token: str, start_date: str, end_date: str, product_codes: List[str],
+                                      checkpoint: CheckpointStore = None) -> Dict:
+    """
+    Суммирует количество заказанных товаров по дням. Страницы заказов
+    агрегируются в пуле процессов, если задан ORDER_AGGREGATION_PROCESSES
+    (services.order_aggregation).
+
+    Args:
+        access_token (str): Токен доступа
+        start_date (str): Верхняя граница moment ("YYYY-MM-DD HH:MM:SS")
+        end_date (str): Нижняя граница moment ("YYYY-MM-DD HH:MM:SS")
+        product_codes (List[str]): Коды товаров
+        checkpoint (CheckpointStore): Хранилище прогресса для продолжения прерванной загрузки
+
+    Returns:
+        Dict: {
+            "orders_by_date": {код: {дата: количество}},
+            "product_hrefs": {код: href товара},
+            "orders_per_day": {дата: количество заказов за день (все заказы)}
+        }
+    """
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept-Encoding": "gzip"
@@ -118,104 +201,282 @@ def fetch_customer_orders_for_products(access_token: str, start_date: str, end_d
         "expand": "positions,positions.assortment"
     }
 
-    print(f"products - {products}")
-    
-    # Инициализируем структуру данных для каждого продукта
-    product_stats = {}
-    for code, details in products.items():
-        product_stats[code] = {
-            "orders_by_date": {},
-            "stock_by_date": {},
-            "name": details.get("name", ""),
-            "category": details.get("category", ""),
-            "description": details.get("description", "")
-        }
-
-    product_cache = {}
-    product_hrefs = []
+    orders_by_date = {code: {} for code in product_codes}
+    total = OrderAggregate()
     offset = 0
 
-    # Собираем данные о заказах
-    while True:
-        params['offset'] = offset
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            orders = response.json().get("rows", [])
-            
-            if not orders:
+    run_key = make_run_key(start_date, end_date, product_codes)
+    state = checkpoint.load("customer_orders", run_key) if checkpoint else None
+    if state:
+        offset = state["offset"]
+        total.load_products(state["orders_by_date"], state["product_hrefs"])
+        total.orders_per_day = state["orders_per_day"]
+        logger.info("Продолжаем загрузку заказов с позиции %d", offset)
+
+    def save_checkpoint(merged_offset: int, force: bool = False):
+        by_code, hrefs = total.products_by_code()
+        checkpoint.save("customer_orders", run_key, {
+            "offset": merged_offset,
+            "product_hrefs": hrefs,
+            "orders_per_day": total.orders_per_day,
+            "orders_by_date": by_code
+        }, force=force)
+
+    aggregator = OrderAggregator(product_codes, total=total)
+    merged_offset = _aggregate_order_pages(headers, params, aggregator, offset,
+                                           save_checkpoint if checkpoint else None)
+    if checkpoint:
+        save_checkpoint(merged_offset, force=True)
+
+    by_code, product_hrefs = total.products_by_code()
+    orders_by_date.update(by_code)
+    return {
+        "orders_by_date": orders_by_date,
+        "product_hrefs": product_hrefs,
+        "orders_per_day": total.orders_per_day
+    }
+
+
+def _aggregate_order_pages(headers: Dict, params: Dict, aggregator: OrderAggregator, offset: int = 0,
+                           on_progress: Callable[[int], None] = None) -> int:
+    """
+    Загружает страницы entity/customerorder начиная с offset и передает их aggregator.
+    Первая страница разбирается здесь ради meta.size, следующие передаются телом
+    ответа: при агрегации в пуле процессов их разбор не занимает этот процесс,
+    а загрузка следующей страницы идет параллельно с разбором предыдущих.
+
+    Args:
+        headers: Заголовки запроса
+        params: Параметры запроса (filter, limit, expand)
+        aggregator: Агрегатор страниц
+        offset: Позиция первой страницы
+        on_progress: Вызывается после каждой страницы с позицией, до которой
+            страницы уже сложены в aggregator.total (для контрольной точки)
+
+    Returns:
+        int: Позиция после последней страницы
+    """
+    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
+    limit = params["limit"]
+    start = offset
+    size = None
+    try:
+        while size is None or offset < size:
+            params['offset'] = offset
+            try:
+                response = _get(url, headers=headers, params=params)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                print_api_errors(e.response)
+                raise e
+
+            if size is None:
+                data = response.json()
+                size = int(data.get("meta", {}).get("size", 0))
+                rows = data.get("rows", [])
+                aggregator.add_orders(rows)
+                count = len(rows)
+            else:
+                aggregator.submit(response.content)
+                count = min(limit, size - offset)
+            record_rows("customer_orders", count)
+            if not count:
                 break
+            offset += count
+            if on_progress:
+                on_progress(min(start + aggregator.collect() * limit, offset))
+        aggregator.result()
+    except BaseException:
+        aggregator.cancel()
+        raise
+    return offset
+
+
+def build_product_stats(products: Dict[str, Product], orders_by_date: Dict[str, Dict[str, float]],
+                        stocks_by_date: Dict[str, Dict[str, float]]) -> List[Dict]:
+    """Формирует результат fetch_customer_orders_for_products для записи в Лист1"""
+    result = []
+    for code, details in products.items():
+        stock_by_date = stocks_by_date.get(code, {})
+        # Текущий остаток - последний известный остаток
+        latest_stock = next(iter(sorted(stock_by_date.items(), reverse=True)), (None, 0))[1]
+        result.append({
+            "code": code,
+            "name": details.name or "",
+            "category": details.category or "",
+            "description": details.description or "",
+            "orders_by_date": orders_by_date.get(code, {}),
+            "stock": latest_stock,
+            "stock_by_date": stock_by_date
+        })
+    return result
 
-            for order in orders:
-                order_date = order.get("moment", "").split(" ")[0]
-                print(f"order date is {order_date}")
-                
-                positions = order.get("positions", {})
-                positions_rows = positions.get("rows", [])
 
-                for position in positions_rows:
-                    assortment = position.get("assortment", {})
-                    product_href = assortment.get("meta", {}).get("href").split('?')[0]
-                    print(f"product href - {product_href}")
+def fetch_customer_orders_for_products(access_token: str, start_date: str, end_date: str, products: Dict[str, Product],
+                                       china_transit_url: str = None, checkpoint: CheckpointStore = None,
+                                       state: Dict = None) -> List[Dict]:
+    """
+    Собирает заказы по дням и остатки по дням для товаров.
+    Если передан checkpoint, пройденные страницы заказов и частичные агрегаты
+    сохраняются, и повторный запуск с теми же параметрами продолжает с места остановки.
+    Если передан словарь state, в него записываются href'ы товаров и количество
+    заказов по дням - они нужны для последующих инкрементальных запусков.
+    """
+    logger.info("Загрузка заказов и остатков для %d товаров", len(products))
+    logger.debug("products - %s", products)
 
-                    if product_href not in product_cache:
-                        product_cache[product_href] = assortment.get("code")
-                        
+    orders = fetch_orders_by_date_for_products(access_token, start_date, end_date, list(products), checkpoint)
 
-                    product_code = product_cache[product_href]
-                    print(f"product code is {product_code}")
+    # Получаем остатки по датам для всех товаров
+    stocks_by_date = fetch_product_stock(access_token, list(set(orders["product_hrefs"].values())), list(products),
+                                         china_transit_url, checkpoint)
+    if checkpoint:
+        checkpoint.clear("customer_orders")
 
-                    if product_code in product_stats:
-                        quantity = float(position.get("quantity", 0))
-                        product_hrefs.append(product_href)
-                        if order_date not in product_stats[product_code]["orders_by_date"]:
-                            product_stats[product_code]["orders_by_date"][order_date] = 0
-                        product_stats[product_code]["orders_by_date"][order_date] += quantity
-                        print(f"Updated {product_code} for date {order_date}: {product_stats[product_code]['orders_by_date'][order_date]}")
+    if state is not None:
+        state["product_hrefs"] = orders["product_hrefs"]
+        state["orders_per_day"] = orders["orders_per_day"]
 
+    result = build_product_stats(products, orders["orders_by_date"], stocks_by_date)
+    logger.debug("%s", result)
+    return result
+
+
+def fetch_changed_order_days(access_token: str, since: str, start_date: str, end_date: str) -> List[str]:
+    """
+    Возвращает дни (YYYY-MM-DD) заказов окна, измененных или созданных после since.
+
+    Args:
+        access_token (str): Токен доступа
+        since (str): Водяной знак ("YYYY-MM-DD HH:MM:SS")
+        start_date (str): Верхняя граница moment окна
+        end_date (str): Нижняя граница moment окна
+    """
+    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    params = {
+        "filter": f"updated>={since};moment<={start_date};moment>={end_date}",
+        "limit": 1000
+    }
+
+    days = set()
+    offset = 0
+    while True:
+        params['offset'] = offset
+        try:
+            response = _get(url, headers=headers, params=params)
+            response.raise_for_status()
+            rows = response.json().get("rows", [])
         except requests.HTTPError as e:
             print_api_errors(e.response)
             raise e
 
-        offset += len(orders)
-        if len(orders) < 100:
+        days.update(order.get("moment", "").split(" ")[0] for order in rows)
+        if len(rows) < params["limit"]:
             break
+        offset += len(rows)
 
-    # Получаем остатки по датам для всех товаров
-    stocks_by_date = fetch_product_stock(access_token, list(set(product_hrefs)), list(product_stats.keys()))
-    
-    # Обновляем статистику остатков для каждого товара
-    for code in product_stats:
-        if code in stocks_by_date:
-            product_stats[code]["stock_by_date"] = stocks_by_date[code]
-            # Устанавливаем текущий остаток как последний известный остаток
-            latest_stock = next(iter(sorted(stocks_by_date[code].items(), reverse=True)), (None, 0))[1]
-            product_stats[code]["stock"] = latest_stock
-
-    # Формируем результат
-    result = []
-    for code, stats in product_stats.items():
-        result.append({
-            "code": code,
-            "name": stats["name"],
-            "category": stats["category"],
-            "description": stats["description"],
-            "orders_by_date": stats["orders_by_date"],
-            "stock": stats["stock"],
-            "stock_by_date": stats["stock_by_date"]
-        })
+    return sorted(days)
 
-    print(result)
-    return result
+
+def count_customer_orders(access_token: str, start_date: str, end_date: str) -> int:
+    """Количество заказов в окне moment (один запрос, meta.size)"""
+    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    params = {
+        "filter": f"moment<={start_date};moment>={end_date}",
+        "limit": 1
+    }
+    try:
+        response = _get(url, headers=headers, params=params)
+        response.raise_for_status()
+        return int(response.json().get("meta", {}).get("size", 0))
+    except requests.HTTPError as e:
+        print_api_errors(e.response)
+        raise e
+
+
+def fetch_customer_orders_incremental(access_token: str, start_date: str, end_date: str, products: Dict[str, Product],
+                                      state: Dict, china_transit_url: str = None) -> Optional[Dict]:
+    """
+    Инкрементально обновляет данные Листа1: заново считает заказы только за дни,
+    в которых есть заказы, измененные после предыдущего запуска, и остатки за эти дни
+    и за текущий день.
+
+    Args:
+        access_token (str): Токен доступа
+        start_date (str): Верхняя граница moment окна
+        end_date (str): Нижняя граница moment окна
+        products (Dict[str, Product]): Товары Листа1
+        state (Dict): Состояние предыдущего успешного запуска
+            ({"watermark", "codes", "product_hrefs", "orders_per_day"})
+        china_transit_url (str): href склада "В ПУТИ ИЗ КИТАЯ", если уже получен
+
+    Returns:
+        Dict: {"orders_data", "days", "state"} или None, если нужен полный пересчет
+    """
+    if not state or not state.get("watermark"):
+        logger.info("Нет состояния предыдущего запуска, нужен полный пересчет")
+        return None
+    if set(state.get("codes", [])) != set(products):
+        logger.info("Список товаров изменился, нужен полный пересчет")
+        return None
+
+    changed_days = fetch_changed_order_days(access_token, state["watermark"], start_date, end_date)
+    logger.info("Измененные заказы найдены за %d дней", len(changed_days))
+
+    window_start, window_end = end_date.split(" ")[0], start_date.split(" ")[0]
+    orders_per_day = {day: count for day, count in state.get("orders_per_day", {}).items()
+                      if window_start <= day <= window_end}
+    product_hrefs = dict(state.get("product_hrefs", {}))
+
+    orders_by_date = {code: {} for code in products}
+    for day in changed_days:
+        day_start = max(f"{day} 00:00:00", end_date)
+        day_end = min(f"{day} 23:59:59", start_date)
+        day_orders = fetch_orders_by_date_for_products(access_token, day_end, day_start, list(products))
+        orders_per_day[day] = day_orders["orders_per_day"].get(day, 0)
+        product_hrefs.update(day_orders["product_hrefs"])
+        for code, by_date in day_orders["orders_by_date"].items():
+            orders_by_date[code].update(by_date)
+
+    # Проверка согласованности: удаленные заказы не попадают в фильтр updated,
+    # поэтому сверяем общее количество заказов окна с сохраненным по дням
+    expected = sum(orders_per_day.values())
+    actual = count_customer_orders(access_token, start_date, end_date)
+    if expected != actual:
+        logger.warning("Количество заказов в окне не совпало (%d != %d), нужен полный пересчет", expected, actual)
+        return None
+
+    stock_days = sorted(set(changed_days) | {datetime.now().strftime("%Y-%m-%d")})
+    stocks_by_date = fetch_product_stock(access_token, list(set(product_hrefs.values())), list(products),
+                                         china_transit_url, dates=stock_days)
+
+    return {
+        "orders_data": build_product_stats(products, orders_by_date, stocks_by_date),
+        "days": stock_days,
+        "state": {"product_hrefs": product_hrefs, "orders_per_day": orders_per_day}
+    }
 
 
-def fetch_product_stock(access_token: str, product_hrefs: List[str], product_codes: List[str]) -> Dict[str, Dict[str, float]]:
+def fetch_product_stock(access_token: str, product_hrefs: List[str], product_codes: List[str],
+                        china_transit_url: str = None, checkpoint: CheckpointStore = None,
+                        dates: List[str] = None) -> Dict[str, Dict[str, float]]:
     """
     Получает физические остатки для списка товаров за последние 90 дней.
     Args:
         access_token (str): Токен доступа
         product_hrefs (List[str]): Список href'ов товаров
         product_codes (List[str]): Список кодов товаров
+        china_transit_url (str): href склада "В ПУТИ ИЗ КИТАЯ", если уже получен
+        checkpoint (CheckpointStore): Хранилище прогресса для продолжения прерванной загрузки
+        dates (List[str]): Даты YYYY-MM-DD, по умолчанию последние 90 дней
     Returns:
         Dict[str, Dict[str, float]]: Словарь {код товара: {дата: остаток}}
     """
@@ -226,9 +487,23 @@ def fetch_product_stock(access_token: str, product_hrefs: List[str], product_cod
         "Accept-Encoding": "gzip"
     }
     
-    china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
+    if china_transit_url is None:
+        china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
     stock_dict = {code: {} for code in product_codes}
     current_date = datetime.now()
+    # Порядок href'ов должен совпадать между запусками, чтобы батчи не менялись
+    product_hrefs = sorted(product_hrefs)
+    if dates is None:
+        today = today_ordinal()
+        dates = format_days(range(today, today - 90, -1), ISO_DAY_FORMAT)
+
+    run_key = make_run_key(current_date.strftime("%Y-%m-%d"), product_hrefs, product_codes, dates)
+    completed = set()
+    state = checkpoint.load("product_stock", run_key) if checkpoint else None
+    if state:
+        completed = set(state["completed"])
+        stock_dict.update(state["stock"])
+        logger.info("Продолжаем загрузку остатков: пропускаем %d выполненных запросов", len(completed))
 
     # Разбиваем список href'ов на батчи
     for i in range(0, len(product_hrefs), BATCH_SIZE):
@@ -236,8 +511,10 @@ def fetch_product_stock(access_token: str, product_hrefs: List[str], product_cod
         products_filter = ";".join(f"product={href}" for href in batch_hrefs)
 
         # Проходим по датам
-        for day_offset in range(90):
-            date_to_check = (current_date - timedelta(days=day_offset)).strftime("%Y-%m-%d")
+        for date_to_check in dates:
+            step = f"{i}:{date_to_check}"
+            if step in completed:
+                continue
             
             # Формируем фильтр
             filter_parts = [
@@ -256,7 +533,7 @@ def fetch_product_stock(access_token: str, product_hrefs: List[str], product_cod
             while True:
                 params['offset'] = offset
                 try:
-                    response = requests.get(url, headers=headers, params=params)
+                    response = _get(url, headers=headers, params=params)
                     response.raise_for_status()
                     data = response.json()
                     rows = data.get("rows", [])
@@ -264,10 +541,9 @@ def fetch_product_stock(access_token: str, product_hrefs: List[str], product_cod
                     if not rows:
                         break
 
-                    for item in rows:
-                        code = item.get("code")
-                        if code in product_codes:
-                            stock_dict[code][date_to_check] = float(item.get("stock", 0))
+                    for row in stock_rows(data):
+                        if row.code in product_codes:
+                            stock_dict[row.code][date_to_check] = row.stock
 
                     if len(rows) < params["limit"]:
                         break
@@ -281,6 +557,12 @@ def fetch_product_stock(access_token: str, product_hrefs: List[str], product_cod
                 # Добавляем небольшую задержку между запросами
                 time.sleep(0.1)
 
+            if checkpoint:
+                completed.add(step)
+                checkpoint.save("product_stock", run_key, {"completed": list(completed), "stock": stock_dict})
+
+    if checkpoint:
+        checkpoint.clear("product_stock")
     return stock_dict
 
 
@@ -310,16 +592,14 @@ def fetch_product_stock2(access_token: str, product_codes: List[str]) -> Dict[st
         
     while True:
         params['offset'] = offset
-        print("try")
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             rows = data.get("rows", [])
-            for item in data.get("rows", []):
-                code = item.get("code")
-                if code in product_codes:
-                    stock_dict[code] = float(item.get("stock", 0))
+            for row in stock_rows(data):
+                if row.code in product_codes:
+                    stock_dict[row.code] = row.stock
                     
             if len(rows) < params["limit"]:
                     break
@@ -331,23 +611,71 @@ def fetch_product_stock2(access_token: str, product_codes: List[str]) -> Dict[st
             raise e
         
         
-    print(stock_dict)
+    logger.info("Получены остатки для %d товаров", len(stock_dict))
+    logger.debug("%s", stock_dict)
         
     return stock_dict 
 
-def fetch_supplies_by_date_range(access_token: str, start_date: str) -> List[Dict]:
-    china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
+def fetch_transit_stock(access_token: str, china_transit_url: str = None) -> Dict[str, float]:
+    """
+    Остатки товаров на складе "В ПУТИ ИЗ КИТАЯ".
+
+    Args:
+        access_token (str): Токен доступа
+        china_transit_url (str): href склада, если уже получен
+
+    Returns:
+        Dict[str, float]: {код товара: количество в пути}
+    """
+    if china_transit_url is None:
+        china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
+    url = "https://api.moysklad.ru/api/remap/1.2/report/stock/all"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    params = {
+        "filter": f"store={china_transit_url}",
+        "limit": 1000
+    }
+
+    transit = {}
+    offset = 0
+    while True:
+        params['offset'] = offset
+        try:
+            response = _get(url, headers=headers, params=params)
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            print_api_errors(e.response)
+            raise e
+        data = response.json()
+        rows = data.get("rows", [])
+        for row in stock_rows(data):
+            if row.code and row.stock > 0:
+                transit[row.code] = transit.get(row.code, 0.0) + row.stock
+        if len(rows) < params["limit"]:
+            break
+        offset += len(rows)
+
+    logger.info("Товар в пути: %d товаров", len(transit))
+    return transit
+
+
+def fetch_supplies_by_date_range(access_token: str, start_date: str, china_transit_url: str = None) -> List[Supply]:
     """
     Получает список приемок за указанный период.
     
     Args:
         access_token (str): Токен доступа
         start_date (str): Начальная дата в формате YYYY-MM-DD
-        end_date (str): Конечная дата в формате YYYY-MM-DD
+        china_transit_url (str): href склада "В ПУТИ ИЗ КИТАЯ", если уже получен
         
     Returns:
-        List[Dict]: Список приемок с их позициями
+        List[Supply]: Список приемок с их позициями
     """
+    if china_transit_url is None:
+        china_transit_url = fetch_url_stock_CHINA_in_transit(access_token)
     url = "https://api.moysklad.ru/api/remap/1.2/entity/supply"
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -367,7 +695,7 @@ def fetch_supplies_by_date_range(access_token: str, start_date: str) -> List[Dic
     while True:
         params['offset'] = offset
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             supply_rows = data.get("rows", [])
@@ -378,47 +706,42 @@ def fetch_supplies_by_date_range(access_token: str, start_date: str) -> List[Dic
             for supply in supply_rows:
                 positions = supply.get("positions", {})
                 positions_href = positions.get("meta", {}).get("href")
-                positions_response = requests.get(positions_href, headers=headers)
+                positions_response = _get(positions_href, headers=headers)
                 positions_response.raise_for_status()
                 positions_data = positions_response.json()
                 positions_rows = positions_data.get("rows", [])
                 supply_positions = []
                 
                 for position in positions_rows:
-                    print(position)
+                    logger.debug("%s", position, extra=SAMPLE)
                     position_href = position.get("meta", {}).get("href")
-                    position_response = requests.get(position_href, headers=headers)
+                    position_response = _get(position_href, headers=headers)
                     position_response.raise_for_status()
                     position_data = position_response.json()
                     assortment = position_data.get("assortment", {})
                     product_href = assortment.get("meta", {}).get("href")
                     
                     # Получаем информацию о товаре из кэша или через API
+                    record_cache("supply_products", hits=int(product_href in product_cache),
+                                 misses=int(product_href not in product_cache))
                     if product_href not in product_cache:
-                        product_response = requests.get(product_href, headers=headers)
+                        product_response = _get(product_href, headers=headers)
                         product_response.raise_for_status()
                         product_data = product_response.json()
-                        print(product_data)
-                        product_cache[product_href] = {
-                            "code": product_data.get("code"),
-                            "name": product_data.get("name"),
-                            "category": product_data.get("pathName", "Uncategorized")
-                        }
+                        logger.debug("%s", product_data, extra=SAMPLE)
+                        product_cache[product_href] = product_from_json(product_data, "product", "Uncategorized")
                     
                     product_info = product_cache[product_href]
                     
-                    supply_positions.append({
-                        "code": product_info["code"],
-                        "name": product_info["name"],
-                        "category": product_info["category"],
-                        "quantity": float(position.get("quantity", 0))
-                    })
+                    supply_positions.append(SupplyPosition(
+                        product_info.code,
+                        product_info.name,
+                        product_info.category,
+                        float(position.get("quantity", 0))
+                    ))
                 
-                supplies.append({
-                    "id": supply.get("id"),
-                    "moment": supply.get("moment"),
-                    "positions": supply_positions
-                })
+                supplies.append(Supply(supply.get("id"), supply.get("moment"), tuple(supply_positions)))
+            record_rows("supplies", len(supply_rows))
             
         except requests.HTTPError as e:
             print_api_errors(e.response)
@@ -452,7 +775,7 @@ def fetch_sales_channels(access_token: str) -> List[Dict]:
     while True:
         params = {"limit": limit, "offset": offset}
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             sales_channels.extend(data.get("rows", []))
@@ -487,7 +810,7 @@ def fetch_purchase_prices(access_token: str) -> Dict[str, float]:
     while True:
         params = {"limit": limit, "offset": offset}
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             for product in data.get("rows", []):
@@ -531,7 +854,7 @@ def fetch_customer_orders_for_current_day(access_token: str) -> List[Dict]:
     while True:
         params['offset'] = offset
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             orders.extend(data.get("rows", []))
@@ -585,113 +908,232 @@ def generate_sales_report(access_token: str) -> Dict[str, Dict[str, Dict[str, fl
 
     return report
 
-def fetch_orders_by_channels(access_token: str, status_channels: Dict[str, List[str]]) -> Dict[str, Dict[str, Dict[str, float]]]:
-    # Initialize results structure
-    report = {}
+def fetch_orders_by_channels(access_token: str, status_channels: Dict[str, List[str]],
+                             bundles: BundleIndex = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Себестоимость заказов за 90 дней по статусам и каналам продаж Листа5.
+    Страницы заказов агрегируются в позиции заказов по статусу, каналу и дню
+    (services.order_aggregation) с ключами из ID symbols, себестоимость товаров
+    и комплектов запрашивается один раз после загрузки всех страниц (get_unit_costs).
+    Себестоимость каждого заказа, как и раньше, округляется вниз до целого, в отчет
+    попадают заказы с положительной себестоимостью. Строки статусов, каналов и дат
+    восстанавливаются один раз при формировании отчета.
+    Комплекты раскладываются на компоненты по индексу bundles (по умолчанию - общий
+    индекс из CHECKPOINT_DIR, services.bundle_index).
+
+    Returns:
+        Dict[str, Dict[str, Dict[str, float]]]: {статус: {канал: {дд.мм.гггг: сумма}}}
+    """
+    names = symbols.names
+    combined_state = "(Отменен, возврат)"
+    # Отмененные и возвраты считаются в общую строку "(Отменен, возврат)"
+    tracked = set()
     for status, channels in status_channels.items():
-        if status == "(Отменен, возврат)":
-            report["(Отменен)"] = {channel: {} for channel in channels}
-            report["(Возврат)"] = {channel: {} for channel in channels}
-            report[status] = {channel: {} for channel in channels}
+        if status == combined_state:
+            states = ["Отменен", "Возврат"]
+        elif status in ("(Отменен)", "(Возврат)"):
+            continue
         else:
-            report[status] = {channel: {} for channel in channels}
+            states = [status[1:-1]]
+        tracked.update((names.intern(state), names.intern(channel)) for state in states for channel in channels)
 
-    # Prepare API request
-    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept-Encoding": "gzip"
     }
-    
+
     today = datetime.now()
     end_date = today - timedelta(days=90)
-    
+
+    # Состав комплектов берется из индекса, поэтому позиции загружаются без
+    # positions.assortment(.components): в позиции остается только meta товара
+    bundles = bundles or get_bundle_index()
+    refresh_bundle_index(access_token, bundles)
+
     params = {
         "filter": f"moment<={today.strftime('%Y-%m-%d')} 00:00:00;moment>={end_date.strftime('%Y-%m-%d')} 23:59:59",
-        "limit": 100,  # Используем limit=100 для работы expand
-        "expand": "positions,positions.assortment,positions.assortment.components,state,salesChannel"
+        "limit": 100,  # С expand МойСклад отдает не больше 100 строк
+        "expand": "positions,state,salesChannel"
     }
-    
-    offset = 0
-    while True:
-        params['offset'] = offset
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            orders = response.json().get("rows", [])
-            
-            if not orders:
-                break
-            
-            # Собираем все уникальные href'ы товаров из заказов
-            product_hrefs = set()
-            for order in orders:
-                for position in order.get("positions", {}).get("rows", []):
-                    assortment = position.get("assortment", {})
-                    if assortment.get("meta", {}).get("type") == "product":
-                        product_href = clean_href(assortment.get("meta", {}).get("href"))
-                        product_hrefs.add(product_href)  # Очищаем href перед добавлением
-                    elif assortment.get("meta", {}).get("type") == "bundle":
-                        for component in assortment.get("components", {}).get("rows", []):
-                            component_href = clean_href(component.get("assortment", {}).get("meta", {}).get("href"))
-                            product_hrefs.add(component_href)  # Очищаем href перед добавлением
-            # Получаем себестоимость всех товаров одним запросом
-            costs_cache = get_products_stock_costs(list(product_hrefs), access_token)
-            print(f"cost_caches : {costs_cache}")
-                
-            for order in orders:
-                order_date = datetime.fromisoformat(order.get('moment', '').replace('Z', '+00:00'))
-                order_date_str = order_date.strftime("%d.%m.%Y")
-                
-                state_name = order.get('state', {}).get('name', '')
-                sheet_state_name = f"({state_name})"
-                
-                channel_name = order.get('salesChannel', {}).get('name', '')
-                
-                if sheet_state_name in ["(Отменен)", "(Возврат)"]:
-                    combined_state = "(Отменен, возврат)"
-                    if combined_state in report and channel_name in report[combined_state]:
-                        order_total = int(calculate_order_totals(order, costs_cache))
-                        
-                        if order_total > 0:
-                            report[sheet_state_name][channel_name][order_date_str] = \
-                                report[sheet_state_name][channel_name].get(order_date_str, 0.0) + order_total
-                            
-                            report[combined_state][channel_name][order_date_str] = \
-                                (report["(Отменен)"][channel_name].get(order_date_str, 0.0) + 
-                                 report["(Возврат)"][channel_name].get(order_date_str, 0.0))
-                else:
-                    if sheet_state_name in report and channel_name in report[sheet_state_name]:
-                        order_total = int(calculate_order_totals(order, costs_cache))
-                        #print(f"order total - {order_total}")
-                        
-                        if order_total > 0:
-                            report[sheet_state_name][channel_name][order_date_str] = \
-                                report[sheet_state_name][channel_name].get(order_date_str, 0.0) + order_total
-                            
-            offset += params["limit"]
-            
-        except requests.HTTPError as e:
-            print_api_errors(e.response)
-            raise e
-    
-    if "(Отменен)" in report:
-        del report["(Отменен)"]
-    if "(Возврат)" in report:
-        del report["(Возврат)"]
 
-    current_date = datetime.now().strftime("%d.%m.%Y")
-    summarized_report = summarize_orders(report, current_date)
+    # Позиции заказов по (статус, канал, день); товары для Листа1 (product_days) здесь не нужны
+    aggregator = OrderAggregator(codes=(), channels=True)
+    _aggregate_order_pages(headers, params, aggregator)
+    channel_orders = {key: orders for key, orders in aggregator.result().channel_orders.items()
+                      if key[:2] in tracked}
+
+    # Себестоимость всех товаров окна запрашивается один раз, а не для каждой страницы
+    unit_costs = get_unit_costs(access_token, (href for orders in channel_orders.values()
+                                               for positions in orders for href, _ in positions), bundles)
+    logger.debug("Себестоимость единиц: %s", unit_costs)
+
+    report = {status: {channel: {} for channel in channels} for status, channels in status_channels.items()
+              if status not in ("(Отменен)", "(Возврат)")}
+    for (state_id, channel_id, day), orders in channel_orders.items():
+        total = 0
+        for positions in orders:
+            order_total = int(sum(unit_costs.get(href, 0.0) * quantity for href, quantity in positions))
+            if order_total > 0:
+                total += order_total
+        if not total:
+            continue
+        status = f"({names.value(state_id)})"
+        if status in ("(Отменен)", "(Возврат)"):
+            status = combined_state
+        amounts = report[status][names.value(channel_id)]
+        date_str = format_day(day_ordinal(day))
+        amounts[date_str] = amounts.get(date_str, 0.0) + total
 
     return report
 
-def clean_href(href: str) -> str:
-    """Очищает href от параметров запроса"""
-    return href.split('?')[0]
+def update_cost_cube(access_token: str, cube: CostCube, bundles: BundleIndex = None) -> CostCube:
+    """
+    Обновляет куб себестоимости Листа5 (services.cost_cube): загружает заказы
+    окна COST_CUBE_DAYS, измененные начиная с cube.watermark (updated), или все
+    заказы окна, если куб пуст или его пора перестроить. Если после обновления
+    количество заказов в кубе не совпадает с количеством в МойСклад (заказы
+    удалены), куб перестраивается.
+
+    Args:
+        access_token (str): Токен доступа
+        cube (CostCube): Куб
+        bundles (BundleIndex): Индекс комплектов (по умолчанию - общий, services.bundle_index)
+
+    Returns:
+        CostCube: cube
+    """
+    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    bundles = bundles or get_bundle_index()
+    refresh_bundle_index(access_token, bundles)
+
+    first_day = format_day(today_ordinal() - COST_CUBE_DAYS, ISO_DAY_FORMAT)
+    last_day = format_day(today_ordinal(), ISO_DAY_FORMAT)
+
+    def load(rebuild: bool) -> int:
+        params = {
+            # Без верхней границы заказы с будущей датой не совпали бы с count_customer_orders
+            # и куб перестраивался бы при каждом обновлении
+            "filter": f"moment>={first_day} 00:00:00;moment<={last_day} 23:59:59",
+            "limit": 100,  # С expand МойСклад отдает не больше 100 строк
+            "expand": "positions,state,salesChannel"
+        }
+        if not rebuild:
+            params["filter"] += f";updated>={cube.watermark}"
+
+        # Заказ хранится без строки ответа: поля куба (order_fields) и количество товаров
+        orders = []
+        offset = 0
+        while True:
+            params["offset"] = offset
+            try:
+                response = _get(url, headers=headers, params=params)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                print_api_errors(e.response)
+                raise e
+            page = response.json().get("rows", [])
+            for order in page:
+                quantities = {}
+                for position in order_positions(order):
+                    quantities[position.href] = quantities.get(position.href, 0.0) + position.quantity
+                orders.append((order_fields(order), quantities))
+            record_rows("customer_orders", len(page))
+            if len(page) < params["limit"]:
+                break
+            offset += len(page)
+
+        # Комплекты, созданные после обновления индекса, догружаются по одному
+        for href in bundles.missing(href for _, quantities in orders for href in quantities):
+            bundles.set(href, fetch_bundle_components(access_token, href))
+        orders = [(order, bundles.expand(quantities)) for order, quantities in orders]
+
+        # Себестоимость товаров загруженных заказов запрашивается один раз
+        hrefs = sorted({href for _, quantities in orders for href in quantities})
+        costs = {symbols.hrefs.value(href_id): cost
+                 for href_id, cost in get_products_stock_costs(hrefs, access_token).items()}
+        return cube.apply((with_cost(order, quantities, costs) for order, quantities in orders), rebuild)
+
+    with cube.lock:
+        rebuild = cube.watermark is None or cube.needs_rebuild()
+        loaded = load(rebuild)
+        cube.prune(first_day)
+        if not rebuild:
+            expected = count_customer_orders(access_token, f"{last_day} 23:59:59", f"{first_day} 00:00:00")
+            actual = cube.count(first_day, last_day)
+            if expected != actual:
+                logger.warning("Куб себестоимости: заказов %s, в МойСклад %s - перестроение", actual, expected)
+                rebuild = True
+                loaded = load(rebuild)
+        logger.info("Куб себестоимости %s: загружено заказов %s", "перестроен" if rebuild else "обновлен", loaded)
+    return cube
+
+
+def refresh_bundle_index(access_token: str, bundles: BundleIndex) -> BundleIndex:
+    """
+    Обновляет индекс комплектов: загружает комплекты, измененные начиная с
+    bundles.synced (updated), или все комплекты, если индекс пора перестроить.
+    """
+    url = "https://api.moysklad.ru/api/remap/1.2/entity/bundle"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    with bundles.lock:
+        rebuild = bundles.needs_rebuild()
+        params = {"limit": 100, "expand": "components"}
+        if not rebuild:
+            params["filter"] = f"updated>={bundles.synced}"
+
+        rows = []
+        offset = 0
+        while True:
+            params["offset"] = offset
+            try:
+                response = _get(url, headers=headers, params=params)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                print_api_errors(e.response)
+                raise e
+            page = response.json().get("rows", [])
+            rows.extend(page)
+            if len(page) < params["limit"]:
+                break
+            offset += len(page)
+
+        changed = bundles.update(rows, rebuild)
+        record_rows("bundles", len(rows))
+        if changed or rebuild:
+            bundles.save()
+        logger.info("Индекс комплектов %s: %s комплектов, изменено %s", "перестроен" if rebuild else "обновлен",
+                    len(bundles), changed)
+    return bundles
+
 
-def get_products_stock_costs(product_hrefs: List[str], access_token: str) -> Dict[str, float]:
+def fetch_bundle_components(access_token: str, bundle_href: str):
+    """Состав одного комплекта (entity/bundle/{id}/components)"""
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept-Encoding": "gzip"
+    }
+    try:
+        response = _get(f"{clean_href(bundle_href)}/components", headers=headers)
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        print_api_errors(e.response)
+        raise e
+    return components_from_json(response.json().get("rows", []))
+
+
+def get_products_stock_costs(product_hrefs: List[str], access_token: str) -> Dict[int, float]:
     """
     Получает себестоимость для списка товаров батчами
+
+    Returns:
+        Dict[int, float]: {ID href'а в symbols.hrefs: себестоимость}
     """
     BATCH_SIZE = 100
     stock_url = "https://api.moysklad.ru/api/remap/1.2/report/stock/all"
@@ -700,12 +1142,12 @@ def get_products_stock_costs(product_hrefs: List[str], access_token: str) -> Dic
         "Accept-Encoding": "gzip"
     }
     
-    # Очищаем href'ы от параметров expand
-    clean_hrefs = [clean_href(href) for href in product_hrefs]
+    # Очищаем href'ы от параметров expand и убираем повторы
+    href_ids = dict.fromkeys(symbols.hrefs.intern(href) for href in product_hrefs)
     all_costs = {}
 
     valid_hrefs = []
-    for href in clean_hrefs:
+    for href in symbols.hrefs.values(href_ids):
         if "product" in href or "bundle" in href:
             valid_hrefs.append(href)
     
@@ -714,12 +1156,12 @@ def get_products_stock_costs(product_hrefs: List[str], access_token: str) -> Dic
         products_filter = ";".join(f"product={href}" for href in batch)
         
         try:
-            response = requests.get(stock_url, headers=headers, params={"filter": products_filter})
+            response = _get(stock_url, headers=headers, params={"filter": products_filter})
             response.raise_for_status()
             if response.status_code == 200:
                 data = response.json()
                 batch_costs = {
-                    clean_href(row.get("meta", {}).get("href", "")): row.get("price", 0.0) / 100
+                    symbols.hrefs.intern(row.get("meta", {}).get("href", "")): row.get("price", 0.0) / 100
                     for row in data.get("rows", [])
                 }
                 all_costs.update(batch_costs)
@@ -728,9 +1170,47 @@ def get_products_stock_costs(product_hrefs: List[str], access_token: str) -> Dic
         
     return all_costs
 
-def calculate_order_totals(order, costs_cache: Dict[str, float]):
+def get_unit_costs(access_token: str, href_ids: Iterable[int], bundles: BundleIndex) -> Dict[int, float]:
+    """
+    Себестоимость единицы товара или комплекта по ID href'ов (symbols.hrefs).
+    Комплекты, которых нет в индексе bundles (созданы после его обновления),
+    догружаются по одному; себестоимость товаров и компонентов всех комплектов
+    запрашивается одним вызовом get_products_stock_costs. Себестоимость комплекта -
+    сумма себестоимости компонентов.
+
+    Returns:
+        Dict[int, float]: {ID href'а: себестоимость единицы}
+    """
+    hrefs = symbols.hrefs
+    href_ids = set(href_ids)
+    for href in bundles.missing(hrefs.values(href_ids)):
+        bundles.set(href, fetch_bundle_components(access_token, href))
+
+    parts = {}
+    hits = misses = 0
+    for href_id in href_ids:
+        href = hrefs.value(href_id)
+        components = bundles.components(href) if "/entity/bundle/" in href else None
+        if components is None:
+            misses += "/entity/bundle/" in href
+            parts[href_id] = ((href_id, 1.0),)
+        else:
+            hits += 1
+            parts[href_id] = tuple((hrefs.intern(component), quantity) for component, quantity in components)
+    if hits or misses:
+        record_cache("bundle_index", hits, misses)
+
+    product_ids = sorted({product_id for items in parts.values() for product_id, _ in items})
+    costs = get_products_stock_costs(hrefs.values(product_ids), access_token)
+    return {href_id: sum(costs.get(product_id, 0.0) * quantity for product_id, quantity in items)
+            for href_id, items in parts.items()}
+
+
+def calculate_order_totals(order, costs_cache: Dict[int, float], bundles: BundleIndex = None):
     """
-    Calculate order total using costs cache
+    Calculate order total using costs cache (keyed by symbols.hrefs IDs).
+    Состав комплекта берется из позиции (expand=positions.assortment.components)
+    или, если он не развернут, из индекса комплектов bundles.
     """
     order_total = 0.0
     positions = order.get("positions", {}).get("rows", [])
@@ -741,20 +1221,22 @@ def calculate_order_totals(order, costs_cache: Dict[str, float]):
         quantity = position.get("quantity", 0)
         
         if assortment_type == "product":
-            product_href = clean_href(assortment.get("meta", {}).get("href"))
+            product_href = symbols.hrefs.intern(assortment.get("meta", {}).get("href"))
             buy_price = costs_cache.get(product_href, 0.0)
             #print(f"Product href: {product_href}, Buy price: {buy_price}, Quantity: {quantity}")
             order_total += buy_price * quantity
             #print(f"Product cost = {order_total}")
                 
         elif assortment_type == "bundle":
-            components = assortment.get("components", {}).get("rows", [])
+            rows = assortment.get("components", {}).get("rows")
+            if rows is None and bundles is not None:
+                components = bundles.components(clean_href(assortment.get("meta", {}).get("href"))) or ()
+            else:
+                components = components_from_json(rows or [])
             bundle_cost = 0.0
             
-            for component in components:
-                comp_quantity = component.get("quantity", 1)
-                product_href = clean_href(component.get("assortment", {}).get("meta", {}).get("href"))
-                buy_price = costs_cache.get(product_href, 0.0)
+            for product_href, comp_quantity in components:
+                buy_price = costs_cache.get(symbols.hrefs.intern(product_href), 0.0)
                 #print(f"Component href: {product_href}, Buy price: {buy_price}, Component quantity: {comp_quantity}")
                 bundle_cost += buy_price * comp_quantity
             
@@ -773,24 +1255,24 @@ def summarize_orders(report: Dict[str, Dict[str, Dict[str, float]]], current_dat
     Returns:
         A new report with summed prices for each channel and status for the current day over the last three months.
     """
-    # Convert current_date to a datetime object
-    current_date_obj = datetime.strptime(current_date, "%d.%m.%Y")
-    three_months_ago = current_date_obj - timedelta(days=90)
+    # Dates are compared as day ordinals (utils.date_handler), each date string is parsed once
+    current_day = day_ordinal(current_date)
+    three_months_ago = current_day - 90
 
     # Initialize a new report for summarized data
     summarized_report = {}
 
     # Initialize the report for the current date
-    date_str = current_date_obj.strftime("%d.%m.%Y")
+    date_str = format_day(current_day)
     summarized_report[date_str] = {}
 
-    # Debug: Check the contents of the report
-    print(f"Initial report data: {report}")  # Debug message
+    debug = logger.isEnabledFor(logging.DEBUG)
+    logger.debug("Initial report data: %s", report)
 
     for status, channels in report.items():
-        print(f"Processing status: {status}")  # Debug message
+        logger.debug("Processing status: %s", status)
         for channel, date_amounts in channels.items():
-            print(f"Processing channel: {channel}")  # Debug message
+            logger.debug("Processing channel: %s", channel)
             # Initialize the channel and status in the summarized report
             if status not in summarized_report[date_str]:
                 summarized_report[date_str][status] = {}
@@ -799,13 +1281,14 @@ def summarize_orders(report: Dict[str, Dict[str, Dict[str, float]]], current_dat
 
             # Sum the amounts for the current day over the last three months
             for order_date_str, amount in date_amounts.items():
-                order_date_obj = datetime.strptime(order_date_str, "%d.%m.%Y")
+                order_day = day_ordinal(order_date_str)
                 # Check if the order date is within the last three months
-                if three_months_ago <= order_date_obj <= current_date_obj:
+                if order_day is not None and three_months_ago <= order_day <= current_day:
                     summarized_report[date_str][status][channel] += amount
-                    print(f"Adding {amount} to {status} for {channel} on {date_str}")  # Debug message
+                    if debug:
+                        logger.debug("Adding %s to %s for %s on %s", amount, status, channel, date_str, extra=SAMPLE)
 
-    print(f"Summarized report: {summarized_report}")  # Debug message
+    logger.debug("Summarized report: %s", summarized_report)
     return summarized_report
 
 def calculate_order_total(order, access_token: str):
@@ -849,7 +1332,7 @@ def get_product_stock_cost(product_href, access_token: str):
         "Accept-Encoding": "gzip"
     }
     try:
-        response = requests.get(stock_url, headers=headers, params=params)
+        response = _get(stock_url, headers=headers, params=params)
         response.raise_for_status()
         if response.status_code == 200:
             data = response.json()
@@ -887,20 +1370,20 @@ def fetch_categories_costs(access_token: str) -> Dict[str, float]:
         }
         
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = _get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             
             # Получаем общее количество записей при первом запросе
             if total_records is None:
                 total_records = data.get("meta", {}).get("size", 0)
-                print(f"Total records to process: {total_records}")
+                logger.info("Total records to process: %s", total_records)
             
             rows = data.get("rows", [])
             if not rows:
                 break
             
-            print(f"Processing batch: {offset + 1}-{offset + len(rows)} of {total_records}")
+            logger.debug("Processing batch: %d-%d of %s", offset + 1, offset + len(rows), total_records)
                 
             for item in rows:
                 stock = float(item.get("stock", 0))
@@ -924,7 +1407,7 @@ def fetch_categories_costs(access_token: str) -> Dict[str, float]:
             
             # Проверяем, получены ли все записи
             if offset + len(rows) >= total_records:
-                print("All records processed successfully")
+                logger.info("All records processed successfully")
                 break
                 
             offset += limit
@@ -933,7 +1416,8 @@ def fetch_categories_costs(access_token: str) -> Dict[str, float]:
             print_api_errors(e.response)
             raise e
     
-    print(f"Found categories with total costs: {categories_total}")
+    logger.info("Found total costs for %d categories", len(categories_total))
+    logger.debug("Found categories with total costs: %s", categories_total)
     return categories_total
 
 def fetch_url_stock_CHINA_in_transit(access_token: str) -> str:
@@ -956,7 +1440,7 @@ def fetch_url_stock_CHINA_in_transit(access_token: str) -> str:
         "filter": f"name=В ПУТИ ИЗ КИТАЯ"
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    response = _get(url, headers=headers, params=params)
     response.raise_for_status()
     data = response.json()
     rows = data.get("rows", [])
@@ -984,7 +1468,7 @@ def fetch_stock_CHINA_in_transit(access_token: str) -> Dict[str, int]:
         "filter": f"store={store_url}"
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    response = _get(url, headers=headers, params=params)
     response.raise_for_status()
     stock_data = response.json()
 
@@ -994,7 +1478,7 @@ def fetch_stock_CHINA_in_transit(access_token: str) -> Dict[str, int]:
         product_href = row.get('meta').get('href')
         
         # Fetch product details
-        product_response = requests.get(product_href, headers=headers)
+        product_response = _get(product_href, headers=headers)
         product_response.raise_for_status()
         product_details = product_response.json()
 
@@ -1034,52 +1518,41 @@ def calculate_costs_by_status_and_channel(access_token: str, status_channels: Di
     today = datetime.now()
     end_date = today - timedelta(days=90)  # 3 months ago
 
-    # Подготовка API запроса
-    url = "https://api.moysklad.ru/api/remap/1.2/entity/customerorder"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept-Encoding": "gzip"
     }
 
+    # Состав комплектов - из индекса (services.bundle_index), без expand компонентов
+    bundles = refresh_bundle_index(access_token, get_bundle_index())
+
     params = {
         "filter": f"moment<={today.strftime('%Y-%m-%d')} 23:59:59;moment>={end_date.strftime('%Y-%m-%d')} 00:00:00",
-        "limit": 100,
-        "expand": "positions,positions.assortment,positions.assortment.components,state,salesChannel"
+        "limit": 100,  # С expand МойСклад отдает не больше 100 строк
+        "expand": "positions,state,salesChannel"
     }
 
-    offset = 0
-    while True:
-        params['offset'] = offset
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            orders = response.json().get("rows", [])
-
-            if not orders:
-                break
-
-            for order in orders:
-                state_name = order.get('state', {}).get('name', '')
-                channel_name = order.get('salesChannel', {}).get('name', 'Неизвестный канал')
-
-                # Проверяем, есть ли статус и канал в report
-                if state_name in report and channel_name in report[state_name]:
-                    order_total = calculate_order_totals(order, get_products_stock_costs(
-                        [clean_href(position.get("assortment", {}).get("meta", {}).get("href")) for position in order.get("positions", {}).get("rows", [])],
-                        access_token
-                    ))
-
-                    # Убедимся, что order_total является числом
-                    if isinstance(order_total, (int, float)):
-                        if 'total' not in report[state_name][channel_name]:
-                            report[state_name][channel_name]['total'] = 0.0
-                        report[state_name][channel_name]['total'] += order_total
-
-            offset += params["limit"]
-
-        except requests.HTTPError as e:
-            print_api_errors(e.response)
-            raise e
+    # Позиции заказов по (статус, канал, день); себестоимость всех товаров окна
+    # запрашивается один раз после загрузки страниц, а не для каждого заказа
+    names = symbols.names
+    unknown_channel = names.intern("")
+    aggregator = OrderAggregator(codes=(), channels=True)
+    _aggregate_order_pages(headers, params, aggregator)
+    channel_orders = {}
+    for (state_id, channel_id, _), orders in aggregator.result().channel_orders.items():
+        state_name = names.value(state_id)
+        channel_name = names.value(channel_id) if channel_id != unknown_channel else 'Неизвестный канал'
+        # Проверяем, есть ли статус и канал в report
+        if state_name in report and channel_name in report[state_name]:
+            channel_orders.setdefault((state_name, channel_name), []).extend(orders)
+
+    unit_costs = get_unit_costs(access_token, (href for orders in channel_orders.values()
+                                               for positions in orders for href, _ in positions), bundles)
+    for (state_name, channel_name), orders in channel_orders.items():
+        total = report[state_name][channel_name].get('total', 0.0)
+        for positions in orders:
+            total += sum(unit_costs.get(href, 0.0) * quantity for href, quantity in positions)
+        report[state_name][channel_name]['total'] = total
 
     return report
 
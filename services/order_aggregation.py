@@ -0,0 +1,258 @@
+"""
+Агрегация страниц заказов покупателей (entity/customerorder) в пуле процессов.
+
+Страница заказов разбирается и агрегируется целиком: количество заказов по дням,
+количество товаров по дням (Лист1) и позиции каждого заказа по статусу, каналу и
+дню (себестоимость Листа5). Это чистая работа на Python, поэтому при
+ORDER_AGGREGATION_PROCESSES > 1 страницы (тело ответа как есть) отправляются в
+процессы пула, а частичные агрегаты складываются в порядке страниц - результат
+не зависит от числа процессов и порядка их завершения.
+
+Агрегаты ведутся по ID из utils.symbols. Процесс пула заполняет свои таблицы
+symbols и возвращает их вместе с агрегатом страницы; при сложении ID переводятся
+в ID таблиц текущего процесса - по одному intern на разное значение страницы.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from utils.symbols import Symbols, symbols
+
+logger = logging.getLogger(__name__)
+
+# Процессов для агрегации страниц заказов; 0 или 1 - в текущем процессе
+ORDER_AGGREGATION_PROCESSES = int(os.getenv("ORDER_AGGREGATION_PROCESSES", "0"))
+
+# Ключ заказов Листа5: (ID статуса, ID канала продаж, YYYY-MM-DD)
+ChannelDay = Tuple[int, int, str]
+# Позиции заказа: ((ID href товара или комплекта, количество), ...)
+OrderPositions = Tuple[Tuple[int, float], ...]
+
+
+class OrderAggregate:
+    """
+    Агрегаты заказов одной или нескольких страниц.
+
+    Attributes:
+        symbols: Таблицы, к которым относятся ID (в процессе пула - свои)
+        orders: Количество заказов
+        orders_per_day: {YYYY-MM-DD: количество заказов}
+        product_days: {ID кода: {YYYY-MM-DD: количество}} - позиции заказов как есть (комплект - комплектом)
+        product_hrefs: {ID кода: ID href}
+        channel_orders: {(ID статуса, ID канала, YYYY-MM-DD): [позиции каждого заказа]} - только
+            при channels=True; комплект, загруженный с positions.assortment.components,
+            разложен на компоненты, иначе остается комплектом (services.bundle_index)
+    """
+    __slots__ = ("symbols", "orders", "orders_per_day", "product_days", "product_hrefs", "channel_orders")
+
+    def __init__(self, table: Symbols = None):
+        self.symbols = table if table is not None else symbols
+        self.orders = 0
+        self.orders_per_day: Dict[str, int] = {}
+        self.product_days: Dict[int, Dict[str, float]] = {}
+        self.product_hrefs: Dict[int, int] = {}
+        self.channel_orders: Dict[ChannelDay, List[OrderPositions]] = {}
+
+    def add_orders(self, orders: Iterable[Dict], codes: Optional[FrozenSet[str]] = None, channels: bool = False):
+        """
+        Добавляет заказы (строки ответа с expand=positions[,positions.assortment,state,salesChannel]).
+
+        Args:
+            orders: Заказы
+            codes: Учитывать в product_days только эти коды (None - все)
+            channels: Собирать позиции заказов по статусу и каналу (channel_orders)
+        """
+        hrefs = self.symbols.hrefs
+        code_ids = self.symbols.codes
+        names = self.symbols.names
+        orders_per_day = self.orders_per_day
+        product_days = self.product_days
+        product_hrefs = self.product_hrefs
+        channel_orders = self.channel_orders
+        for order in orders:
+            self.orders += 1
+            day = order.get("moment", "").split(" ")[0]
+            orders_per_day[day] = orders_per_day.get(day, 0) + 1
+            positions = []
+
+            for position in order.get("positions", {}).get("rows", []):
+                assortment = position.get("assortment", {})
+                meta = assortment.get("meta", {})
+                href = hrefs.intern(meta.get("href") or "")
+                quantity = float(position.get("quantity", 0))
+
+                code = assortment.get("code")
+                if code is not None and (codes is None or code in codes):
+                    code_id = code_ids.intern(code)
+                    product_hrefs[code_id] = href
+                    by_day = product_days.get(code_id)
+                    if by_day is None:
+                        by_day = product_days[code_id] = {}
+                    by_day[day] = by_day.get(day, 0) + quantity
+
+                if not channels:
+                    continue
+                kind = meta.get("type")
+                components = assortment.get("components", {}).get("rows") if kind == "bundle" else None
+                if kind == "product" or (kind == "bundle" and components is None):
+                    # Комплект без развернутого состава раскладывается потом по индексу (services.bundle_index)
+                    positions.append((href, quantity))
+                elif kind == "bundle":
+                    for component in components:
+                        component_meta = component.get("assortment", {}).get("meta", {})
+                        positions.append((hrefs.intern(component_meta.get("href") or ""),
+                                          quantity * component.get("quantity", 1)))
+
+            if channels:
+                key = (names.intern(order.get("state", {}).get("name", "")),
+                       names.intern(order.get("salesChannel", {}).get("name", "")), day)
+                by_key = channel_orders.get(key)
+                if by_key is None:
+                    by_key = channel_orders[key] = []
+                by_key.append(tuple(positions))
+
+    def merge(self, other: "OrderAggregate"):
+        """Прибавляет агрегаты other (следующих страниц), ID other переводятся в ID self.symbols"""
+        same = other.symbols is self.symbols
+        href_ids = None if same else self.symbols.hrefs.translate(other.symbols.hrefs)
+        code_ids = None if same else self.symbols.codes.translate(other.symbols.codes)
+        name_ids = None if same else self.symbols.names.translate(other.symbols.names)
+
+        self.orders += other.orders
+        for day, count in other.orders_per_day.items():
+            self.orders_per_day[day] = self.orders_per_day.get(day, 0) + count
+        for code, by_day in other.product_days.items():
+            code = code if same else code_ids[code]
+            target = self.product_days.get(code)
+            if target is None:
+                self.product_days[code] = dict(by_day)
+                continue
+            for day, quantity in by_day.items():
+                target[day] = target.get(day, 0) + quantity
+        for code, href in other.product_hrefs.items():
+            if same:
+                self.product_hrefs[code] = href
+            else:
+                self.product_hrefs[code_ids[code]] = href_ids[href]
+        for (state, channel, day), orders in other.channel_orders.items():
+            if not same:
+                state, channel = name_ids[state], name_ids[channel]
+                orders = [tuple((href_ids[href], quantity) for href, quantity in positions) for positions in orders]
+            self.channel_orders.setdefault((state, channel, day), []).extend(orders)
+
+    def products_by_code(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, str]]:
+        """product_days и product_hrefs со строками кодов и href'ов (для результата и контрольной точки)"""
+        codes, hrefs = self.symbols.codes, self.symbols.hrefs
+        return ({codes.value(code): by_day for code, by_day in self.product_days.items()},
+                {codes.value(code): hrefs.value(href) for code, href in self.product_hrefs.items()})
+
+    def load_products(self, product_days: Dict[str, Dict[str, float]], product_hrefs: Dict[str, str]):
+        """Заполняет product_days и product_hrefs из products_by_code() (контрольная точка)"""
+        codes, hrefs = self.symbols.codes, self.symbols.hrefs
+        self.product_days = {codes.intern(code): by_day for code, by_day in product_days.items()}
+        self.product_hrefs = {codes.intern(code): hrefs.intern(href) for code, href in product_hrefs.items()}
+
+
+def aggregate_page(content: bytes, codes: Optional[FrozenSet[str]] = None, channels: bool = False) -> OrderAggregate:
+    """Агрегаты страницы заказов по телу ответа (выполняется в процессе пула, со своими таблицами symbols)"""
+    aggregate = OrderAggregate(Symbols())
+    aggregate.add_orders(json.loads(content).get("rows", []), codes, channels)
+    return aggregate
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes: int) -> ProcessPoolExecutor:
+    """Общий пул процессов (создается при первом обращении, пересоздается при другом размере)"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: дочерний процесс не наследует потоки планировщика и открытые соединения
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = processes
+            logger.info("Пул агрегации заказов: %s процессов", processes)
+        return _pool
+
+
+def shutdown_pool():
+    """Останавливает пул процессов (при следующей агрегации он создается заново)"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool, _pool_size = None, 0
+
+
+class OrderAggregator:
+    """
+    Складывает агрегаты страниц заказов по мере загрузки страниц.
+
+    При processes <= 1 страница агрегируется сразу в submit, иначе - в пуле
+    процессов, пока загружаются следующие страницы. Готовые агрегаты
+    прибавляются к итогу строго в порядке submit.
+    """
+
+    def __init__(self, codes: Iterable[str] = None, processes: int = ORDER_AGGREGATION_PROCESSES,
+                 total: OrderAggregate = None, channels: bool = False):
+        """
+        Args:
+            codes: Коды товаров для product_days (None - все)
+            processes: Процессов пула
+            total: Агрегат уже обработанных страниц (например, из контрольной точки)
+            channels: Собирать позиции заказов по статусу и каналу (channel_orders)
+        """
+        self.codes = frozenset(codes) if codes is not None else None
+        self.channels = channels
+        self.processes = processes
+        self.total = total or OrderAggregate()
+        self.pages = 0  # Страниц в total
+        self._pending: Deque[Future] = deque()
+
+    def submit(self, content: bytes):
+        """Добавляет страницу (тело ответа entity/customerorder)"""
+        if self.processes <= 1:
+            self.total.add_orders(json.loads(content).get("rows", []), self.codes, self.channels)
+            self.pages += 1
+        else:
+            self._pending.append(_get_pool(self.processes).submit(aggregate_page, content, self.codes, self.channels))
+
+    def add_orders(self, orders: List[Dict]):
+        """Добавляет уже разобранную страницу (в текущем процессе, в порядке страниц)"""
+        self.collect(wait=True)
+        self.total.add_orders(orders, self.codes, self.channels)
+        self.pages += 1
+
+    def collect(self, wait: bool = False) -> int:
+        """
+        Прибавляет к итогу готовые агрегаты из начала очереди.
+
+        Args:
+            wait: Дождаться всех страниц
+
+        Returns:
+            int: Количество страниц в итоге
+        """
+        while self._pending and (wait or self._pending[0].done()):
+            self.total.merge(self._pending.popleft().result())
+            self.pages += 1
+        return self.pages
+
+    def result(self) -> OrderAggregate:
+        """Итог по всем страницам"""
+        self.collect(wait=True)
+        return self.total
+
+    def cancel(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
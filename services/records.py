@@ -0,0 +1,90 @@
+"""
+Компактные записи для данных МойСклад. Ответы API (товары с meta, картинками и
+ценами, заказы с развернутыми позициями) разбираются сразу после получения,
+и дальше по конвейеру передаются только поля, которые нужны листам.
+"""
+from typing import Dict, List, NamedTuple, Tuple
+
+from utils.symbols import symbols
+
+
+class Product(NamedTuple):
+    """Товар или комплект из каталога МойСклад или из заполненной строки листа"""
+    code: str
+    name: str
+    category: str
+    description: str = ""
+    article: str = ""
+    href: str = ""
+    type: str = ""          # product или bundle (МойСклад)
+    product_type: str = ""  # Тип товара из колонки B Листа2 (заполняется вручную)
+
+
+class OrderPosition(NamedTuple):
+    """Позиция заказа покупателя"""
+    href: str
+    code: str
+    quantity: float
+
+
+class StockRow(NamedTuple):
+    """Строка отчета об остатках"""
+    code: str
+    href: str
+    stock: float
+
+
+class SupplyPosition(NamedTuple):
+    """Позиция приемки"""
+    code: str
+    name: str
+    category: str
+    quantity: float
+
+
+class Supply(NamedTuple):
+    """Приемка с позициями"""
+    id: str
+    moment: str
+    positions: Tuple[SupplyPosition, ...]
+
+
+def clean_href(href: str) -> str:
+    """
+    href без параметров запроса (например, ?expand=...). Строка берется из
+    symbols.hrefs: каждый href разбирается один раз и хранится в одном экземпляре.
+    """
+    return symbols.hrefs.canonical(href) if href else href
+
+
+def product_from_json(item: Dict, kind: str, default_category: str = "Без категории") -> Product:
+    """Товар или комплект из ответа entity/product или entity/bundle"""
+    return Product(
+        code=symbols.codes.canonical(item.get("code")),
+        name=item.get("name"),
+        category=item.get("pathName", default_category),
+        description=item.get("description", ""),
+        article=item.get("article", ""),
+        href=clean_href(item.get("meta", {}).get("href")),
+        type=kind
+    )
+
+
+def order_positions(order: Dict) -> List[OrderPosition]:
+    """Позиции заказа, загруженного с expand=positions,positions.assortment"""
+    positions = []
+    for position in order.get("positions", {}).get("rows", []):
+        assortment = position.get("assortment", {})
+        positions.append(OrderPosition(
+            clean_href(assortment.get("meta", {}).get("href")),
+            symbols.codes.canonical(assortment.get("code")),
+            float(position.get("quantity", 0))
+        ))
+    return positions
+
+
+def stock_rows(data: Dict) -> List[StockRow]:
+    """Строки ответа report/stock/all"""
+    return [StockRow(symbols.codes.canonical(item.get("code")), clean_href(item.get("meta", {}).get("href")),
+                     float(item.get("stock", 0)))
+            for item in data.get("rows", [])]
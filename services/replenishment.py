@@ -0,0 +1,198 @@
+"""
+Предложение закупки по всем товарам сразу: сколько заказать, чтобы покрыть
+спрос на REPLENISHMENT_HORIZON_DAYS дней с учетом остатка, будущих приемок
+и товара в пути, не выходя за бюджет и соблюдая минимальную партию (MOQ).
+
+Потребность товара: спрос без дефицита (services.demand) × горизонт минус
+остаток, приемки и товар в пути. Заказ товара - 0 или от MOQ до
+max(потребность, MOQ). Цель - минимум непокрытой потребности (шт) при
+сумме заказа не больше бюджета.
+
+Задача решается как MILP в PuLP (CBC) с ограничением времени; начальное решение
+решателю - жадное (по непокрытой потребности на рубль). Если товаров с
+потребностью больше REPLENISHMENT_MILP_MAX_SKUS или решатель не нашел решения,
+используется жадное решение.
+"""
+import logging
+import math
+import os
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pulp
+
+logger = logging.getLogger(__name__)
+
+# Бюджет закупки, руб.; 0 - без ограничения
+REPLENISHMENT_BUDGET = float(os.getenv("REPLENISHMENT_BUDGET", "0"))
+# Горизонт покрытия спроса, дней
+REPLENISHMENT_HORIZON_DAYS = int(os.getenv("REPLENISHMENT_HORIZON_DAYS", "60"))
+# Минимальная партия по умолчанию, шт
+REPLENISHMENT_MOQ = int(os.getenv("REPLENISHMENT_MOQ", "1"))
+# Ограничение времени решателя, секунды
+REPLENISHMENT_TIME_LIMIT = int(os.getenv("REPLENISHMENT_TIME_LIMIT", "120"))
+# Больше товаров с потребностью - только жадное решение
+REPLENISHMENT_MILP_MAX_SKUS = int(os.getenv("REPLENISHMENT_MILP_MAX_SKUS", "2000"))
+
+MILP = "milp"
+GREEDY = "greedy"
+
+# Заголовки колонок предложения (Лист1, справа от показателей спроса)
+REPLENISHMENT_HEADER = ["К заказу", "Сумма заказа"]
+
+
+class ReplenishmentPlan(NamedTuple):
+    """Предложение закупки, массивы по товарам"""
+    quantities: np.ndarray  # К заказу, шт
+    cost: float             # Сумма заказа
+    shortage: float         # Непокрытая потребность, шт
+    method: str             # MILP или GREEDY
+
+
+def replenishment_need(demand: np.ndarray, stock: np.ndarray, incoming: np.ndarray, transit: np.ndarray,
+                       horizon: int = REPLENISHMENT_HORIZON_DAYS) -> np.ndarray:
+    """
+    Потребность в закупке, шт (целые, не меньше 0).
+
+    Args:
+        demand: Спрос в день (NaN - нет оценки, потребности нет)
+        stock: Текущий остаток (NaN - 0)
+        incoming: Будущие приемки за горизонт (NaN - 0)
+        transit: Товар в пути (NaN - 0)
+        horizon: Горизонт, дней
+    """
+    covered = np.nan_to_num(stock, nan=0.0) + np.nan_to_num(incoming, nan=0.0) + np.nan_to_num(transit, nan=0.0)
+    need = np.nan_to_num(demand, nan=0.0) * horizon - covered
+    return np.ceil(np.maximum(need, 0.0))
+
+
+def _evaluate(quantities: np.ndarray, need: np.ndarray, cost: np.ndarray):
+    """Сумма заказа и непокрытая потребность"""
+    return float(quantities @ cost), float(np.maximum(need - quantities, 0.0).sum())
+
+
+def plan_greedy(need: np.ndarray, cost: np.ndarray, moq: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Жадное решение: товары по убыванию покрытой потребности на рубль, заказ
+    max(потребность, MOQ); если заказ не помещается в остаток бюджета - наибольший
+    кратный штуке заказ не меньше MOQ, который помещается.
+    """
+    quantities = np.zeros(len(need))
+    order = np.maximum(need, moq)
+    candidates = np.flatnonzero((need > 0) & (cost > 0))
+    if not math.isfinite(budget):
+        quantities[candidates] = order[candidates]
+        return quantities
+
+    with np.errstate(divide="ignore"):
+        ratio = need[candidates] / (order[candidates] * cost[candidates])
+    remaining = budget
+    for idx in candidates[np.argsort(-ratio, kind="stable")].tolist():
+        amount = order[idx] * cost[idx]
+        if amount <= remaining:
+            quantities[idx] = order[idx]
+            remaining -= amount
+            continue
+        partial = math.floor(remaining / cost[idx])
+        if partial >= moq[idx]:
+            quantities[idx] = partial
+            remaining -= partial * cost[idx]
+    return quantities
+
+
+def plan_milp(need: np.ndarray, cost: np.ndarray, moq: np.ndarray, budget: float,
+              time_limit: int = REPLENISHMENT_TIME_LIMIT, start: np.ndarray = None) -> Optional[np.ndarray]:
+    """
+    Решение MILP (PuLP, CBC) с ограничением времени.
+
+    Args:
+        start: Начальное решение (например, plan_greedy)
+
+    Returns:
+        Optional[np.ndarray]: Количества или None, если решение не найдено
+    """
+    candidates = np.flatnonzero((need > 0) & (cost > 0)).tolist()
+    quantities = np.zeros(len(need))
+    if not candidates:
+        return quantities
+
+    problem = pulp.LpProblem("replenishment", pulp.LpMinimize)
+    order, buy, shortage = {}, {}, {}
+    for idx in candidates:
+        upper = max(need[idx], moq[idx])
+        order[idx] = pulp.LpVariable(f"q{idx}", 0, upper, cat=pulp.LpInteger)
+        buy[idx] = pulp.LpVariable(f"y{idx}", cat=pulp.LpBinary)
+        shortage[idx] = pulp.LpVariable(f"s{idx}", 0)
+        problem += order[idx] >= moq[idx] * buy[idx]
+        problem += order[idx] <= upper * buy[idx]
+        problem += shortage[idx] >= need[idx] - order[idx]
+        if start is not None:
+            order[idx].setInitialValue(start[idx])
+            buy[idx].setInitialValue(int(start[idx] > 0))
+            shortage[idx].setInitialValue(max(need[idx] - start[idx], 0.0))
+
+    # Заказ сверх потребности (из-за MOQ) - только если он ничего не ухудшает
+    total_cost = pulp.lpSum(cost[idx] * order[idx] for idx in candidates)
+    scale = 1e-6 / max(float(cost[candidates].max()), 1.0)
+    problem += pulp.lpSum(shortage.values()) + scale * total_cost
+    if math.isfinite(budget):
+        problem += total_cost <= budget
+
+    solver = pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, warmStart=start is not None)
+    problem.solve(solver)
+    if problem.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        logger.warning("Решатель закупки не нашел решения: %s", pulp.LpStatus[problem.status])
+        return None
+    for idx in candidates:
+        quantities[idx] = round(order[idx].value() or 0.0)
+    return quantities
+
+
+def plan_replenishment(need: np.ndarray, cost: np.ndarray, moq: np.ndarray = None,
+                       budget: float = REPLENISHMENT_BUDGET, time_limit: int = REPLENISHMENT_TIME_LIMIT,
+                       max_milp_skus: int = REPLENISHMENT_MILP_MAX_SKUS) -> ReplenishmentPlan:
+    """
+    Предложение закупки (см. описание модуля).
+
+    Args:
+        need: Потребность, шт (replenishment_need)
+        cost: Себестоимость единицы (0 - неизвестна, товар не заказывается)
+        moq: Минимальная партия, шт (по умолчанию REPLENISHMENT_MOQ)
+        budget: Бюджет, 0 - без ограничения
+        time_limit: Ограничение времени решателя, секунды
+        max_milp_skus: Больше товаров с потребностью - только жадное решение
+
+    Returns:
+        ReplenishmentPlan: Предложение
+    """
+    need = np.asarray(need, dtype=np.float64)
+    cost = np.nan_to_num(np.asarray(cost, dtype=np.float64), nan=0.0)
+    moq = np.full(len(need), float(REPLENISHMENT_MOQ)) if moq is None else np.asarray(moq, dtype=np.float64)
+    moq = np.maximum(moq, 1.0)
+    budget = budget if budget > 0 else math.inf
+
+    unpriced = int(((need > 0) & (cost <= 0)).sum())
+    if unpriced:
+        logger.warning("Закупка: у %s товаров с потребностью нет себестоимости, они не заказываются", unpriced)
+
+    started = time.perf_counter()
+    quantities = plan_greedy(need, cost, moq, budget)
+    method = GREEDY
+    cost_total, shortage = _evaluate(quantities, need, cost)
+
+    candidates = int(((need > 0) & (cost > 0)).sum())
+    if math.isfinite(budget) and 0 < candidates <= max_milp_skus:
+        solved = plan_milp(need, cost, moq, budget, time_limit, start=quantities)
+        if solved is not None:
+            solved_cost, solved_shortage = _evaluate(solved, need, cost)
+            # Решение, прерванное по времени, может быть хуже начального
+            if solved_cost <= budget + 1e-6 and solved_shortage <= shortage:
+                quantities, method = solved, MILP
+                cost_total, shortage = solved_cost, solved_shortage
+    elif candidates > max_milp_skus:
+        logger.info("Закупка: %s товаров с потребностью > %s, жадное решение", candidates, max_milp_skus)
+
+    logger.info("Закупка (%s): %s товаров, сумма %.2f, непокрытая потребность %s шт, %.1f с",
+                method, int((quantities > 0).sum()), cost_total, shortage, time.perf_counter() - started)
+    return ReplenishmentPlan(quantities, cost_total, shortage, method)
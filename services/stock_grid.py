@@ -0,0 +1,323 @@
+import math
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from gspread.utils import rowcol_to_a1
+
+from services.demand import DEMAND_HEADER
+from utils.date_handler import NO_DATE, day_ordinals, format_days
+
+STOCK = 0
+ORDERS = 1
+
+
+def _to_number(value: str) -> float:
+    """Преобразует значение ячейки в число, пустые и нечисловые ячейки -> NaN"""
+    value = value.strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
+    if not value:
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _cell_value(value: float):
+    """Число для записи в лист: целые значения -> int"""
+    return int(value) if value.is_integer() else value
+
+
+def _written_value(value: float):
+    """Значение измененной ячейки для записи: очищенная ячейка - пустая строка"""
+    return "" if math.isnan(value) else _cell_value(value)
+
+
+def _serialize(block: np.ndarray, cells: np.ndarray) -> List[List]:
+    """
+    Значения блока для записи в лист: числа - как есть (целые -> int),
+    нераспознанные ячейки (NaN) - исходный текст ячейки.
+    """
+    rows = np.array(cells, dtype=object)
+    numeric = ~np.isnan(block)
+    numbers = block[numeric]
+    integral = numbers == np.trunc(numbers)
+    values = numbers.astype(object)
+    values[integral] = numbers[integral].astype(np.int64).astype(object)
+    rows[numeric] = values
+    return rows.tolist()
+
+
+def _runs(indices) -> List[List[int]]:
+    """Разбивает отсортированные индексы на непрерывные отрезки"""
+    runs = []
+    for idx in indices:
+        if runs and runs[-1][-1] == idx - 1:
+            runs[-1].append(idx)
+        else:
+            runs.append([idx])
+    return runs
+
+
+class StockGrid:
+    """
+    Плотная модель блока остатков/заказов Листа1 (E..GB): товары × дни × {остаток, заказы}.
+
+    Значения хранятся в массиве NumPy формы (товары, дни, 2), пустые и нечисловые
+    ячейки - NaN; исходный текст ячеек хранится рядом (cells), нечисловые ячейки
+    записываются обратно без изменений. Измененные ячейки отмечаются в changed,
+    changed_ranges() записывает только их.
+
+    Ось дней - кольцевой буфер: логический день j лежит в физическом слоте
+    (origin + j) % num_days. Сдвиг окна на N дней очищает только N освободившихся
+    слотов, остальные данные не перемещаются (запись в лист после сдвига все равно
+    переписывает весь блок).
+    """
+
+    def __init__(self, codes: Sequence[str], day_ordinals: Sequence[int], values: Optional[np.ndarray] = None,
+                 header_row: int = 5, first_col: int = 5, stock_label: str = "Ост.",
+                 cells: Optional[np.ndarray] = None):
+        self.codes = list(codes)
+        self.row_index = {code: idx for idx, code in enumerate(self.codes) if code}
+        self.header_row = header_row
+        self.first_col = first_col
+        self.stock_label = stock_label
+
+        self._days = np.asarray(day_ordinals, dtype=np.int64).copy()
+        shape = (len(self.codes), len(self._days), 2)
+        self.values = np.full(shape, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+        if self.values.shape != shape:
+            raise ValueError(f"Размер массива {self.values.shape} не совпадает с ожидаемым {shape}")
+        if cells is None:
+            cells = np.full(shape, "", dtype=object)
+        self.cells = np.asarray(cells, dtype=object)
+        if self.cells.shape != shape:
+            raise ValueError(f"Размер массива ячеек {self.cells.shape} не совпадает с ожидаемым {shape}")
+        self.changed = np.zeros(shape, dtype=bool)
+
+        self._origin = 0
+        self._rebuild_day_index()
+
+    @property
+    def num_days(self) -> int:
+        return len(self._days)
+
+    @property
+    def num_products(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_sheet_values(cls, all_values: List[List[str]], header_row: int = 5, first_col: int = 5,
+                          max_days: Optional[int] = 90) -> "StockGrid":
+        """
+        Загружает модель из снимка листа (результат worksheet.get_all_values()).
+
+        Args:
+            all_values: Все значения листа
+            header_row: Строка заголовков с датами (1-based)
+            first_col: Первая колонка блока - остаток первого дня (1-based, E = 5)
+            max_days: Максимальное количество дней в блоке, None - до конца заголовка
+        """
+        header = all_values[header_row - 1] if len(all_values) >= header_row else []
+        start = first_col - 1
+
+        # Непарная колонка остатка в конце заголовка (без даты) в блок не входит
+        num_days = max(0, (len(header) - start) // 2)
+        # Блок заканчивается перед колонками показателей спроса (services.demand)
+        if DEMAND_HEADER[0] in header[start:]:
+            num_days = min(num_days, (header.index(DEMAND_HEADER[0], start) - start) // 2)
+        if max_days is not None:
+            num_days = min(num_days, max_days)
+        # Отбрасываем пустые пары справа
+        while num_days and not header[start + 2 * num_days - 1].strip():
+            num_days -= 1
+
+        # Заголовки дат dd.mm.yyyy -> порядковые номера дней одним пакетом
+        ordinals = day_ordinals(header[start + 1:start + 2 * num_days:2])
+        stock_label = header[start].strip() if num_days and header[start].strip() else "Ост."
+
+        data_rows = all_values[header_row:]
+        codes = [row[0].strip() if row else "" for row in data_rows]
+        width = 2 * num_days
+        flat = np.full((len(data_rows), width), np.nan)
+        text = np.full((len(data_rows), width), "", dtype=object)
+        for row_idx, row in enumerate(data_rows):
+            cells = row[start:start + width]
+            if cells:
+                flat[row_idx, :len(cells)] = [_to_number(cell) for cell in cells]
+                text[row_idx, :len(cells)] = cells
+
+        shape = (len(data_rows), num_days, 2)
+        return cls(codes, ordinals, flat.reshape(shape), header_row=header_row, first_col=first_col,
+                   stock_label=stock_label, cells=text.reshape(shape))
+
+    def _rebuild_day_index(self):
+        order = np.argsort(self._days, kind="stable")
+        self._sorted_days = self._days[order]
+        self._sorted_slots = order
+
+    def _logical_order(self) -> np.ndarray:
+        """Физические слоты в логическом порядке (от ранней даты к поздней)"""
+        return (self._origin + np.arange(self.num_days)) % max(self.num_days, 1)
+
+    def slots_for(self, ordinals) -> np.ndarray:
+        """Возвращает физические слоты для порядковых номеров дней, -1 если дня нет в окне"""
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        if not self.num_days:
+            return np.full(ordinals.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_days, ordinals)
+        pos = np.clip(pos, 0, self.num_days - 1)
+        found = (self._sorted_days[pos] == ordinals) & (ordinals != NO_DATE)
+        return np.where(found, self._sorted_slots[pos], -1)
+
+    def dates(self) -> List[Optional[date]]:
+        """Даты окна в логическом порядке"""
+        return [date.fromordinal(int(d)) if d != NO_DATE else None for d in self._days[self._logical_order()]]
+
+    def history(self):
+        """
+        Остатки, заказы (товары, дни) и порядковые номера дней в логическом
+        порядке - вход services.demand.demand_stats.
+        """
+        order = self._logical_order()
+        return self.values[:, order, STOCK], self.values[:, order, ORDERS], self._days[order]
+
+    def assign(self, kind: int, rows, ordinals, values) -> int:
+        """
+        Векторно записывает значения в ячейки (товар, день) указанного вида.
+        Значения округляются вниз до целого, как они записываются в лист;
+        ячейки, значение которых изменилось, отмечаются в changed.
+
+        Args:
+            kind: STOCK или ORDERS
+            rows: Индексы строк товаров
+            ordinals: Порядковые номера дней
+            values: Значения
+
+        Returns:
+            int: Количество записанных ячеек (дни вне окна пропускаются)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        slots = self.slots_for(ordinals)
+        mask = slots >= 0
+        self._set(rows[mask], slots[mask], kind, np.trunc(values[mask]))
+        return int(mask.sum())
+
+    def _set(self, rows: np.ndarray, slots: np.ndarray, kind: int, values: np.ndarray):
+        current = self.values[rows, slots, kind]
+        differs = ~((current == values) | (np.isnan(current) & np.isnan(values)))
+        self.values[rows, slots, kind] = values
+        self.changed[rows[differs], slots[differs], kind] = True
+
+    def apply_orders_data(self, orders_data: List[Dict]) -> int:
+        """
+        Переносит в модель данные fetch_customer_orders_for_products.
+        Обновляются только даты, присутствующие в данных, остальные ячейки не меняются.
+
+        Returns:
+            int: Количество обновленных ячеек
+        """
+        updated = 0
+        for kind, key in ((ORDERS, "orders_by_date"), (STOCK, "stock_by_date")):
+            rows, dates, values = [], [], []
+            for item in orders_data:
+                row = self.row_index.get(item.get("code"))
+                if row is None:
+                    continue
+                for date_str, value in item.get(key, {}).items():
+                    rows.append(row)
+                    dates.append(date_str)
+                    values.append(value)
+            if rows:
+                updated += self.assign(kind, rows, day_ordinals(dates), values)
+        return updated
+
+    def clear_days(self, kind: int, ordinals):
+        """
+        Очищает числовые значения вида kind у всех товаров за указанные дни.
+        Строки без кода товара и нечисловые ячейки не меняются.
+        """
+        slots = self.slots_for(ordinals)
+        slots = slots[slots >= 0]
+        rows = np.fromiter(self.row_index.values(), dtype=np.int64, count=len(self.row_index))
+        rows, slots = np.repeat(rows, len(slots)), np.tile(slots, len(rows))
+        self._set(rows, slots, kind, np.full(len(rows), np.nan))
+
+    def changed_ranges(self) -> List[Dict]:
+        """
+        Обновления для batch_update только по измененным ячейкам (changed): по
+        прямоугольнику на каждый непрерывный отрезок строк с изменениями и отрезок
+        колонок, измененных в этих строках. Неизмененные ячейки внутри прямоугольника
+        передаются как None - Sheets API их не трогает.
+        """
+        order = self._logical_order()
+        shape = (self.num_products, 2 * self.num_days)
+        changed = self.changed[:, order, :].reshape(shape)
+        values = self.values[:, order, :].reshape(shape)
+
+        updates = []
+        for rows in _runs(np.flatnonzero(changed.any(axis=1)).tolist()):
+            row_changed = changed[rows[0]:rows[-1] + 1]
+            for cols in _runs(np.flatnonzero(row_changed.any(axis=0)).tolist()):
+                block = values[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+                mask = row_changed[:, cols[0]:cols[-1] + 1]
+                cells = [[_written_value(value) if is_changed else None
+                          for value, is_changed in zip(block_row, mask_row)]
+                         for block_row, mask_row in zip(block.tolist(), mask.tolist())]
+                first_row = self.header_row + 1 + rows[0]
+                first_col = self.first_col + cols[0]
+                updates.append({
+                    'range': f"{rowcol_to_a1(first_row, first_col)}:"
+                             f"{rowcol_to_a1(first_row + len(rows) - 1, first_col + len(cols) - 1)}",
+                    'values': cells
+                })
+        return updates
+
+    def shift(self, days: int = 1):
+        """
+        Сдвигает окно на days дней вперед: самые ранние дни выпадают, справа
+        появляются пустые дни с датами, следующими за последней датой окна.
+        """
+        n = self.num_days
+        if days <= 0 or not n:
+            return
+        last = self._days[(self._origin + n - 1) % n]
+        if last == NO_DATE:
+            raise ValueError("Последняя дата окна не распознана, сдвиг невозможен")
+
+        days_to_clear = min(days, n)
+        self._origin = (self._origin + days) % n
+        # Освобожденные слоты теперь занимают последние логические позиции
+        freed = (self._origin + np.arange(n - days_to_clear, n)) % n
+        self.values[:, freed, :] = np.nan
+        self.cells[:, freed, :] = ""
+        self.changed[:, freed, :] = False
+        self._days[freed] = last + days - days_to_clear + 1 + np.arange(days_to_clear)
+        self._rebuild_day_index()
+
+    def header_values(self) -> List[str]:
+        """Строка заголовков блока: пары ('Ост.', дата)"""
+        header = []
+        for date_str in format_days(self._days[self._logical_order()]):
+            header.extend([self.stock_label, date_str])
+        return header
+
+    def to_values(self, include_header: bool = False) -> List[List]:
+        """
+        Сериализует весь блок в прямоугольный список строк для одного worksheet.update
+        (сдвиг окна). Числа записываются как есть, нечисловые ячейки - исходным текстом.
+        """
+        order = self._logical_order()
+        shape = (self.num_products, 2 * self.num_days)
+        rows = _serialize(self.values[:, order, :].reshape(shape), self.cells[:, order, :].reshape(shape))
+        if include_header:
+            rows.insert(0, self.header_values())
+        return rows
+
+    def a1_range(self, include_header: bool = False) -> str:
+        """A1-диапазон, соответствующий to_values()"""
+        first_row = self.header_row if include_header else self.header_row + 1
+        last_row = self.header_row + max(self.num_products, 1)
+        last_col = self.first_col + max(2 * self.num_days, 1) - 1
+        return f"{rowcol_to_a1(first_row, self.first_col)}:{rowcol_to_a1(last_row, last_col)}"
@@ -1,6 +1,13 @@
+import logging
+import os
+import socket
+import sqlite3
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pytz
 import schedule
 
@@ -12,178 +19,719 @@ from services.google_sheets_handler import (
     update_sheet3, get_supply_dates_from_sheet3, update_supply_quantities_in_sheet3,
     get_sales_channels_and_statuses, update_sales_report_in_sheet5, update_categories_costs_in_sheet5,
     update_transits_costs_in_sheet5, update_daily_stats_in_sheet5_sliding_window, sheet3_sliding_window,
-    update_daily_stats_sliding_window
+    update_daily_stats_sliding_window, update_daily_stats_days_in_sheet, get_dates_from_header,
+    update_replenishment_in_sheet
 )
 from services.moysklad_api import (
     fetch_product_details_by_codes, fetch_customer_orders_for_products,
-    fetch_supplies_by_date_range, fetch_orders_by_channels, fetch_categories_costs, fetch_stock_CHINA_in_transit,
-    fetch_url_stock_CHINA_in_transit, fetch_product_stock, calculate_costs_by_status_and_channel, fetch_product_stock2
+    fetch_supplies_by_date_range, fetch_categories_costs, fetch_stock_CHINA_in_transit,
+    fetch_url_stock_CHINA_in_transit, fetch_product_stock2,
+    fetch_customer_orders_incremental, update_cost_cube, fetch_transit_stock, get_products_stock_costs
 )
-from utils.date_handler import get_current_day_date_range
+from services.bundle_index import get_bundle_index
+from services.cost_cube import get_cost_cube
+from services.demand import demand_stats
+from services.records import Product, Supply
+from services.replenishment import REPLENISHMENT_HORIZON_DAYS, ReplenishmentPlan, plan_replenishment, replenishment_need
+from services.stock_grid import StockGrid
+from utils.date_handler import day_ordinal, get_current_day_date_range, moment_to_sheet_date, today_ordinal
+from utils.checkpoint import CHECKPOINT_DIR, CheckpointStore, StateStore
+from utils.instrumentation import instrument_spreadsheet
+from utils.job_executor import JobExecutor
+from utils.metrics import metrics, record_rows
+from utils.pipeline import Pipeline
+from utils.symbols import symbols
+from utils.task_queue import DEFAULT_TASK_QUEUE_PATH, TASK_QUEUE_PATH, Task, TaskQueue
+from utils.tenants import JOB_NAMES, SheetLayout, Tenant, load_tenants
 import gspread
 
-from auth.google_auth import authenticate_google_sheets
-from auth.moysklad_auth import get_access_token
+from auth.google_auth import google_clients
+from auth.moysklad_auth import get_token_manager, moysklad_tokens
 import config
 
-def process_sheet1(spreadsheet, token):
+logger = logging.getLogger(__name__)
+
+# Таймауты стадий ночного конвейера, секунды
+NIGHTLY_STAGE_TIMEOUTS = {
+    "catalog": 30 * 60,
+    "stock": 30 * 60,
+    "orders": 3 * 60 * 60,
+    "supplies": 60 * 60,
+    "replenishment": 30 * 60,
+}
+NIGHTLY_FETCH_RETRIES = 2
+# Параллельных стадий ночного конвейера на организацию
+NIGHTLY_STAGE_WORKERS = 4
+
+# Полный пересчет 90 дней Листа1 вместо инкрементального обновления
+SHEET1_FULL_RECOMPUTE = os.getenv("SHEET1_FULL_RECOMPUTE", "").lower() in ("1", "true", "yes")
+SHEET1_STATE = "sheet1"
+
+# Себестоимость заказов по статусам и каналам на Листе5 (из куба services.cost_cube)
+SHEET5_SALES_REPORT = os.getenv("SHEET5_SALES_REPORT", "").lower() in ("1", "true", "yes")
+
+# Предложение закупки на Листе1 в ночном конвейере (services.replenishment)
+REPLENISHMENT = os.getenv("REPLENISHMENT", "").lower() in ("1", "true", "yes")
+
+# Аренда задачи очереди исполнителем, секунды (продлевается, пока задача выполняется)
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "300"))
+# Попыток выполнения задачи очереди и пауза перед повтором, секунды
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "2"))
+TASK_RETRY_DELAY = float(os.getenv("TASK_RETRY_DELAY", "300"))
+# Сколько хранить выполненные задачи в очереди, секунды
+TASK_RETENTION = 7 * 24 * 60 * 60
+
+def process_sheet1(spreadsheet, token, full: bool = SHEET1_FULL_RECOMPUTE, state_dir: str = CHECKPOINT_DIR):
     """Handles processing for Sheet1"""
     worksheet1 = spreadsheet.sheet1
     existing_products = get_products_with_details(worksheet1)
-    print(f"Found {len(existing_products)} products with existing details in Sheet1")
+    logger.info("Found %s products with existing details in Sheet1", len(existing_products))
 
     product_codes = get_product_codes_from_sheet(worksheet1)
-    print(f"Found {len(product_codes)} product codes in Sheet1")
+    logger.info("Found %s product codes in Sheet1", len(product_codes))
 
     products = fetch_product_details_by_codes(token, product_codes, existing_products)
-    update_product_details_in_sheet(worksheet1, products)
-    print("New product details updated in Sheet1")
 
+    orders = fetch_sheet1_orders(token, products, full=full, state_dir=state_dir)
+    write_sheet1(worksheet1, products, orders, state_dir)
+
+def fetch_sheet1_orders(token, products, transit_store: str = None, full: bool = False,
+                        state_dir: str = CHECKPOINT_DIR) -> Dict:
+    """
+    Получает заказы и остатки для Листа1. По умолчанию инкрементально: только дни
+    с заказами, измененными после предыдущего успешного запуска. Полный пересчет
+    выполняется при full=True, при отсутствии состояния или если не прошла
+    проверка согласованности. Состояние и контрольные точки хранятся в state_dir
+    (у каждой организации свой каталог).
+
+    Returns:
+        Dict: {"orders_data", "days" (None при полном пересчете), "state"}
+    """
+    # Водяной знак во времени МойСклад, с запасом на расхождение часов
+    started = (datetime.now(pytz.timezone('Europe/Moscow')) - timedelta(minutes=5)).strftime("%Y-%m-%d %H:%M:%S")
     start_date, end_date = get_current_day_date_range()
-    orders_data = fetch_customer_orders_for_products(token, start_date, end_date, products)
-    print(f"Processed orders for {len(orders_data)} products")
+
+    state = None if full else StateStore(state_dir).load(SHEET1_STATE)
+    incremental = None
+    if state:
+        incremental = fetch_customer_orders_incremental(token, start_date, end_date, products, state, transit_store)
+
+    if incremental:
+        orders_data, days, new_state = incremental["orders_data"], incremental["days"], incremental["state"]
+        logger.info("Инкрементальное обновление Листа1 за %s дней", len(days))
+    else:
+        new_state = {}
+        # Прогресс сохраняется, повтор стадии продолжит загрузку с места ошибки
+        orders_data = fetch_customer_orders_for_products(token, start_date, end_date, products, transit_store,
+                                                         checkpoint=CheckpointStore(state_dir), state=new_state)
+        days = None
+        logger.info("Полный пересчет Листа1")
+
+    new_state.update({"watermark": started, "codes": list(products)})
+    return {"orders_data": orders_data, "days": days, "state": new_state}
+
+def write_sheet1(worksheet1, products, orders, state_dir: str = CHECKPOINT_DIR):
+    """Writes product details and daily stats into Sheet1"""
+    update_product_details_in_sheet(worksheet1, products)
+    logger.info("New product details updated in Sheet1")
+
+    logger.info("Processed orders for %s products", len(orders['orders_data']))
 
     #update_daily_stats_sliding_window(worksheet1)
 
-    update_daily_stats_in_sheet(worksheet1, orders_data)
-    print("Daily statistics updated in Sheet1")
+    if orders["days"] is None:
+        update_daily_stats_in_sheet(worksheet1, orders["orders_data"])
+    else:
+        update_daily_stats_days_in_sheet(worksheet1, orders["orders_data"], orders["days"])
+    logger.info("Daily statistics updated in Sheet1")
+    record_rows("sheet1", len(orders["orders_data"]))
+
+    # Состояние сохраняется только после успешной записи в лист
+    StateStore(state_dir).save(SHEET1_STATE, orders["state"])
 
-def process_sheet2(spreadsheet, token):
+def process_sheet2(spreadsheet, token, layout: SheetLayout = SheetLayout()):
     """Handles processing for Sheet2"""
     try:
-        worksheet = spreadsheet.worksheet("Лист2")
+        worksheet = spreadsheet.worksheet(layout.sheet2)
         existing_products = get_products_with_details_sheet2(worksheet)
-        print(f"Found {len(existing_products)} products with existing details in Sheet2")
+        logger.info("Found %s products with existing details in Sheet2", len(existing_products))
         product_codes = get_product_codes_from_sheet2(worksheet)
-        print(f"Found {len(product_codes)} product codes in Sheet2")
+        logger.info("Found %s product codes in Sheet2", len(product_codes))
         products = fetch_product_details_by_codes(token, product_codes, existing_products)
         update_product_details_in_sheet2(worksheet, products)
-        print("New product details updated in Sheet2")
+        logger.info("New product details updated in Sheet2")
     except Exception as e:
-        print(f"Error processing Sheet2: {e}")
+        logger.error("Error processing Sheet2: %s", e)
 
 
 
-def process_sheet3(spreadsheet, token):
+def get_product_codes_from_sheet3(worksheet3) -> List[str]:
+    """Коды товаров Листа6 (с 4-й строки)"""
+    return [row[0].strip() for row in worksheet3.get_all_values()[3:] if row and row[0].strip()]
+
+
+def process_sheet3(spreadsheet, token, layout: SheetLayout = SheetLayout()):
     """Обрабатывает данные приемок для Листа3 для будущих дат"""
     try:
-        worksheet3 = spreadsheet.worksheet("Лист6")
+        worksheet3 = spreadsheet.worksheet(layout.sheet3)
         #sheet3_sliding_window(worksheet3)
-        # Get all worksheet data in one call
-        all_values = worksheet3.get_all_values()
-        
-        # Extract product codes from the data (starting from row 4)
-        product_codes = [row[0].strip() for row in all_values[3:] if row[0].strip()]
-        print(f"Found {len(product_codes)} product codes")
-        
+        product_codes = get_product_codes_from_sheet3(worksheet3)
+        logger.info("Found %s product codes", len(product_codes))
+
         # Get stock quantities in one API call
         stock_quantities = fetch_product_stock2(token, product_codes)
-        
-        # Prepare batch updates for stock quantities
-        updates = []
-        for idx, code in enumerate(product_codes, start=4):
-            stock_quantity = stock_quantities.get(code, 0)
-            
-            # Get existing cell value from our cached all_values
-            current_value = all_values[idx-1][3] if len(all_values[idx-1]) > 3 else ""
-            
-            new_value = (f"{current_value}+{stock_quantity}" 
-                        if current_value.startswith('=') 
-                        else stock_quantity)
-            
-            updates.append({
-                'range': f'D{idx}',
-                'values': [[new_value]]
-            })
-        
-        # Perform single batch update
-        if updates:
-            worksheet3.batch_update(updates)
-            print(f"Updated stock quantities for {len(updates)} products")
-        
-        # Get and process supplies data
+
+        # Get supplies data
         current_date = datetime.now().strftime("%Y-%m-%d")
         supplies = fetch_supplies_by_date_range(token, current_date)
-        
-        if supplies:
-            supplies_quantities = {}
-            for supply in supplies:
-                try:
-                    moment = supply['moment'].split('.')[0]
-                    supply_date = datetime.strptime(moment, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-                    
-                    for position in supply['positions']:
-                        code = position['code']
-                        if code in product_codes:
-                            supplies_quantities.setdefault(code, {})
-                            supplies_quantities[code][supply_date] = (
-                                supplies_quantities[code].get(supply_date, 0) + 
-                                position['quantity']
-                            )
-                except ValueError as e:
-                    print(f"Error processing date for supply {supply.get('id')}: {e}")
-                    continue
-            
-            if supplies_quantities:
-                update_supply_quantities_in_sheet3(worksheet3, supplies_quantities)
-                print(f"Updated future supplies data")
-            else:
-                print("No future supplies data to update")
-                
+
+        write_sheet3_stock_and_supplies(worksheet3, stock_quantities, supplies)
+
     except Exception as e:
-        print(f"Error processing Sheet3: {str(e)}")
+        logger.error("Error processing Sheet3: %s", e)
         raise
 
-def process_sheet5(worksheet, token):
+
+def write_sheet3_stock_and_supplies(worksheet3, stock_quantities: Dict[str, float], supplies: List[Supply]):
+    """Записывает в Лист6 текущие остатки (колонка D) и будущие приемки по датам"""
+    # Get all worksheet data in one call
+    all_values = worksheet3.get_all_values()
+
+    # Extract product codes from the data (starting from row 4)
+    product_codes = [row[0].strip() for row in all_values[3:] if row[0].strip()]
+
+    # Prepare batch updates for stock quantities
+    updates = []
+    for idx, code in enumerate(product_codes, start=4):
+        stock_quantity = stock_quantities.get(code, 0)
+
+        # Get existing cell value from our cached all_values
+        current_value = all_values[idx-1][3] if len(all_values[idx-1]) > 3 else ""
+
+        new_value = (f"{current_value}+{stock_quantity}"
+                    if current_value.startswith('=')
+                    else stock_quantity)
+
+        updates.append({
+            'range': f'D{idx}',
+            'values': [[new_value]]
+        })
+
+    # Perform single batch update
+    if updates:
+        worksheet3.batch_update(updates)
+        logger.info("Updated stock quantities for %s products", len(updates))
+        record_rows("sheet6", len(updates))
+
+    # Process supplies data
+    if supplies:
+        supplies_quantities = {}
+        for supply in supplies:
+            supply_date = moment_to_sheet_date(supply.moment)
+            if supply_date is None:
+                logger.error("Error processing date for supply %s: invalid moment %r", supply.id, supply.moment)
+                continue
+
+            for position in supply.positions:
+                code = position.code
+                if code in product_codes:
+                    supplies_quantities.setdefault(code, {})
+                    supplies_quantities[code][supply_date] = (
+                        supplies_quantities[code].get(supply_date, 0) +
+                        position.quantity
+                    )
+
+        if supplies_quantities:
+            update_supply_quantities_in_sheet3(worksheet3, supplies_quantities)
+            logger.info("Updated future supplies data")
+        else:
+            logger.info("No future supplies data to update")
+
+def replenish_sheet1(worksheet1, token, products: Dict[str, Product], supplies: List[Supply],
+                     transit: Dict[str, float]) -> ReplenishmentPlan:
+    """
+    Считает предложение закупки по товарам Листа1 и записывает его рядом с показателями спроса.
+    Спрос и остаток - из блока остатков/заказов листа, приемки - будущие в пределах горизонта.
+    """
+    all_values = worksheet1.get_all_values()
+    grid = StockGrid.from_sheet_values(all_values)
+    stats = demand_stats(*grid.history())
+
+    last_day = today_ordinal() + REPLENISHMENT_HORIZON_DAYS
+    incoming = {}
+    for supply in supplies:
+        day = day_ordinal((supply.moment or "")[:10])
+        if day is None or day > last_day:
+            continue
+        for position in supply.positions:
+            incoming[position.code] = incoming.get(position.code, 0.0) + position.quantity
+
+    codes = grid.codes
+    need = replenishment_need(stats.adjusted, stats.stock,
+                              np.array([incoming.get(code, 0.0) for code in codes]),
+                              np.array([transit.get(code, 0.0) for code in codes]))
+
+    # Себестоимость запрашивается только для товаров с потребностью
+    hrefs = {code: products[code].href for code, value in zip(codes, need) if value > 0
+             and code in products and products[code].href}
+    costs_by_href = get_products_stock_costs(list(hrefs.values()), token)
+    costs = np.array([costs_by_href.get(symbols.hrefs.intern(hrefs[code]), 0.0) if code in hrefs else 0.0
+                      for code in codes])
+
+    plan = plan_replenishment(need, costs)
+    update_replenishment_in_sheet(worksheet1, all_values, grid, plan.quantities, costs)
+    return plan
+
+
+def process_sheet5(worksheet, token, state_dir: str = CHECKPOINT_DIR, sales_report: bool = SHEET5_SALES_REPORT):
     """Обрабатывает Лист5: обновляет статистику по заказам и остаткам по категориям"""
     try:
-        print("Обрабатывается Лист5")
+        logger.info("Обрабатывается Лист5")
         #update_daily_stats_in_sheet5_sliding_window(worksheet)
         current_date = datetime.now().strftime("%d.%m.%Y")
-        #status_channels = get_sales_channels_and_statuses(worksheet)
-        #orders_report = fetch_orders_by_channels(token, status_channels)
-        #update_sales_report_in_sheet5(worksheet, orders_report, current_date)
+        if sales_report:
+            # Загружаются только измененные заказы, отчет по датам листа - запрос к кубу
+            status_channels = get_sales_channels_and_statuses(worksheet)
+            cube = update_cost_cube(token, get_cost_cube(state_dir), get_bundle_index(state_dir))
+            orders_report = cube.sales_report(status_channels, get_dates_from_header(worksheet))
+            update_sales_report_in_sheet5(worksheet, orders_report, current_date)
         categories_costs = fetch_categories_costs(token)
         update_categories_costs_in_sheet5(worksheet, categories_costs)
         transits_costs = fetch_stock_CHINA_in_transit(token)
         update_transits_costs_in_sheet5(worksheet, transits_costs)
-        print("Лиcт5 успешно обновлен")
+        logger.info("Лиcт5 успешно обновлен")
     except Exception as e:
-        print(f"Ошибка при обработке Лист5: {str(e)}")
+        logger.error("Ошибка при обработке Лист5: %s", e)
         raise 
 
 
-def schedule_process_sheets(spreadsheet, token):
+def build_nightly_pipeline(spreadsheet, token, tenant: Tenant = None) -> Pipeline:
+    """
+    Собирает ночной конвейер: чтение листов -> загрузка данных из МойСклад -> запись листов.
+    Каждый набор данных (каталог, склад в пути, остатки, заказы, приемки) запрашивается
+    один раз и используется всеми листами, которым он нужен.
+
+    Листы, каталог состояния и имена стадий берутся из tenant (по умолчанию - как у
+    единственной организации), поэтому конвейеры разных организаций не пересекаются.
+    """
+    layout = tenant.layout if tenant else SheetLayout()
+    state_dir = tenant.state_dir if tenant else CHECKPOINT_DIR
+    pipeline = Pipeline(tenant.job_name("nightly") if tenant else "nightly")
+
+    def read_sheet1():
+        worksheet1 = spreadsheet.sheet1
+        existing_products = get_products_with_details(worksheet1)
+        product_codes = get_product_codes_from_sheet(worksheet1)
+        logger.info("Found %s product codes in Sheet1, %s with details", len(product_codes), len(existing_products))
+        return {"worksheet": worksheet1, "codes": product_codes, "existing": existing_products}
+
+    def read_sheet3():
+        worksheet3 = spreadsheet.worksheet(layout.sheet3)
+        product_codes = get_product_codes_from_sheet3(worksheet3)
+        logger.info("Found %s product codes in %s", len(product_codes), layout.sheet3)
+        return {"worksheet": worksheet3, "codes": product_codes}
+
+    def fetch_catalog(sheet1, sheet3):
+        # Лист6 каждый раз обновляет данные всех своих товаров, Лист1 - только новых
+        sheet3_codes = set(sheet3["codes"])
+        codes = list(dict.fromkeys(sheet3["codes"] + sheet1["codes"]))
+        existing = {code: details for code, details in sheet1["existing"].items() if code not in sheet3_codes}
+        return fetch_product_details_by_codes(token, codes, existing)
+
+    def fetch_stock(sheet3):
+        return fetch_product_stock2(token, sheet3["codes"])
+
+    def fetch_orders(sheet1, catalog, transit_store):
+        products = {code: catalog[code] for code in sheet1["codes"] if code in catalog}
+        return {"products": products,
+                **fetch_sheet1_orders(token, products, transit_store, SHEET1_FULL_RECOMPUTE, state_dir)}
+
+    def fetch_supplies(transit_store):
+        return fetch_supplies_by_date_range(token, datetime.now().strftime("%Y-%m-%d"), transit_store)
+
+    def write_sheet1_stage(sheet1, orders):
+        write_sheet1(sheet1["worksheet"], orders["products"], orders, state_dir)
+
+    def write_sheet3_products(sheet3, catalog):
+        codes = set(sheet3["codes"])
+        update_sheet3(sheet3["worksheet"], {code: details for code, details in catalog.items() if code in codes})
+        logger.info("Данные успешно записаны в Лист3.")
+
+    def write_sheet3_stock(sheet3, stock, supplies, sheet3_products):
+        write_sheet3_stock_and_supplies(sheet3["worksheet"], stock, supplies)
+
+    def replenishment(sheet1, catalog, supplies, transit_stock, sheet1_write):
+        replenish_sheet1(sheet1["worksheet"], token, catalog, supplies, transit_stock)
+
+    timeouts = NIGHTLY_STAGE_TIMEOUTS
+    pipeline.add_stage("sheet1", read_sheet1)
+    pipeline.add_stage("sheet3", read_sheet3)
+    pipeline.add_stage("transit_store", lambda: fetch_url_stock_CHINA_in_transit(token))
+    pipeline.add_stage("catalog", fetch_catalog, requires=["sheet1", "sheet3"], timeout=timeouts["catalog"])
+    pipeline.add_stage("stock", fetch_stock, requires=["sheet3"], timeout=timeouts["stock"])
+    pipeline.add_stage("orders", fetch_orders, requires=["sheet1", "catalog", "transit_store"],
+                       timeout=timeouts["orders"], retries=NIGHTLY_FETCH_RETRIES)
+    pipeline.add_stage("supplies", fetch_supplies, requires=["transit_store"], timeout=timeouts["supplies"],
+                       retries=NIGHTLY_FETCH_RETRIES)
+    pipeline.add_stage("sheet1_write", write_sheet1_stage, requires=["sheet1", "orders"])
+    pipeline.add_stage("sheet3_products", write_sheet3_products, requires=["sheet3", "catalog"])
+    pipeline.add_stage("sheet3_stock", write_sheet3_stock,
+                       requires=["sheet3", "stock", "supplies", "sheet3_products"])
+    if REPLENISHMENT:
+        pipeline.add_stage("transit_stock", lambda transit_store: fetch_transit_stock(token, transit_store),
+                           requires=["transit_store"],
+                           timeout=timeouts["stock"], retries=NIGHTLY_FETCH_RETRIES)
+        pipeline.add_stage("replenishment", replenishment,
+                           requires=["sheet1", "catalog", "supplies", "transit_stock", "sheet1_write"],
+                           timeout=timeouts["replenishment"])
+    return pipeline
+
+
+def run_nightly_pipeline(spreadsheet, token, executor: JobExecutor = None,
+                         tenant: Tenant = None) -> Dict[str, Exception]:
+    """Выполняет ночной конвейер для Листа1 и Листа6 (параллельно, если передан executor)"""
+    pipeline = build_nightly_pipeline(spreadsheet, token, tenant)
+    pipeline.run(executor)
+    if pipeline.errors:
+        logger.error("Ночной конвейер %s завершен с ошибками: %s", pipeline.name, ', '.join(pipeline.errors))
+    else:
+        logger.info("Ночной конвейер %s успешно завершен", pipeline.name)
+    return pipeline.errors
+
+
+def run_nightly_job(spreadsheet, token, tenant: Tenant):
+    """Однократный запуск ночного конвейера, ошибка любой стадии - ошибка задачи"""
+    stages = JobExecutor(max_workers=NIGHTLY_STAGE_WORKERS, name=tenant.job_name("nightly"))
+    try:
+        errors = run_nightly_pipeline(spreadsheet, token, stages, tenant)
+    finally:
+        stages.shutdown()
+    if errors:
+        raise RuntimeError(f"Стадии завершились с ошибками: {', '.join(errors)}")
+
+
+def run_sheet1_job(spreadsheet, token, tenant: Tenant):
+    process_sheet1(spreadsheet, token, state_dir=tenant.state_dir)
+
+
+def run_sheet2_job(spreadsheet, token, tenant: Tenant):
+    process_sheet2(spreadsheet, token, tenant.layout)
+
+
+def run_sheet3_products_job(spreadsheet, token, tenant: Tenant):
+    """Обновляет данные товаров Листа6 из каталога МойСклад"""
+    worksheet3 = spreadsheet.worksheet(tenant.layout.sheet3)
+    product_codes = get_product_codes_from_sheet3(worksheet3)
+    update_sheet3(worksheet3, fetch_product_details_by_codes(token, product_codes, {}))
+
+
+def run_sheet3_job(spreadsheet, token, tenant: Tenant):
+    process_sheet3(spreadsheet, token, tenant.layout)
+
+
+def run_sheet5_job(spreadsheet, token, tenant: Tenant):
+    process_sheet5(spreadsheet.worksheet(tenant.layout.sheet5), token, tenant.state_dir)
+
+
+# Задачи организации: python cli.py run-job <задача>, поле jobs в TENANTS_PATH
+JOBS = {
+    "nightly": run_nightly_job,
+    "sheet1": run_sheet1_job,
+    "sheet2": run_sheet2_job,
+    "sheet3_products": run_sheet3_products_job,
+    "sheet3": run_sheet3_job,
+    "sheet5": run_sheet5_job,
+}
+if set(JOBS) != set(JOB_NAMES):
+    raise RuntimeError(f"sheet_processor.JOBS и utils.tenants.JOB_NAMES различаются: "
+                       f"{', '.join(sorted(set(JOBS) ^ set(JOB_NAMES)))}")
+
+# Листы (поля SheetLayout, sheet1 - первый лист), в которые пишет задача.
+# Задачи очереди с общим листом одной таблицы не выполняются одновременно
+JOB_SHEETS = {
+    "nightly": ("sheet1", "sheet3"),
+    "sheet1": ("sheet1",),
+    "sheet2": ("sheet2",),
+    "sheet3_products": ("sheet3",),
+    "sheet3": ("sheet3",),
+    "sheet5": ("sheet5",),
+}
+
+
+def tenant_token(tenant: Tenant) -> str:
+    """Токен МойСклад организации: из кэша, из конфигурации или по логину и паролю"""
+    if tenant.is_default:
+        tokens = moysklad_tokens
+    else:
+        tokens = get_token_manager(tenant.name, tenant.moysklad_credentials,
+                                   os.path.join(tenant.state_dir, "moysklad_token.json"))
+    return tokens.token(tenant.moysklad_token)
+
+
+def open_spreadsheet(tenant: Tenant):
+    return instrument_spreadsheet(google_clients.open(tenant.spreadsheet, tenant.google_credentials))
+
+
+def connect_tenants(tenants: List[Tenant]) -> List[Tuple[Tenant, object, str]]:
+    """
+    Открывает таблицы и получает токены организаций.
+    Организация, которую не удалось подключить, пропускается и не мешает остальным.
+
+    Returns:
+        List[Tuple[Tenant, spreadsheet, str]]: (организация, таблица, токен МойСклад)
+    """
+    connected = []
+    for tenant in tenants:
+        try:
+            connected.append((tenant, open_spreadsheet(tenant), tenant_token(tenant)))
+        except Exception:
+            logger.exception("[%s] Не удалось открыть таблицу %s или получить токен МойСклад",
+                             tenant.name, tenant.spreadsheet)
+    return connected
+
+
+def select_tenants(tenant_names: List[str] = None) -> Optional[List[Tenant]]:
+    """Организации tenant_names (по умолчанию все) или None, если среди них есть неизвестные"""
+    tenants = load_tenants(config)
+    if tenant_names:
+        unknown = set(tenant_names) - {tenant.name for tenant in tenants}
+        if unknown:
+            logger.error("Неизвестные организации: %s", ', '.join(sorted(unknown)))
+            return None
+        tenants = [tenant for tenant in tenants if tenant.name in tenant_names]
+    return tenants
+
+
+def run_job(name: str, tenant_names: List[str] = None) -> int:
+    """
+    Выполняет одну задачу для организаций tenant_names (по умолчанию для всех)
+    и завершается (cron, контейнер на один запуск). Организации обрабатываются
+    параллельно. Задачи выполняются через JobExecutor, поэтому метрики, сводка
+    запросов и итоговая строка лога такие же, как при запуске по расписанию.
+
+    Returns:
+        int: Код завершения процесса, 0 - успешно
+    """
+    if name not in JOBS:
+        logger.error("Неизвестная задача '%s', доступны: %s", name, ', '.join(JOBS))
+        return 2
+    tenants = select_tenants(tenant_names)
+    if tenants is None:
+        return 2
+
+    connected = connect_tenants(tenants)
+    executor = JobExecutor(max_workers=max(1, len(connected)), name="run-job")
+    try:
+        futures = [executor.submit(tenant.job_name(name), JOBS[name], spreadsheet, token, tenant)
+                   for tenant, spreadsheet, token in connected]
+        failed = len(tenants) - len(connected)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                # Ошибка уже записана в лог JobExecutor
+                failed += 1
+        return 1 if failed else 0
+    finally:
+        executor.shutdown()
+
+
+def schedule_process_sheets(connected: List[Tuple[Tenant, object, str]]):
     moscow_tz = pytz.timezone('Europe/Moscow')
 
-    def update_sheet3_products():
-        """Вспомогательная функция для обновления Листа3"""
-        worksheet3 = spreadsheet.worksheet("Лист6")
-        product_codes = [row[0] for row in worksheet3.get_all_values()[3:] if row[0].strip()]
-        products = fetch_product_details_by_codes(token, product_codes, {})
-        update_sheet3(worksheet3, products)
-        print("Данные успешно записаны в Лист3.")
-
-    # Schedule the tasks
-    schedule.every().day.at("00:10").do(process_sheet1, spreadsheet, token)
-    #schedule.every().day.at("00:18").do(process_sheet2, spreadsheet, token)
-    schedule.every().day.at("00:20").do(update_sheet3_products)
-    schedule.every().day.at("00:25").do(process_sheet3, spreadsheet, token)
-    #schedule.every().day.at("23:50").do(process_sheet5, spreadsheet, token)
+    # Задачи выполняются в пуле потоков, цикл планировщика не блокируется.
+    # Повторный запуск задачи, пока предыдущий не завершен, пропускается.
+    # Организации обрабатываются параллельно: лимиты МойСклад у каждой свои
+    # (лимитер на учетную запись), квота Google общая (utils.rate_limiter).
+    jobs = JobExecutor(max_workers=max(2, len(connected)), name="scheduler")
+
+    for tenant, spreadsheet, token in connected:
+        # Лист1 и Лист6 обрабатываются одним конвейером с общими данными
+        stages = JobExecutor(max_workers=NIGHTLY_STAGE_WORKERS, name=tenant.job_name("nightly"))
+        for job in tenant.jobs:
+            at = tenant.schedule_for(job)
+            if job == "nightly":
+                schedule.every().day.at(at).do(jobs.submit, tenant.job_name(job), run_nightly_pipeline,
+                                               spreadsheet, token, stages, tenant)
+            else:
+                schedule.every().day.at(at).do(jobs.submit, tenant.job_name(job), JOBS[job],
+                                               spreadsheet, token, tenant)
+        logger.info("[%s] Задачи запланированы: %s", tenant.name,
+                    ', '.join(f"{job} в {tenant.schedule_for(job)}" for job in tenant.jobs))
+
+    _run_scheduler()
+
 
+def _run_scheduler():
     while True:
+        metrics.set("scheduler_heartbeat_timestamp_seconds", time.time())
+        # Токен Google обновляется здесь заранее, а не в запросе задачи после истечения
+        google_clients.refresh_if_needed()
         schedule.run_pending()
-        time.sleep(30)
+        idle_seconds = schedule.idle_seconds()
+        time.sleep(min(30, max(1, idle_seconds)) if idle_seconds is not None else 30)
+
+
+def _sheet_lock(tenant: Tenant, sheet: str) -> str:
+    """Блокировка листа таблицы: общая для организаций с одной таблицей"""
+    title = "sheet1" if sheet == "sheet1" else getattr(tenant.layout, sheet)
+    return f"{tenant.spreadsheet}/{title}"
+
+
+def enqueue_job(queue: TaskQueue, tenant: Tenant, job: str) -> int:
+    """
+    Ставит задачу организации в очередь. Пока такая же задача ждет или
+    выполняется, новая не ставится (как пропуск повторного запуска в JobExecutor).
+
+    Returns:
+        int: ID задачи в очереди
+    """
+    task_id, created = queue.enqueue(job, tenant.name, locks=[_sheet_lock(tenant, sheet) for sheet in JOB_SHEETS[job]],
+                                     dedup_key=f"{tenant.name}:{job}", max_attempts=TASK_MAX_ATTEMPTS)
+    if created:
+        logger.info("[%s] Задача '%s' поставлена в очередь (#%s)", tenant.name, job, task_id)
+    else:
+        logger.warning("[%s] Задача '%s' уже в очереди (#%s), повторная постановка пропущена",
+                       tenant.name, job, task_id)
+    return task_id
+
+
+def enqueue_jobs(name: str, tenant_names: List[str] = None, queue_path: str = None) -> int:
+    """
+    Ставит задачу name организаций tenant_names (по умолчанию всех) в очередь
+    (python cli.py enqueue).
+
+    Returns:
+        int: Код завершения процесса, 0 - успешно
+    """
+    if name not in JOBS:
+        logger.error("Неизвестная задача '%s', доступны: %s", name, ', '.join(JOBS))
+        return 2
+    tenants = select_tenants(tenant_names)
+    if tenants is None:
+        return 2
+    queue = TaskQueue(queue_path or TASK_QUEUE_PATH or DEFAULT_TASK_QUEUE_PATH)
+    for tenant in tenants:
+        enqueue_job(queue, tenant, name)
+    return 0
+
+
+def schedule_task_queue(tenants: List[Tenant], queue: TaskQueue):
+    """Планировщик ставит задачи в очередь, выполняют их исполнители (run_worker)"""
+    for tenant in tenants:
+        for job in tenant.jobs:
+            schedule.every().day.at(tenant.schedule_for(job)).do(enqueue_job, queue, tenant, job)
+        logger.info("[%s] Задачи будут ставиться в очередь %s: %s", tenant.name, queue.path,
+                    ', '.join(f"{job} в {tenant.schedule_for(job)}" for job in tenant.jobs))
+
+    _run_scheduler()
+
+
+def run_worker(queue: TaskQueue, concurrency: int = 1, once: bool = False, poll_interval: float = 5.0) -> int:
+    """
+    Исполнитель задач очереди (python cli.py worker). Исполнителей может быть
+    несколько (процессы, контейнеры с общим файлом очереди). Каждый берет
+    задачи, пока у него есть свободные потоки, и продлевает аренду выполняемых.
+    Таблица и токен организации открываются при первой ее задаче.
+
+    Args:
+        queue: Очередь задач
+        concurrency: Задач одновременно
+        once: Выполнить готовые задачи и завершиться
+        poll_interval: Пауза между проверками очереди, секунды
+
+    Returns:
+        int: Код завершения процесса: 0, с once - 1, если задачи завершились ошибкой
+    """
+    tenants = {tenant.name: tenant for tenant in load_tenants(config)}
+    spreadsheets = {}
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    executor = JobExecutor(max_workers=concurrency, name="worker")
+    running: Dict[Future, Task] = {}
+    failed = 0
+    purged_at = 0.0
+
+    def execute(task: Task):
+        tenant = tenants.get(task.tenant)
+        if tenant is None:
+            raise ValueError(f"Организации {task.tenant} нет в списке организаций")
+        if task.job not in JOBS:
+            raise ValueError(f"Неизвестная задача '{task.job}'")
+        if tenant.name not in spreadsheets:
+            spreadsheets[tenant.name] = open_spreadsheet(tenant)
+        JOBS[task.job](spreadsheets[tenant.name], tenant_token(tenant), tenant)
+
+    def finish(task: Task, error: Optional[BaseException]):
+        if error is None:
+            queue.complete(task, owner)
+        else:
+            queue.fail(task, owner, f"{type(error).__name__}: {error}", TASK_RETRY_DELAY)
+        metrics.inc("task_queue_runs_total", job=task.job, status="error" if error else "ok")
+
+    logger.info("Исполнитель %s: очередь %s, задач одновременно: %s", owner, queue.path, concurrency)
+    try:
+        while True:
+            metrics.set("scheduler_heartbeat_timestamp_seconds", time.time())
+            google_clients.refresh_if_needed()
+            try:
+                while len(running) < concurrency:
+                    task = queue.claim(owner, TASK_LEASE_SECONDS)
+                    if task is None:
+                        break
+                    tenant = tenants.get(task.tenant)
+                    name = tenant.job_name(task.job) if tenant else f"{task.tenant}.{task.job}"
+                    logger.info("Задача #%s '%s' взята из очереди (попытка %s из %s)",
+                                task.id, name, task.attempts, task.max_attempts)
+                    future = executor.submit(name, execute, task)
+                    if future is None:
+                        finish(task, RuntimeError("Задача уже выполняется этим исполнителем"))
+                    else:
+                        running[future] = task
+
+                if running:
+                    done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        error = future.exception()
+                        failed += error is not None
+                        finish(task, error)
+                    for task in running.values():
+                        if not queue.extend(task, owner, TASK_LEASE_SECONDS):
+                            logger.error("Аренда задачи #%s потеряна, задачу может выполнить другой исполнитель",
+                                         task.id)
+                elif once:
+                    break
+                else:
+                    time.sleep(poll_interval)
+
+                for status, count in queue.counts().items():
+                    metrics.set("task_queue_tasks", count, status=status)
+                if time.time() - purged_at > 60 * 60:
+                    queue.purge(TASK_RETENTION)
+                    purged_at = time.time()
+            except sqlite3.Error as e:
+                # Очередь заблокирована дольше таймаута или недоступна - повтор на следующей итерации
+                logger.error("Ошибка очереди задач %s: %s", queue.path, e)
+                time.sleep(poll_interval)
+    finally:
+        executor.shutdown()
+    return 1 if failed else 0
 
 
 def process_all_sheets():
     try:
-        client = authenticate_google_sheets(config.CREDENTIALS_PATH)
-        spreadsheet = client.open(config.SHEET_NAME)
-
-        # Get MoySklad token
-        token = config.MOYSKLAD_TOKEN
-        print("Access Token:", token)
+        tenants = load_tenants(config)
+        if TASK_QUEUE_PATH:
+            # Задачи выполняют исполнители (python cli.py worker)
+            schedule_task_queue(tenants, TaskQueue(TASK_QUEUE_PATH))
+            return 0
+
+        # Таблицы и токены МойСклад всех организаций (utils.tenants)
+        connected = connect_tenants(tenants)
+        if not connected:
+            logger.error("Не удалось подключить ни одну организацию")
+            return None
+        logger.info("Подключено организаций: %s", len(connected))
 
         #Process Sheet1
         #process_sheet1(spreadsheet, token)
@@ -221,10 +769,10 @@ def process_all_sheets():
         # process_sheet5(worksheet5, token)
 
         # Schedule the tasks
-        schedule_process_sheets(spreadsheet, token)
+        schedule_process_sheets(connected)
 
         return 0
     
     except Exception as e:
-        print(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         return None
@@ -0,0 +1,72 @@
+import json
+import os
+import stat
+
+from utils.checkpoint import CheckpointStore, StateStore, make_run_key, write_json_atomic
+
+
+def test_write_json_atomic_replaces_file_and_sets_mode(tmp_path):
+    path = tmp_path / "nested" / "token.json"
+
+    write_json_atomic(str(path), {"a": "значение"})
+    write_json_atomic(str(path), {"a": 2}, mode=0o600)
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 2}
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(path.parent) == ["token.json"]
+
+
+def test_write_json_atomic_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "state.json"
+    write_json_atomic(str(path), {"a": 1})
+
+    try:
+        write_json_atomic(str(path), {"a": object()})
+    except TypeError:
+        pass
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 1}
+
+
+def test_make_run_key_ignores_collection_order():
+    assert make_run_key("2024-03-01", ["b", "a"]) == make_run_key("2024-03-01", {"a", "b"})
+    assert make_run_key("2024-03-01", ["a"]) != make_run_key("2024-03-02", ["a"])
+
+
+def test_checkpoint_is_bound_to_run_key(tmp_path):
+    store = CheckpointStore(str(tmp_path), min_interval=0)
+    store.save("orders", "run-1", {"offset": 200})
+
+    assert store.load("orders", "run-1") == {"offset": 200}
+    assert store.load("orders", "run-2") is None
+    assert store.load("stock", "run-1") is None
+
+    store.clear("orders")
+    assert store.load("orders", "run-1") is None
+    store.clear("orders")
+
+
+def test_checkpoint_save_is_throttled_unless_forced(tmp_path):
+    store = CheckpointStore(str(tmp_path), min_interval=3600)
+    store.save("orders", "run", {"offset": 100})
+    store.save("orders", "run", {"offset": 200})
+    assert store.load("orders", "run") == {"offset": 100}
+
+    store.save("orders", "run", {"offset": 300}, force=True)
+    assert store.load("orders", "run") == {"offset": 300}
+
+
+def test_corrupt_checkpoint_is_ignored(tmp_path):
+    (tmp_path / "orders.json").write_text("{", encoding="utf-8")
+    assert CheckpointStore(str(tmp_path)).load("orders", "run") is None
+
+
+def test_state_store_round_trip(tmp_path):
+    store = StateStore(str(tmp_path))
+    assert store.load("watermark") is None
+
+    store.save("watermark", {"updated": "2024-03-01 10:00:00"})
+    assert store.load("watermark") == {"updated": "2024-03-01 10:00:00"}
+
+    store.clear("watermark")
+    assert store.load("watermark") is None
@@ -0,0 +1,45 @@
+import pytest
+
+from services.cost_cube import CostCube, OrderCost, order_cost
+
+
+@pytest.fixture
+def cube(tmp_path):
+    return CostCube(str(tmp_path / "cube.sqlite3"))
+
+
+def test_apply_replaces_order_contribution(cube):
+    cube.apply([OrderCost("a", "2024-03-01 10:00:00", "Новый", "Сайт", "2024-03-01", 100.0),
+                OrderCost("b", "2024-03-01 11:00:00", "Новый", "Сайт", "2024-03-01", 50.0)], rebuild=True)
+    assert cube.query("2024-03-01", "2024-03-01") == {("Новый", "Сайт", "2024-03-01"): 150.0}
+
+    # Заказ a сменил статус и сумму: прежний вклад вычитается, новый прибавляется
+    cube.apply([OrderCost("a", "2024-03-02 09:00:00", "Отгружен", "Сайт", "2024-03-01", 120.0)])
+
+    assert cube.query("2024-03-01", "2024-03-01") == {("Новый", "Сайт", "2024-03-01"): 50.0,
+                                                      ("Отгружен", "Сайт", "2024-03-01"): 120.0}
+    assert cube.count("2024-03-01", "2024-03-01") == 2
+    assert cube.watermark == "2024-03-02 09:00:00"
+
+
+def test_apply_drops_emptied_cells(cube):
+    cube.apply([OrderCost("a", "2024-03-01 10:00:00", "Новый", "Сайт", "2024-03-01", 100.0)], rebuild=True)
+    cube.apply([OrderCost("a", "2024-03-02 09:00:00", "Новый", "Маркетплейс", "2024-03-01", 100.0)])
+
+    assert cube.query("2024-03-01", "2024-03-01") == {("Новый", "Маркетплейс", "2024-03-01"): 100.0}
+
+
+def test_rebuild_replaces_everything(cube):
+    cube.apply([OrderCost("a", "2024-03-01 10:00:00", "Новый", "Сайт", "2024-03-01", 100.0)], rebuild=True)
+    cube.apply([OrderCost("b", "2024-03-01 09:00:00", "Новый", "Сайт", "2024-03-02", 7.0)], rebuild=True)
+
+    assert cube.query("2024-03-01", "2024-03-02") == {("Новый", "Сайт", "2024-03-02"): 7.0}
+    assert cube.watermark == "2024-03-01 09:00:00"
+
+
+def test_order_cost_truncates_to_whole_units():
+    order = {"id": "a", "updated": "2024-03-01 10:00:00.123", "moment": "2024-03-01 09:00:00.000",
+             "state": {"name": "Новый"}, "salesChannel": {"name": "Сайт"}}
+    cost = order_cost(order, {"p1": 2.0, "p2": 1.0}, {"p1": 10.4, "p2": 0.5})
+
+    assert cost == OrderCost("a", "2024-03-01 10:00:00", "Новый", "Сайт", "2024-03-01", 21)
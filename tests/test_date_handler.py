@@ -0,0 +1,40 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from utils.date_handler import (
+    NO_DATE, ISO_DAY_FORMAT, day_ordinal, day_ordinals, format_days, moment_to_sheet_date, parse_sheet_date,
+    shift_date
+)
+
+ORDINAL = date(2024, 3, 1).toordinal()
+
+
+@pytest.mark.parametrize("value", ["01.03.2024", " 01.03.2024 ", "2024-03-01", "2024-03-01 23:59:59.123"])
+def test_day_ordinal_formats(value):
+    assert day_ordinal(value) == ORDINAL
+
+
+@pytest.mark.parametrize("value", [None, "", "   ", "31.02.2024", "2024-13-01", "Ост."])
+def test_day_ordinal_empty_and_invalid(value):
+    assert day_ordinal(value) is None
+    assert day_ordinal(value, NO_DATE) == NO_DATE
+
+
+def test_day_ordinals_batch():
+    ordinals = day_ordinals(["01.03.2024", "", "2024-03-02", "01.03.2024", "x"])
+
+    assert ordinals.dtype == np.int64
+    assert ordinals.tolist() == [ORDINAL, NO_DATE, ORDINAL + 1, ORDINAL, NO_DATE]
+    assert day_ordinals([]).tolist() == []
+
+
+def test_format_and_shift():
+    assert format_days([ORDINAL, NO_DATE]) == ["01.03.2024", ""]
+    assert format_days([ORDINAL], ISO_DAY_FORMAT) == ["2024-03-01"]
+    assert shift_date("28.02.2024", 1) == "29.02.2024"
+    assert moment_to_sheet_date("2024-03-01 10:00:00.000") == "01.03.2024"
+    assert parse_sheet_date("нет") is None
+    with pytest.raises(ValueError):
+        shift_date("", 1)
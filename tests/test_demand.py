@@ -0,0 +1,57 @@
+from datetime import date
+
+import numpy as np
+
+from services.demand import demand_stats, demand_values
+from utils.date_handler import NO_DATE
+
+nan = np.nan
+TODAY = date(2024, 3, 5).toordinal()
+# Четыре полных дня, сегодня, завтра и колонка с неразобранной датой
+ORDINALS = [TODAY - 4, TODAY - 3, TODAY - 2, TODAY - 1, TODAY, TODAY + 1, NO_DATE]
+
+STOCK = np.array([
+    [5, 0, 0, 3, 2, 77, 99],                # дефицит в один из дней
+    [nan, nan, nan, nan, nan, nan, nan],    # нет данных
+    [0, 0, 0, 0, 0, nan, nan],              # весь период без остатка
+    [10, 10, 10, 10, 10, nan, nan],         # без продаж
+], dtype=float)
+ORDERS = np.array([
+    [2, nan, 1, 3, 1, 9, 50],
+    [nan, nan, nan, nan, nan, nan, nan],
+    [nan, nan, nan, nan, nan, nan, nan],
+    [nan, nan, nan, nan, nan, nan, nan],
+], dtype=float)
+
+
+def stats():
+    return demand_stats(STOCK, ORDERS, ORDINALS, as_of=TODAY)
+
+
+def test_average_uses_only_complete_days():
+    np.testing.assert_allclose(stats().average, [6 / 4, 0, 0, 0])
+
+
+def test_adjusted_skips_zero_stock_days_without_orders():
+    # Товар 0: день с нулевым остатком без заказов исключен, с заказами - учитывается
+    # Товар 1: незаполненный остаток день не исключает
+    # Товар 2: дней с остатком нет
+    np.testing.assert_allclose(stats().adjusted, [6 / 3, 0, nan, 0])
+
+
+def test_stock_is_last_known_not_after_today():
+    np.testing.assert_allclose(stats().stock, [2, nan, 0, 10])
+
+
+def test_cover_and_stockout():
+    result = stats()
+    np.testing.assert_allclose(result.cover, [1.0, nan, nan, np.inf])
+    assert result.stockout.tolist() == [TODAY + 1, NO_DATE, NO_DATE, NO_DATE]
+
+
+def test_demand_values_blank_missing_metrics():
+    rows = demand_values(stats())
+    assert rows[0] == [1.5, 2.0, 1.0, "06.03.2024"]
+    assert rows[1] == [0.0, 0.0, "", ""]
+    assert rows[2] == [0.0, "", "", ""]
+    assert rows[3] == [0.0, 0.0, "", ""]
@@ -0,0 +1,26 @@
+import json
+
+from utils.instrumentation import PAYLOAD_SAMPLE_ROWS, payload_size
+
+
+def _size(values):
+    return len(json.dumps(values, ensure_ascii=False).encode("utf-8"))
+
+
+def test_payload_size_small_values_exact():
+    rows = [["Товар", 1.5, ""], [None, 2, "x"]]
+    assert payload_size(rows) == _size(rows)
+    assert payload_size(None) == 0
+    assert payload_size(5) == 1
+
+
+def test_payload_size_samples_large_tables():
+    rows = [[f"код-{i}", i, i * 0.5, ""] for i in range(PAYLOAD_SAMPLE_ROWS * 40)]
+    exact = _size(rows)
+    assert abs(payload_size(rows) - exact) < exact * 0.05
+
+
+def test_payload_size_batch_update_data():
+    data = [{"range": "A1:B2", "values": [[1, 2], [3, 4]]}, {"range": "D5", "values": [["x"]]}]
+    expected = _size([[1, 2], [3, 4]]) + _size("A1:B2") + _size([["x"]]) + _size("D5")
+    assert payload_size(data) == expected
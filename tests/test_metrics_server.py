@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from utils import metrics_server
+from utils.metrics import GAUGE, MetricsRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    for name in ("scheduler_heartbeat_timestamp_seconds", "job_last_run_timestamp_seconds",
+                 "job_last_success_timestamp_seconds", "job_last_duration_seconds", "job_running"):
+        registry.describe(name, GAUGE, name)
+    monkeypatch.setattr(metrics_server, "metrics", registry)
+    return registry
+
+
+def test_health_fails_until_first_heartbeat(registry, monkeypatch):
+    monkeypatch.setattr(metrics_server, "HEALTH_STARTUP_GRACE", 0.0)
+    healthy, data = metrics_server.health()
+    assert not healthy
+    assert data["status"] == "starting"
+
+    registry.set("scheduler_heartbeat_timestamp_seconds", time.time())
+    healthy, data = metrics_server.health()
+    assert healthy
+    assert data["status"] == "ok"
+
+
+def test_health_startup_grace(registry, monkeypatch):
+    monkeypatch.setattr(metrics_server, "HEALTH_STARTUP_GRACE", 60.0)
+    assert metrics_server.health()[0]
+
+    registry.started -= 120
+    assert not metrics_server.health()[0]
+
+
+def test_health_stale_heartbeat(registry):
+    registry.set("scheduler_heartbeat_timestamp_seconds", time.time() - metrics_server.HEALTH_MAX_HEARTBEAT_AGE - 1)
+    healthy, data = metrics_server.health()
+    assert not healthy
+    assert data["status"] == "stale"
@@ -0,0 +1,63 @@
+import json
+import pickle
+
+from services.order_aggregation import OrderAggregate, OrderAggregator, aggregate_page
+from utils.symbols import Symbols
+
+BASE = "https://api.moysklad.ru/api/remap/1.2/entity"
+
+
+def order(day, state, channel, positions):
+    return {
+        "moment": f"{day} 10:00:00.000",
+        "state": {"name": state},
+        "salesChannel": {"name": channel},
+        "positions": {"rows": [
+            {"quantity": quantity, "assortment": {"code": code, "meta": {"href": f"{BASE}/{kind}/{code}?expand=x",
+                                                                        "type": kind}}}
+            for code, kind, quantity in positions
+        ]},
+    }
+
+
+PAGES = [
+    [order("2024-03-01", "Новый", "Ozon", [("A", "product", 2), ("K", "bundle", 1)]),
+     order("2024-03-01", "Новый", "Ozon", [("B", "product", 1)])],
+    [order("2024-03-02", "Отменен", "Сайт", [("A", "product", 5)])],
+]
+
+
+def test_pool_pages_merge_into_local_ids():
+    table = Symbols()
+    local = OrderAggregate(table)
+    for page in PAGES:
+        local.add_orders(page, channels=True)
+
+    merged = OrderAggregate(table)
+    for page in PAGES:
+        content = json.dumps({"rows": page}).encode()
+        # Агрегат процесса пула передается через pickle со своими таблицами
+        merged.merge(pickle.loads(pickle.dumps(aggregate_page(content, channels=True))))
+
+    for field in ("orders", "orders_per_day", "product_days", "product_hrefs", "channel_orders"):
+        assert getattr(merged, field) == getattr(local, field)
+
+    key = (table.names.get("Новый"), table.names.get("Ozon"), "2024-03-01")
+    assert merged.channel_orders[key] == [((table.hrefs.get(f"{BASE}/product/A"), 2.0),
+                                           (table.hrefs.get(f"{BASE}/bundle/K"), 1.0)),
+                                          ((table.hrefs.get(f"{BASE}/product/B"), 1.0),)]
+
+
+def test_products_by_code_round_trip():
+    aggregator = OrderAggregator(codes=["A"], processes=1, total=OrderAggregate(Symbols()))
+    aggregator.add_orders(PAGES[0] + PAGES[1])
+    total = aggregator.result()
+
+    by_code, hrefs = total.products_by_code()
+    assert by_code == {"A": {"2024-03-01": 2.0, "2024-03-02": 5.0}}
+    assert hrefs == {"A": f"{BASE}/product/A"}
+    assert total.channel_orders == {}
+
+    restored = OrderAggregate(Symbols())
+    restored.load_products(by_code, hrefs)
+    assert restored.products_by_code() == (by_code, hrefs)
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from utils.job_executor import OK, OVERLAP, SKIPPED, TIMEOUT, Job, JobExecutor
+from utils.metrics import metrics
+from utils.pipeline import Pipeline
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(max_workers=4, name="test")
+    yield executor
+    executor.shutdown()
+
+
+def test_order_follows_dependencies_then_insertion():
+    pipeline = Pipeline("p")
+    pipeline.add_stage("write", lambda a, b: None, requires=["b", "a"])
+    pipeline.add_stage("a", lambda: 1)
+    pipeline.add_stage("b", lambda a: a + 1, requires=["a"])
+    pipeline.add_stage("c", lambda: 3)
+
+    assert pipeline.order() == ["a", "b", "write", "c"]
+
+
+def test_order_rejects_cycles_and_unknown_stages():
+    pipeline = Pipeline("p")
+    pipeline.add_stage("a", lambda b: b, requires=["b"])
+    pipeline.add_stage("b", lambda a: a, requires=["a"])
+    with pytest.raises(ValueError, match="Цикл"):
+        pipeline.order()
+
+    pipeline = Pipeline("p")
+    pipeline.add_stage("a", lambda x: x, requires=["x"])
+    with pytest.raises(ValueError, match="неизвестной"):
+        pipeline.order()
+
+
+def test_run_passes_results_in_requires_order_and_skips_failed_branch():
+    def fail():
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline("p")
+    pipeline.add_stage("a", lambda: "a")
+    pipeline.add_stage("b", lambda: "b")
+    pipeline.add_stage("ba", lambda b, a: b + a, requires=["b", "a"])
+    pipeline.add_stage("fail", fail)
+    pipeline.add_stage("after_fail", lambda value: value, requires=["fail"])
+
+    results = pipeline.run()
+
+    assert results == {"a": "a", "b": "b", "ba": "ba"}
+    assert list(pipeline.errors) == ["fail"]
+
+
+def test_parallel_run_matches_sequential(executor):
+    pipeline = Pipeline("p")
+    pipeline.add_stage("a", lambda: 1)
+    pipeline.add_stage("b", lambda: 2)
+    pipeline.add_stage("sum", lambda a, b: a + b, requires=["a", "b"])
+
+    assert pipeline.run(executor) == {"a": 1, "b": 2, "sum": 3}
+    assert pipeline.errors == {}
+
+
+def test_timeout_skips_dependents_and_keeps_job_running(executor):
+    release = threading.Event()
+    pipeline = Pipeline("slow")
+    pipeline.add_stage("hang", lambda: release.wait(5), timeout=0.1)
+    pipeline.add_stage("after", lambda value: value, requires=["hang"])
+    pipeline.add_stage("other", lambda: "ok")
+
+    results = pipeline.run(executor)
+
+    assert results == {"other": "ok"}
+    assert isinstance(pipeline.errors["hang"], TimeoutError)
+    assert executor.is_running("slow.hang")
+
+    # Следующий запуск пропускается, пока поток не завершится
+    assert executor.run_graph([Job("slow.hang", lambda: None), Job("slow.next", lambda: None, ("slow.hang",))]) == \
+        {"slow.hang": OVERLAP, "slow.next": SKIPPED}
+
+    late = metrics.get("job_late_completions_total", job="slow.hang")
+    release.set()
+    for _ in range(100):
+        if not executor.is_running("slow.hang"):
+            break
+        threading.Event().wait(0.05)
+    assert not executor.is_running("slow.hang")
+    assert metrics.get("job_late_completions_total", job="slow.hang") == late + 1
+    assert executor.run_graph([Job("slow.hang", lambda: None)]) == {"slow.hang": OK}
+
+
+def test_run_graph_reports_timeout_status(executor):
+    release = threading.Event()
+    status = executor.run_graph([Job("t", lambda: release.wait(5), timeout=0.05)])
+    release.set()
+
+    assert status == {"t": TIMEOUT}
+
+
+def test_overlapping_run_is_an_error(executor):
+    release = threading.Event()
+    pipeline = Pipeline("overlap")
+    pipeline.add_stage("load", lambda: release.wait(5), timeout=0.05)
+    pipeline.add_stage("write", lambda value: value, requires=["load"])
+    pipeline.run(executor)
+
+    # Второй запуск: "load" еще выполняется после таймаута и не запускается
+    results = pipeline.run(executor)
+    release.set()
+
+    assert results == {}
+    assert set(pipeline.errors) == {"load"}
+    assert "пропущена" in str(pipeline.errors["load"])
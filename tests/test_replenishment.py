@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from services.replenishment import GREEDY, MILP, plan_greedy, plan_milp, plan_replenishment, replenishment_need
+
+nan = np.nan
+# Товар 1 заказывается партией от 10 шт, у товара 3 нет себестоимости
+NEED = np.array([10.0, 5.0, 0.0, 3.0])
+COST = np.array([10.0, 20.0, 5.0, 0.0])
+MOQ = np.array([1.0, 10.0, 1.0, 1.0])
+
+
+def assert_feasible(quantities, budget):
+    assert quantities @ COST <= budget + 1e-6
+    ordered = quantities > 0
+    assert (quantities[ordered] >= MOQ[ordered]).all()
+    assert (quantities <= np.maximum(NEED, MOQ)).all()
+    assert quantities[2] == 0 and quantities[3] == 0
+
+
+def test_replenishment_need():
+    need = replenishment_need(np.array([2.0, nan, 1.5, 1.0]), np.array([10.0, 5.0, nan, 100.0]),
+                              np.array([nan, 0.0, 1.0, 0.0]), np.array([5.0, 0.0, 0.0, nan]), horizon=10)
+    assert need.tolist() == [5.0, 0.0, 14.0, 0.0]
+
+
+def test_greedy_respects_budget_and_moq():
+    quantities = plan_greedy(NEED, COST, MOQ, 250.0)
+
+    assert_feasible(quantities, 250.0)
+    # На товар 1 остается 150: 7 шт меньше партии, товар не заказывается
+    assert quantities.tolist() == [10.0, 0.0, 0.0, 0.0]
+
+
+def test_greedy_without_budget_orders_at_least_moq():
+    assert plan_greedy(NEED, COST, MOQ, math.inf).tolist() == [10.0, 10.0, 0.0, 0.0]
+
+
+def test_milp_respects_budget_and_moq():
+    quantities = plan_milp(NEED, COST, MOQ, 260.0, time_limit=10)
+
+    assert_feasible(quantities, 260.0)
+    # Партия товара 1 (200) и 6 шт товара 0 покрывают больше, чем жадное решение
+    assert quantities.tolist() == [6.0, 10.0, 0.0, 0.0]
+
+
+@pytest.mark.parametrize("budget, method", [(260.0, MILP), (0.0, GREEDY)])
+def test_plan_replenishment_method(budget, method):
+    plan = plan_replenishment(NEED, COST, MOQ, budget, time_limit=10)
+
+    assert plan.method == method
+    if budget:
+        assert_feasible(plan.quantities, budget)
+        assert plan.shortage == 4.0 + 3.0  # товар 0 и товар без себестоимости
+    else:
+        assert plan.shortage == 3.0  # только товар без себестоимости
+    assert plan.cost == pytest.approx(float(plan.quantities @ COST))
@@ -0,0 +1,32 @@
+from benchmarks.fake_sheets import FakeSpreadsheet
+from services.google_sheets_handler import get_products_with_details_sheet2, update_product_details_in_sheet2
+from services.records import Product
+
+
+def sheet2():
+    values = [[""] * 4 for _ in range(3)] + [
+        ["Одежда", "Футболка", "A1", "Футболка белая"],
+        ["", "", "B2", ""],
+    ]
+    return FakeSpreadsheet().add_worksheet("Лист2", values=values)
+
+
+def test_column_b_is_product_type_not_catalog_type():
+    products = get_products_with_details_sheet2(sheet2())
+
+    assert list(products) == ["A1"]
+    assert products["A1"].product_type == "Футболка"
+    assert products["A1"].type == ""
+
+
+def test_update_fills_only_unfilled_rows():
+    worksheet = sheet2()
+    products = {
+        "A1": Product("A1", "Другое имя", "Другое", type="product"),
+        "B2": Product("B2", "Кружка", "Посуда", type="bundle"),
+    }
+    update_product_details_in_sheet2(worksheet, products)
+
+    values = worksheet.get_all_values()
+    assert values[3] == ["Одежда", "Футболка", "A1", "Футболка белая"]
+    assert values[4] == ["Посуда", "", "B2", "Кружка"]
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from services.stock_grid import ORDERS, STOCK, StockGrid
+
+DAYS = [date(2024, 3, 1) + timedelta(days=offset) for offset in range(3)]
+
+
+def sheet_values():
+    header = ["Код", "", "", ""]
+    for day in DAYS:
+        header += ["Ост.", day.strftime("%d.%m.%Y")]
+    return [[""] * 4 for _ in range(4)] + [
+        header,
+        ["A", "", "", ""] + ["1", "2", "н/д", "3,5", "5", ""],
+        ["", "", "", "Итого"] + ["10", "20", "30", "40", "50", "60"],
+        ["B", "", "", ""] + [""] * 6,
+    ]
+
+
+def test_load_parses_numbers_and_keeps_text():
+    grid = StockGrid.from_sheet_values(sheet_values())
+
+    assert grid.codes == ["A", "", "B"]
+    assert grid.dates() == DAYS
+    stock, orders, _ = grid.history()
+    assert stock[0, 0] == 1 and np.isnan(stock[0, 1])
+    assert orders[0, 1] == 3.5
+    assert grid.cells[0, 1, STOCK] == "н/д"
+
+
+def test_load_ignores_unpaired_trailing_stock_column():
+    values = sheet_values()
+    values[4] = values[4] + ["Ост."]
+    values[5] = values[5] + ["7"]
+
+    grid = StockGrid.from_sheet_values(values)
+
+    assert grid.dates() == DAYS
+    assert grid.to_values()[0] == [1, 2, "н/д", 3.5, 5, ""]
+
+
+def test_round_trip_preserves_cells():
+    values = sheet_values()
+    grid = StockGrid.from_sheet_values(values)
+
+    rows = grid.to_values(include_header=True)
+
+    assert rows[0] == values[4][4:]
+    assert rows[1] == [1, 2, "н/д", 3.5, 5, ""]
+    assert rows[2] == [10, 20, 30, 40, 50, 60]
+    assert grid.changed_ranges() == []
+
+
+def test_changed_ranges_cover_only_changed_cells_of_product_rows():
+    grid = StockGrid.from_sheet_values(sheet_values())
+
+    grid.apply_orders_data([
+        {"code": "A", "orders_by_date": {"2024-03-03": 7}, "stock_by_date": {"2024-03-01": 1, "2024-03-03": 4.9}},
+        {"code": "B", "orders_by_date": {"2024-03-03": 2}, "stock_by_date": {}},
+        {"code": "C", "orders_by_date": {"2024-03-03": 9}, "stock_by_date": {}},
+    ])
+
+    # Остаток A за 01.03 не изменился, строка "Итого" без кода не записывается
+    assert grid.changed_ranges() == [
+        {"range": "I6:J6", "values": [[4, 7]]},
+        {"range": "J8:J8", "values": [[2]]},
+    ]
+
+
+def test_clear_days_skips_rows_without_code_and_text():
+    grid = StockGrid.from_sheet_values(sheet_values())
+
+    grid.clear_days(ORDERS, [DAYS[1].toordinal()])
+    grid.clear_days(STOCK, [DAYS[1].toordinal()])
+
+    assert grid.changed_ranges() == [{"range": "H6:H6", "values": [[""]]}]
+    assert grid.to_values()[1][2:4] == [30, 40]
+
+
+def test_shift_moves_window_and_keeps_text():
+    grid = StockGrid.from_sheet_values(sheet_values())
+
+    grid.shift(1)
+
+    assert grid.dates() == DAYS[1:] + [DAYS[-1] + timedelta(days=1)]
+    rows = grid.to_values(include_header=True)
+    assert rows[0][1::2] == ["02.03.2024", "03.03.2024", "04.03.2024"]
+    assert rows[1] == ["н/д", 3.5, 5, "", "", ""]
+    assert rows[2] == [30, 40, 50, 60, "", ""]
+
+
+def test_shift_past_window_clears_everything():
+    grid = StockGrid.from_sheet_values(sheet_values())
+
+    grid.shift(5)
+
+    assert grid.dates()[0] == DAYS[-1] + timedelta(days=3)
+    assert grid.to_values() == [[""] * 6] * 3
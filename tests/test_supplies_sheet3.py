@@ -0,0 +1,17 @@
+from datetime import date, timedelta
+
+from benchmarks.fake_sheets import FakeSpreadsheet
+from services.google_sheets_handler import update_supply_quantities_in_sheet3
+
+DATES = [(date(2024, 3, 1) + timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(30)]
+
+
+def test_supply_dates_past_column_z():
+    values = [[""] * 34, [""] * 4 + DATES, [""] * 34, ["A1", "", "", "", "2"] + [""] * 29]
+    worksheet = FakeSpreadsheet().add_worksheet("Лист6", values=values)
+
+    update_supply_quantities_in_sheet3(worksheet, {"A1": {DATES[0]: 3, DATES[29]: 5}})
+
+    row = worksheet.get_all_values()[3]
+    assert row[4] == "5"   # E: 2 + 3
+    assert row[33] == "5"  # AH
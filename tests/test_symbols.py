@@ -0,0 +1,22 @@
+from utils.symbols import Symbols
+
+
+def test_hrefs_are_normalized_before_lookup():
+    table = Symbols().hrefs
+    href = "https://api.moysklad.ru/api/remap/1.2/entity/product/1"
+
+    symbol = table.intern(href + "?expand=components")
+
+    assert table.intern(href) == symbol
+    assert table.get(href + "?offset=100") == symbol
+    assert table.value(symbol) == href
+    assert len(table) == 1
+    assert table.canonical(href + "?x=1") is table.value(symbol)
+
+
+def test_get_does_not_add_values():
+    table = Symbols().codes
+
+    assert table.get("A-1") is None
+    assert len(table) == 0
+    assert table.values([table.intern("A-1"), table.intern("B-2")]) == ["A-1", "B-2"]
@@ -0,0 +1,95 @@
+import pytest
+
+from utils.task_queue import DONE, FAILED, QUEUED, RUNNING, TaskQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return TaskQueue(str(tmp_path / "tasks.sqlite3"))
+
+
+def test_claim_takes_oldest_ready_task(queue):
+    first, _ = queue.enqueue("sheet1", "main", {"mode": "today"})
+    queue.enqueue("sheet5", "main")
+    queue.enqueue("later", "main", delay=3600)
+
+    task = queue.claim("w1", 60)
+
+    assert (task.id, task.job, task.payload, task.attempts) == (first, "sheet1", {"mode": "today"}, 1)
+    assert queue.claim("w2", 60).job == "sheet5"
+    assert queue.claim("w3", 60) is None
+    assert queue.counts() == {QUEUED: 1, RUNNING: 2, DONE: 0, FAILED: 0}
+
+
+def test_claim_filters_by_job(queue):
+    queue.enqueue("sheet1", "main")
+    queue.enqueue("sheet5", "main")
+
+    assert queue.claim("w1", 60, jobs=["sheet5"]).job == "sheet5"
+    assert queue.claim("w1", 60, jobs=["sheet5"]) is None
+
+
+def test_dedup_while_active(queue):
+    task_id, created = queue.enqueue("sheet1", "main", dedup_key="main:sheet1")
+    assert created
+    assert queue.enqueue("sheet1", "main", dedup_key="main:sheet1") == (task_id, False)
+
+    task = queue.claim("w1", 60)
+    assert queue.enqueue("sheet1", "main", dedup_key="main:sheet1") == (task_id, False)
+
+    assert queue.complete(task, "w1")
+    new_id, created = queue.enqueue("sheet1", "main", dedup_key="main:sheet1")
+    assert created and new_id != task_id
+
+
+def test_locks_serialize_tasks_on_same_sheet(queue):
+    queue.enqueue("sheet1", "main", locks=["main:Лист1"])
+    queue.enqueue("backfill", "main", locks=["main:Лист1"])
+    queue.enqueue("sheet5", "main", locks=["main:Лист5"])
+
+    first = queue.claim("w1", 60)
+    assert queue.claim("w2", 60).job == "sheet5"
+    assert queue.claim("w3", 60) is None
+
+    queue.complete(first, "w1")
+    assert queue.claim("w3", 60).job == "backfill"
+
+
+def test_expired_lease_requeues_then_fails(queue):
+    queue.enqueue("sheet1", "main", locks=["main:Лист1"], max_attempts=2)
+
+    task = queue.claim("w1", -1)
+    # Аренда истекла: задача возвращается в очередь, блокировка освобождается
+    retry = queue.claim("w2", -1)
+    assert retry.id == task.id and retry.attempts == 2
+    assert not queue.extend(task, "w1", 60)
+    assert not queue.complete(task, "w1")
+
+    # Попытки исчерпаны
+    assert queue.claim("w3", 60) is None
+    assert queue.counts()[FAILED] == 1
+    assert not queue.complete(retry, "w2")
+
+
+def test_extend_keeps_lease(queue):
+    queue.enqueue("sheet1", "main")
+    task = queue.claim("w1", -1)
+
+    assert queue.extend(task, "w1", 60)
+    assert queue.claim("w2", 60) is None
+    assert queue.complete(task, "w1")
+    assert queue.counts()[DONE] == 1
+
+
+def test_fail_retries_with_delay_until_attempts_exhausted(queue):
+    queue.enqueue("sheet1", "main", max_attempts=2)
+
+    task = queue.claim("w1", 60)
+    assert queue.fail(task, "w1", "boom", retry_delay=3600)
+    assert queue.claim("w1", 60) is None
+    assert queue.counts()[QUEUED] == 1
+
+    queue.enqueue("other", "main")
+    task = queue.claim("w1", 60)
+    assert queue.fail(task, "w1", "boom")
+    assert queue.counts()[FAILED] == 1
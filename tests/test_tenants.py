@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from utils.tenants import JOB_NAMES, load_tenants
+
+TENANT = {"name": "ip-ivanov", "spreadsheet": "Остатки", "google_credentials": "cred.json", "moysklad_token": "t"}
+
+
+def write_tenants(tmp_path, *tenants):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps({"tenants": list(tenants)}), encoding="utf-8")
+    return str(path)
+
+
+def test_jobs_default_to_nightly(tmp_path):
+    tenant, = load_tenants(None, write_tenants(tmp_path, TENANT))
+
+    assert tenant.jobs == ("nightly",)
+    assert set(tenant.jobs) <= set(JOB_NAMES)
+
+
+def test_unknown_job_is_rejected(tmp_path):
+    path = write_tenants(tmp_path, dict(TENANT, jobs=["sheet1", "sheet9"]))
+
+    with pytest.raises(ValueError, match="sheet9"):
+        load_tenants(None, path)
+
+
+def test_cli_choices_come_from_job_names():
+    import cli
+
+    assert cli.JOB_NAMES is JOB_NAMES
+
+
+def test_schedule_per_job(tmp_path):
+    path = write_tenants(tmp_path, dict(TENANT, jobs=["sheet1", "sheet3_products", "sheet3"],
+                                        schedule={"sheet1": "00:10", "sheet3": "00:25"}),
+                         dict(TENANT, name="ooo-romashka", schedule="01:10"))
+    staggered, shared = load_tenants(None, path)
+
+    assert [staggered.schedule_for(job) for job in staggered.jobs] == ["00:10", "00:10", "00:25"]
+    assert shared.schedule_for("nightly") == "01:10"
+
+
+def test_schedule_for_unknown_job_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="sheet9"):
+        load_tenants(None, write_tenants(tmp_path, dict(TENANT, schedule={"sheet9": "00:10"})))
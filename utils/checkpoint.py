@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+
+
+def make_run_key(*parts) -> str:
+    """Строит ключ запуска из параметров загрузки (даты, списки кодов/href'ов)"""
+    normalized = []
+    for part in parts:
+        if isinstance(part, (list, tuple, set, frozenset)):
+            part = ",".join(sorted(str(item) for item in part))
+        normalized.append(str(part))
+    return hashlib.sha1("|".join(normalized).encode()).hexdigest()[:16]
+
+
+def write_json_atomic(path: str, data, mode: Optional[int] = None):
+    """
+    Записывает JSON во временный файл и атомарно заменяет им path.
+    mode - права нового файла (например, 0o600 для секретов), файл создается сразу с ними.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if mode is None:
+        f = open(tmp_path, "w", encoding="utf-8")
+    else:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        f = os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode), "w", encoding="utf-8")
+    with f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class CheckpointStore:
+    """
+    Хранит прогресс длинных загрузок (пройденные страницы, дни, батчи) и частичные
+    агрегаты в JSON-файлах, чтобы повторный или перезапущенный запуск продолжил
+    с места остановки. Контрольная точка привязана к задаче и ключу запуска:
+    запуск с другими параметрами (например, на следующий день) начинается заново.
+    """
+
+    def __init__(self, directory: str = CHECKPOINT_DIR, min_interval: float = 5.0):
+        """
+        Args:
+            directory: Каталог для файлов контрольных точек
+            min_interval: Минимальный интервал между записями одной точки, секунды
+        """
+        self.directory = directory
+        self.min_interval = min_interval
+        self._last_saved: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job: str) -> str:
+        return os.path.join(self.directory, f"{job}.json")
+
+    def load(self, job: str, run_key: str) -> Optional[Dict]:
+        """Возвращает сохраненное состояние или None, если точки для этого запуска нет"""
+        path = self._path(job)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать контрольную точку %s: %s", path, e)
+            return None
+
+        if checkpoint.get("run_key") != run_key:
+            return None
+        logger.info("Найдена контрольная точка %s от %s", job, checkpoint.get("updated"))
+        return checkpoint.get("state")
+
+    def save(self, job: str, run_key: str, state: Dict, force: bool = False):
+        """
+        Атомарно сохраняет состояние. Без force запись пропускается, если
+        предыдущая была меньше min_interval секунд назад.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_saved.get(job, float("-inf")) < self.min_interval:
+                return
+            self._last_saved[job] = now
+
+            write_json_atomic(self._path(job), {
+                "job": job,
+                "run_key": run_key,
+                "updated": datetime.now().isoformat(timespec="seconds"),
+                "state": state
+            })
+
+    def clear(self, job: str):
+        """Удаляет контрольную точку после успешного завершения загрузки"""
+        with self._lock:
+            self._last_saved.pop(job, None)
+            try:
+                os.remove(self._path(job))
+            except FileNotFoundError:
+                pass
+
+
+class StateStore:
+    """
+    Состояние успешных запусков (водяные знаки, служебные агрегаты), которое
+    должно переживать перезапуск процесса. Одно JSON-значение на имя.
+    """
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"state-{name}.json")
+
+    def load(self, name: str) -> Optional[Dict]:
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать состояние %s: %s", name, e)
+            return None
+
+    def save(self, name: str, state: Dict):
+        write_json_atomic(self._path(name), state)
+
+    def clear(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
@@ -1,26 +1,142 @@
-from datetime import datetime, timedelta
+import logging
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Форматы дат, используемые в проекте
+MOMENT_FORMAT = "%Y-%m-%d %H:%M:%S"   # moment МойСклад (дробная часть секунд отбрасывается)
+ISO_DAY_FORMAT = "%Y-%m-%d"            # день в фильтрах API и ключах отчетов
+SHEET_DATE_FORMAT = "%d.%m.%Y"         # заголовки листов
+
+# Порядковый номер дня для пустых и неразборчивых дат в пакетном преобразовании
+NO_DATE = -1
+
+_CACHE_SIZE = 4096
+
 
 def get_current_day_date_range() -> tuple:
     today = datetime.today()
     start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = (start_of_day - timedelta(days=91)).replace(hour=23, minute=59, second=59, microsecond=999999)
-    return start_of_day.strftime("%Y-%m-%d %H:%M:%S"), end_of_day.strftime("%Y-%m-%d %H:%M:%S") 
+    return start_of_day.strftime("%Y-%m-%d %H:%M:%S"), end_of_day.strftime("%Y-%m-%d %H:%M:%S")
 
 def convert_date_formats(date_str: str, from_format: str, to_format: str) -> str:
     """
     Конвертирует дату из одного формата в другой.
-    
+
     Args:
         date_str (str): Строка с датой
         from_format (str): Исходный формат (например, '%d.%m.%Y')
         to_format (str): Целевой формат (например, '%Y-%m-%d')
-    
+
     Returns:
         str: Дата в новом формате
     """
     try:
-        date_obj = datetime.strptime(date_str, from_format)
-        return date_obj.strftime(to_format)
+        return _convert(date_str, from_format, to_format)
     except ValueError as e:
-        print(f"Ошибка преобразования даты {date_str}: {e}")
-        return None 
\ No newline at end of file
+        logger.warning("Ошибка преобразования даты %s: %s", date_str, e)
+        return None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _convert(date_str: str, from_format: str, to_format: str) -> str:
+    return datetime.strptime(date_str, from_format).strftime(to_format)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _parse_day(key: str, sheet_format: bool) -> int:
+    if sheet_format:
+        return datetime.strptime(key, SHEET_DATE_FORMAT).toordinal()
+    return date.fromisoformat(key).toordinal()
+
+
+def day_ordinal(value: Optional[str], default: Optional[int] = None) -> Optional[int]:
+    """
+    Порядковый номер дня (date.toordinal) для даты листа "dd.mm.yyyy",
+    дня "YYYY-MM-DD" или moment МойСклад "YYYY-MM-DD HH:MM:SS.fff".
+
+    Разбор кэшируется по дате без времени, поэтому moment всех заказов за день
+    разбираются один раз.
+
+    Args:
+        value: Строка с датой (None - как пустая строка)
+        default: Значение для пустой или неразборчивой строки
+
+    Returns:
+        int: Порядковый номер дня
+    """
+    if not value:
+        return default
+    value = value.strip()
+    sheet_format = "." in value[:3]
+    try:
+        return _parse_day(value if sheet_format else value[:10], sheet_format)
+    except ValueError:
+        return default
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def format_day(ordinal: int, fmt: str = SHEET_DATE_FORMAT) -> str:
+    """Строка дня по порядковому номеру, по умолчанию в формате листов"""
+    return date.fromordinal(ordinal).strftime(fmt)
+
+
+def parse_sheet_date(value: str) -> Optional[date]:
+    """Дата из ячейки листа "dd.mm.yyyy", None для пустой или неразборчивой ячейки"""
+    ordinal = day_ordinal(value)
+    return date.fromordinal(ordinal) if ordinal is not None else None
+
+
+def moment_to_sheet_date(moment: str) -> Optional[str]:
+    """moment МойСклад -> дата листа "dd.mm.yyyy", None если moment не разобран"""
+    ordinal = day_ordinal(moment)
+    return format_day(ordinal) if ordinal is not None else None
+
+
+def shift_date(value: str, days: int, fmt: str = SHEET_DATE_FORMAT) -> str:
+    """
+    Сдвигает дату на days дней.
+
+    Raises:
+        ValueError: если дата не разобрана
+    """
+    ordinal = day_ordinal(value)
+    if ordinal is None:
+        raise ValueError(f"Неверная дата: {value!r}")
+    return format_day(ordinal + days, fmt)
+
+
+def today_ordinal() -> int:
+    return date.today().toordinal()
+
+
+def day_ordinals(values: Sequence[str], default: int = NO_DATE) -> np.ndarray:
+    """
+    Пакетное преобразование строк с датами в порядковые номера дней.
+
+    Каждая уникальная строка разбирается один раз (np.unique), результат
+    раскладывается по исходным позициям одной операцией индексации.
+
+    Args:
+        values: Строки в любом из форматов day_ordinal
+        default: Номер для пустых и неразборчивых строк
+
+    Returns:
+        np.ndarray: Массив int64 той же длины
+    """
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    unique, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    ordinals = np.fromiter((day_ordinal(value, default) for value in unique.tolist()),
+                           dtype=np.int64, count=len(unique))
+    return ordinals[inverse.reshape(-1)]
+
+
+def format_days(ordinals: Iterable[int], fmt: str = SHEET_DATE_FORMAT) -> List[str]:
+    """Пакетное форматирование порядковых номеров дней, NO_DATE -> пустая строка"""
+    return [format_day(ordinal, fmt) if ordinal != NO_DATE else "" for ordinal in map(int, ordinals)]
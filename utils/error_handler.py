@@ -1,3 +1,8 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
 def print_api_errors(response):
     try:
         error_data = response.json()
@@ -7,10 +12,8 @@ def print_api_errors(response):
                 error_message = error.get("error", "Неизвестная ошибка")
                 code = error.get("code", "Нет кода ошибки")
                 more_info = error.get("moreInfo", "Нет дополнительной информации")
-                print(f"Ошибка: {error_message}")
-                print(f"Код: {code}")
-                print(f"Подробнее: {more_info}\n")
+                logger.error("Ошибка: %s. Код: %s. Подробнее: %s", error_message, code, more_info)
         else:
-            print(f"HTTP Ошибка: {response.status_code} - {response.text}")
+            logger.error("HTTP Ошибка: %s - %s", response.status_code, response.text)
     except ValueError:
-        print(f"HTTP Ошибка: {response.status_code} - {response.text}") 
\ No newline at end of file
+        logger.error("HTTP Ошибка: %s - %s", response.status_code, response.text)
@@ -0,0 +1,400 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from utils.metrics import metrics
+from utils.rate_limiter import get_google_limiter
+
+# Файл для спанов в формате OpenTelemetry (JSON Lines), пустое значение - не писать
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Сколько последних запросов хранить для разбора
+RECENT_REQUESTS = 10000
+# Сколько строк таблицы сериализовать для оценки объема запроса к Sheets API
+PAYLOAD_SAMPLE_ROWS = 50
+
+MOYSKLAD = "moysklad"
+SHEETS = "sheets"
+
+_UUID_RE = re.compile(r"/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_FILTER_OPERATORS = ("<=", ">=", "!=", "=", "<", ">", "~")
+# Значения этих параметров не зависят от данных и показываются в форме запроса
+_SHAPE_VALUES = ("expand", "groupBy", "limit")
+
+
+class RequestRecord(NamedTuple):
+    job: str
+    service: str
+    endpoint: str
+    method: str
+    params: str
+    status: int
+    bytes: int
+    latency: float
+    retries: int
+    rate_limit_wait: float
+    error: Optional[str]
+    start_ns: int
+
+
+class Span:
+    """Спан в терминах OpenTelemetry: задача (INTERNAL) или запрос (CLIENT)"""
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: str, parent: "Span" = None, start_ns: int = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def to_json(self) -> Dict:
+        data = {
+            "traceId": self.trace_id, "spanId": self.span_id, "name": self.name, "kind": self.kind,
+            "startTimeUnixNano": self.start_ns, "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        return data
+
+
+def endpoint_name(url: str) -> str:
+    """Шаблон эндпоинта МойСклад: путь после /api/remap/1.2/, идентификаторы заменены на {id}"""
+    path = url.split("?")[0]
+    if "/api/remap/1.2/" in path:
+        path = path.split("/api/remap/1.2/", 1)[1]
+    return _UUID_RE.sub("/{id}", path).strip("/")
+
+
+def params_shape(params: Optional[Dict]) -> str:
+    """
+    Форма параметров запроса без данных: поля и операторы фильтра с количеством
+    повторов, значения только у expand/groupBy/limit.
+    Например: "expand=positions;filter=moment<=,moment>=,product=x50;limit=100;offset"
+    """
+    if not params:
+        return ""
+    parts = []
+    for key in sorted(params):
+        value = params[key]
+        if key == "filter":
+            conditions = {}
+            for condition in str(value).split(";"):
+                for operator in _FILTER_OPERATORS:
+                    field, sep, _ = condition.partition(operator)
+                    if sep:
+                        name = f"{field}{operator}"
+                        conditions[name] = conditions.get(name, 0) + 1
+                        break
+            shape = ",".join(name if count == 1 else f"{name}x{count}" for name, count in conditions.items())
+            parts.append(f"filter={shape}")
+        elif key in _SHAPE_VALUES:
+            parts.append(f"{key}={value}")
+        else:
+            parts.append(key)
+    return ";".join(parts)
+
+
+def _json_size(values) -> int:
+    try:
+        return len(json.dumps(values, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def payload_size(values) -> int:
+    """
+    Размер значений в JSON, байт (оценка объема запроса к Sheets API).
+    Таблицу (список строк) длиннее PAYLOAD_SAMPLE_ROWS строк не сериализуем целиком:
+    размер выборки равномерно расположенных строк умножается на число строк.
+    """
+    if values is None:
+        return 0
+    if isinstance(values, list) and values and all(isinstance(item, dict) for item in values[:1]):
+        # batch_update: [{"range": ..., "values": [[...]]}, ...]
+        return sum(payload_size(item.get("values")) + _json_size(item.get("range")) for item in values)
+    if isinstance(values, list) and len(values) > PAYLOAD_SAMPLE_ROWS:
+        step = len(values) / PAYLOAD_SAMPLE_ROWS
+        sample = [values[int(i * step)] for i in range(PAYLOAD_SAMPLE_ROWS)]
+        return _json_size(sample) * len(values) // PAYLOAD_SAMPLE_ROWS
+    return _json_size(values)
+
+
+class Instrumentation:
+    """
+    Сбор статистики запросов к МойСклад и Google Sheets. Запросы агрегируются по
+    задаче (имя из job_span), сервису и эндпоинту; последние запросы хранятся целиком.
+    Если задан trace_file, задачи и запросы пишутся в него спанами OpenTelemetry.
+    """
+
+    def __init__(self, trace_file: str = TRACE_FILE, recent: int = RECENT_REQUESTS):
+        self.trace_file = trace_file
+        self.recent = deque(maxlen=recent)
+        self._stats: Dict[tuple, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- задачи ---
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_span(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def current_job(self) -> str:
+        span = self.current_span()
+        return span.name if span else ""
+
+    @contextmanager
+    def job_span(self, name: str, parent: Span = None):
+        """
+        Задача, к которой относятся запросы текущего потока. parent связывает
+        задачу, выполняемую в другом потоке, с запустившей ее задачей.
+        """
+        span = Span(name, "INTERNAL", parent or self.current_span())
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            span.end_ns = time.time_ns()
+            self._export(span)
+
+    # --- запросы ---
+
+    def record_request(self, service: str, endpoint: str, method: str = "GET", params: str = "", status: int = 200,
+                       nbytes: int = 0, latency: float = 0.0, retries: int = 0, rate_limit_wait: float = 0.0,
+                       error: str = None, start_ns: int = None):
+        """Учитывает один запрос (вместе с его повторами)"""
+        job = self.current_job()
+        start_ns = start_ns or time.time_ns() - int((latency + rate_limit_wait) * 1e9)
+        record = RequestRecord(job, service, endpoint, method, params, status, nbytes, latency, retries,
+                               rate_limit_wait, error, start_ns)
+        key = (job, service, endpoint)
+        with self._lock:
+            self.recent.append(record)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {"requests": 0, "errors": 0, "bytes": 0, "latency": 0.0,
+                                            "max_latency": 0.0, "retries": 0, "rate_limit_wait": 0.0}
+            stats["requests"] += 1
+            stats["errors"] += 1 if error or status >= 400 else 0
+            stats["bytes"] += nbytes
+            stats["latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            stats["retries"] += retries
+            stats["rate_limit_wait"] += rate_limit_wait
+
+        metrics.inc("requests_total", service=service, endpoint=endpoint, status="error" if error else status)
+        metrics.observe("request_duration_seconds", latency, service=service, endpoint=endpoint)
+        if nbytes:
+            metrics.inc("request_bytes_total", nbytes, service=service, endpoint=endpoint)
+        if retries:
+            metrics.inc("request_retries_total", retries, service=service, endpoint=endpoint)
+        if rate_limit_wait:
+            metrics.inc("rate_limit_wait_seconds_total", rate_limit_wait, service=service)
+
+        if self.trace_file:
+            span = Span(f"{service} {method} {endpoint}", "CLIENT", self.current_span(), start_ns)
+            span.end_ns = start_ns + int((latency + rate_limit_wait) * 1e9)
+            span.attributes = {"service": service, "endpoint": endpoint, "method": method, "params": params,
+                               "status": status, "bytes": nbytes, "retries": retries,
+                               "rate_limit_wait_s": round(rate_limit_wait, 4)}
+            span.error = error
+            self._export(span)
+
+    def _export(self, span: Span):
+        if not self.trace_file:
+            return
+        line = json.dumps(span.to_json(), ensure_ascii=False)
+        with self._lock:
+            with open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    # --- отчеты ---
+
+    def summary(self, job: str = None) -> List[Dict]:
+        """
+        Статистика по задаче job (вместе с ее подзадачами "job.*") или по всем задачам,
+        отсортированная по суммарному времени запросов.
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        rows = []
+        for (job_name, service, endpoint), stats in items:
+            if job is not None and job_name != job and not job_name.startswith(f"{job}."):
+                continue
+            rows.append({"job": job_name, "service": service, "endpoint": endpoint, **stats})
+        rows.sort(key=lambda row: row["latency"] + row["rate_limit_wait"], reverse=True)
+        return rows
+
+    def format_summary(self, job: str = None) -> str:
+        """Таблица статистики запросов для вывода в лог"""
+        rows = self.summary(job)
+        if not rows:
+            return f"Запросов не было{f' в задаче {job}' if job else ''}"
+        lines = [f"{'задача':<28} {'сервис':<9} {'эндпоинт':<40} {'запр.':>6} {'ош.':>4} {'повт.':>5} "
+                 f"{'МБ':>7} {'сек':>8} {'макс':>6} {'лимит':>7}"]
+        for row in rows:
+            lines.append(f"{row['job'][:28]:<28} {row['service']:<9} {row['endpoint'][:40]:<40} "
+                         f"{row['requests']:>6} {row['errors']:>4} {row['retries']:>5} "
+                         f"{row['bytes'] / 1024 / 1024:>7.2f} {row['latency']:>8.2f} {row['max_latency']:>6.2f} "
+                         f"{row['rate_limit_wait']:>7.2f}")
+        total_requests = sum(row["requests"] for row in rows)
+        total_latency = sum(row["latency"] for row in rows)
+        total_wait = sum(row["rate_limit_wait"] for row in rows)
+        lines.append(f"Итого: {total_requests} запросов, {total_latency:.1f} с в запросах, "
+                     f"{total_wait:.1f} с ожидания лимитов")
+        return "\n".join(lines)
+
+    def reset(self, job: str = None):
+        """Сбрасывает статистику задачи job (с подзадачами) или всю"""
+        with self._lock:
+            if job is None:
+                self._stats.clear()
+                self.recent.clear()
+                return
+            for key in [key for key in self._stats if key[0] == job or key[0].startswith(f"{job}.")]:
+                del self._stats[key]
+
+
+instrumentation = Instrumentation()
+
+
+# --- Google Sheets ---
+
+# Методы gspread, которые обращаются к API: {метод: (тип, аргумент со значениями)}
+_WORKSHEET_METHODS = {
+    "get_all_values": ("read", None), "get_all_records": ("read", None), "get": ("read", None),
+    "get_values": ("read", None), "batch_get": ("read", None), "col_values": ("read", None),
+    "row_values": ("read", None), "cell": ("read", None), "range": ("read", None), "acell": ("read", None),
+    "update": ("write", "values"), "update_cell": ("write", "value"), "update_cells": ("write", "cell_list"),
+    "batch_update": ("write", "data"), "batch_clear": ("write", None), "clear": ("write", None),
+    "append_row": ("write", "values"), "append_rows": ("write", "values"), "format": ("write", None),
+}
+
+
+def _written_values(method: str, args: tuple, kwargs: Dict):
+    """Значения, отправляемые методом записи (для оценки объема запроса)"""
+    if method == "update":
+        values = kwargs.get("values", args[0] if args else None)
+        if isinstance(values, str):  # старый порядок аргументов update(range_name, values)
+            values = kwargs.get("range_name", args[1] if len(args) > 1 else None)
+        return values
+    if method == "update_cells":
+        cells = kwargs.get("cell_list", args[0] if args else [])
+        return [[cell.row, cell.col, cell.value] for cell in cells]
+    if method == "update_cell":
+        return kwargs.get("value", args[2] if len(args) > 2 else None)
+    if method == "batch_update":
+        return kwargs.get("data", args[0] if args else None)
+    return kwargs.get("values", args[0] if args else None)
+
+
+def _sheets_call(func, service_endpoint: str, method: str, kind: str, args: tuple, kwargs: Dict):
+    start_ns = time.time_ns()
+    # Квота Sheets API общая для всех задач и организаций процесса
+    limiter = get_google_limiter(kind)
+    waited = limiter.acquire() if limiter else 0.0
+    started = time.monotonic()
+    status, error, result = 200, None, None
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except Exception as e:
+        response = getattr(e, "response", None)
+        status = getattr(response, "status_code", None) or 500
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        latency = time.monotonic() - started
+        nbytes = payload_size(_written_values(method, args, kwargs)) if kind == "write" else \
+            (payload_size(result) if isinstance(result, list) else 0)
+        instrumentation.record_request(SHEETS, service_endpoint, kind, "", status, nbytes, latency,
+                                       rate_limit_wait=waited, error=error, start_ns=start_ns)
+
+
+class InstrumentedWorksheet:
+    """Обертка gspread.Worksheet, учитывающая каждый вызов API в instrumentation"""
+
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name not in _WORKSHEET_METHODS or not callable(attr):
+            return attr
+        kind, _ = _WORKSHEET_METHODS[name]
+        endpoint = f"{self._worksheet.title}.{name}"
+
+        def call(*args, **kwargs):
+            return _sheets_call(attr, endpoint, name, kind, args, kwargs)
+        return call
+
+    def __repr__(self):
+        return f"InstrumentedWorksheet({self._worksheet!r})"
+
+
+class InstrumentedSpreadsheet:
+    """Обертка gspread.Spreadsheet: листы оборачиваются InstrumentedWorksheet, batch_update учитывается"""
+
+    def __init__(self, spreadsheet):
+        self._spreadsheet = spreadsheet
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
+
+    @property
+    def sheet1(self):
+        return InstrumentedWorksheet(_sheets_call(lambda: self._spreadsheet.sheet1, "spreadsheet.sheet1",
+                                                  "sheet1", "read", (), {}))
+
+    def worksheet(self, title: str):
+        return InstrumentedWorksheet(_sheets_call(self._spreadsheet.worksheet, "spreadsheet.worksheet",
+                                                  "worksheet", "read", (title,), {}))
+
+    def worksheets(self, *args, **kwargs):
+        worksheets = _sheets_call(self._spreadsheet.worksheets, "spreadsheet.worksheets", "worksheets", "read",
+                                  args, kwargs)
+        return [InstrumentedWorksheet(worksheet) for worksheet in worksheets]
+
+    def add_worksheet(self, *args, **kwargs):
+        return InstrumentedWorksheet(_sheets_call(self._spreadsheet.add_worksheet, "spreadsheet.add_worksheet",
+                                                  "add_worksheet", "write", args, kwargs))
+
+    def batch_update(self, body: Dict):
+        return _sheets_call(self._spreadsheet.batch_update, "spreadsheet.batch_update", "batch_update", "write",
+                            (body,), {})
+
+
+def instrument_spreadsheet(spreadsheet) -> InstrumentedSpreadsheet:
+    """Оборачивает таблицу gspread для учета запросов к Sheets API"""
+    if isinstance(spreadsheet, InstrumentedSpreadsheet):
+        return spreadsheet
+    return InstrumentedSpreadsheet(spreadsheet)
+
+
+def instrument_worksheet(worksheet) -> InstrumentedWorksheet:
+    """Оборачивает лист gspread для учета запросов к Sheets API"""
+    if isinstance(worksheet, InstrumentedWorksheet):
+        return worksheet
+    return InstrumentedWorksheet(worksheet)
@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from utils.instrumentation import instrumentation
+from utils.logging_config import job_context, job_summary
+from utils.metrics import metrics, record_job
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"  # Не выполнены зависимости
+OVERLAP = "overlap"  # Предыдущий запуск задачи еще выполняется
+
+
+class Job(NamedTuple):
+    name: str
+    func: Callable
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+
+class JobExecutor:
+    """
+    Выполняет задачи на ограниченном пуле потоков.
+
+    Задача с тем же именем не запускается повторно, пока предыдущий запуск
+    не завершился. Таймаут не отменяет задачу: поток Python нельзя прервать,
+    поэтому run_graph лишь перестает ее ждать. Задача продолжает работать (и,
+    например, писать в лист) параллельно со следующими задачами, а ее новые
+    запуски пропускаются, пока поток не завершится; позднее завершение
+    записывается в лог и в метрику job_late_completions_total.
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = "jobs"):
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._running = set()
+        self._timed_out: Dict[str, float] = {}  # задача -> время таймаута (monotonic)
+        self._lock = threading.Lock()
+
+    def is_running(self, name: str) -> bool:
+        with self._lock:
+            return name in self._running
+
+    def submit(self, name: str, func: Callable, *args, **kwargs) -> Optional[Future]:
+        """
+        Запускает задачу в пуле, не дожидаясь ее завершения.
+
+        Returns:
+            Future или None, если предыдущий запуск задачи еще не завершен
+        """
+        with self._lock:
+            if name in self._running:
+                timed_out = self._timed_out.get(name)
+                if timed_out is None:
+                    logger.warning("[%s] Задача '%s' еще выполняется, новый запуск пропущен", self.name, name)
+                else:
+                    logger.warning("[%s] Задача '%s' еще выполняется после таймаута (%.0f с назад), "
+                                   "новый запуск пропущен", self.name, name, time.monotonic() - timed_out)
+                metrics.inc("job_skipped_total", job=name)
+                return None
+            self._running.add(name)
+
+        # Запросы задачи учитываются в instrumentation как подзадача запустившей ее задачи
+        parent = instrumentation.current_span()
+        span_name = name if parent is None or name.startswith(f"{parent.name}.") else f"{parent.name}.{name}"
+
+        def run():
+            started = time.monotonic()
+            ok = False
+            metrics.set("job_running", 1, job=span_name)
+            try:
+                with instrumentation.job_span(span_name, parent):
+                    result = func(*args, **kwargs)
+                ok = True
+                return result
+            except Exception:
+                logger.exception("[%s] Ошибка в задаче '%s'", self.name, name)
+                raise
+            finally:
+                duration = time.monotonic() - started
+                record_job(span_name, duration, ok)
+                logger.info("[%s] Задача '%s' завершена за %.1f с", self.name, name, duration)
+                if parent is None:
+                    logger.info("%s", instrumentation.format_summary(name))
+                    logger.info("%s", job_summary(name, duration, ok))
+                    instrumentation.reset(name)
+                    job_context.reset(name)
+
+        try:
+            future = self._pool.submit(run)
+        except Exception:
+            with self._lock:
+                self._running.discard(name)
+            raise
+        future.add_done_callback(lambda _: self._release(name))
+        return future
+
+    def _release(self, name: str):
+        """Вызывается, когда поток задачи действительно завершился"""
+        with self._lock:
+            self._running.discard(name)
+            timed_out = self._timed_out.pop(name, None)
+        if timed_out is not None:
+            logger.warning("[%s] Задача '%s' завершилась через %.0f с после таймаута",
+                           self.name, name, time.monotonic() - timed_out)
+            metrics.inc("job_late_completions_total", job=name)
+            metrics.set("job_timed_out_running", 0, job=name)
+
+    def _mark_timed_out(self, name: str):
+        with self._lock:
+            if name not in self._running:
+                # Поток успел завершиться
+                return
+            self._timed_out[name] = time.monotonic()
+        metrics.inc("job_timeouts_total", job=name)
+        metrics.set("job_timed_out_running", 1, job=name)
+
+    def run_graph(self, jobs: Iterable[Job]) -> Dict[str, str]:
+        """
+        Выполняет набор задач с зависимостями и ждет их завершения.
+        Независимые задачи выполняются параллельно, задача запускается после
+        успешного завершения всех depends_on. Если зависимость завершилась с
+        ошибкой, по таймауту или не запущена, зависимые задачи пропускаются
+        (skipped). Задача, не уложившаяся в таймаут, не отменяется и продолжает
+        выполняться в пуле; если она еще выполняется, новый запуск не делается
+        (overlap).
+
+        Returns:
+            Dict[str, str]: {задача: ok | error | timeout | overlap | skipped}
+        """
+        jobs = {job.name: job for job in jobs}
+        for job in jobs.values():
+            for dep in job.depends_on:
+                if dep not in jobs:
+                    raise ValueError(f"Задача '{job.name}' зависит от неизвестной задачи '{dep}'")
+
+        status = {}
+        pending = dict(jobs)
+        running = {}  # future -> (job, deadline)
+
+        while pending or running:
+            progressed = False
+            for name, job in list(pending.items()):
+                deps = [status.get(dep) for dep in job.depends_on]
+                if any(dep is not None and dep != OK for dep in deps):
+                    status[name] = SKIPPED
+                    del pending[name]
+                    progressed = True
+                    logger.warning("[%s] Задача '%s' пропущена: зависимости не выполнены", self.name, name)
+                elif all(dep == OK for dep in deps):
+                    del pending[name]
+                    progressed = True
+                    future = self.submit(name, job.func)
+                    if future is None:
+                        status[name] = OVERLAP
+                        logger.warning("[%s] Задача '%s' не запущена: предыдущий запуск еще выполняется",
+                                       self.name, name)
+                        continue
+                    deadline = time.monotonic() + job.timeout if job.timeout else None
+                    running[future] = (job, deadline)
+
+            if not running:
+                if pending and not progressed:
+                    raise ValueError(f"Цикл зависимостей между задачами: {', '.join(pending)}")
+                continue
+
+            deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+            wait_timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(list(running), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                job, _ = running.pop(future)
+                status[job.name] = ERROR if future.exception() else OK
+
+            now = time.monotonic()
+            for future, (job, deadline) in list(running.items()):
+                if deadline is not None and now >= deadline and not future.done():
+                    running.pop(future)
+                    status[job.name] = TIMEOUT
+                    logger.error("[%s] Задача '%s' превысила таймаут %s с и продолжает выполняться",
+                                 self.name, job.name, job.timeout)
+                    self._mark_timed_out(job.name)
+
+        return status
+
+    def shutdown(self, wait_for_jobs: bool = True):
+        self._pool.shutdown(wait=wait_for_jobs)
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+from utils.instrumentation import instrumentation
+
+# Уровень логов: DEBUG выводит построчную отладку (заказы, позиции, остатки)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# text - строки для docker logs, json - по одному JSON-объекту на строку
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Из повторяющихся сообщений, помеченных SAMPLE, выводится одно из LOG_SAMPLE_EVERY
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(job)s] %(name)s: %(message)s"
+
+# extra для построчных сообщений в циклах: logger.debug("...", arg, extra=SAMPLE)
+SAMPLE = {"sample": True}
+
+
+class JobContextFilter(logging.Filter):
+    """
+    Добавляет в запись имя текущей задачи (instrumentation.current_job) и
+    считает предупреждения и ошибки по задачам для итоговой строки задачи.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.job = instrumentation.current_job() or "-"
+        if record.levelno >= logging.WARNING:
+            with self._lock:
+                counts = self.counts.setdefault(record.job, {})
+                counts[record.levelname] = counts.get(record.levelname, 0) + 1
+        return True
+
+    def job_counts(self, job: str) -> Dict[str, int]:
+        """Предупреждения и ошибки задачи job вместе с ее подзадачами "job.*" """
+        total = {}
+        with self._lock:
+            for name, counts in self.counts.items():
+                if name == job or name.startswith(f"{job}."):
+                    for level, count in counts.items():
+                        total[level] = total.get(level, 0) + count
+        return total
+
+    def reset(self, job: str):
+        with self._lock:
+            for name in [name for name in self.counts if name == job or name.startswith(f"{job}.")]:
+                del self.counts[name]
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает одно из every сообщений, помеченных extra=SAMPLE. Сообщения
+    считаются по логгеру и шаблону, поэтому аргументы не форматируются,
+    пока сообщение не прошло фильтр.
+    """
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every == 1 or not getattr(record, "sample", False):
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        return seen % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - один JSON-объект"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "job": getattr(record, "job", "-"),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+job_context = JobContextFilter()
+_handler = None
+
+
+def setup_logging(level: str = None, fmt: str = None, sample_every: int = None):
+    """
+    Настраивает корневой логгер: вывод в stdout, имя задачи в каждой записи,
+    прореживание построчных сообщений. Повторный вызов заменяет настройки.
+    """
+    global _handler
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.addFilter(job_context)
+    _handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY if sample_every is None else sample_every))
+    if (fmt or LOG_FORMAT) == "json":
+        _handler.setFormatter(JsonFormatter())
+    else:
+        _handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(_handler)
+    root.setLevel((level or LOG_LEVEL).upper())
+
+    # Отладка HTTP-клиентов не нужна даже при LOG_LEVEL=DEBUG
+    for name in ("urllib3", "google", "googleapiclient", "oauth2client"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def job_summary(job: str, duration: float, ok: bool) -> str:
+    """Итоговая строка задачи: статус, длительность, запросы к API, предупреждения и ошибки"""
+    rows = instrumentation.summary(job)
+    counts = job_context.job_counts(job)
+    return (f"job={job} status={'ok' if ok else 'error'} duration={duration:.1f}s "
+            f"requests={sum(row['requests'] for row in rows)} "
+            f"request_errors={sum(row['errors'] for row in rows)} "
+            f"retries={sum(row['retries'] for row in rows)} "
+            f"mb={sum(row['bytes'] for row in rows) / 1024 / 1024:.1f} "
+            f"request_s={sum(row['latency'] for row in rows):.1f} "
+            f"rate_limit_wait_s={sum(row['rate_limit_wait'] for row in rows):.1f} "
+            f"warnings={counts.get('WARNING', 0)} errors={counts.get('ERROR', 0) + counts.get('CRITICAL', 0)}")
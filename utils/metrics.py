@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+PREFIX = "moysklad_automation_"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (10, 30, 60, 300, 600, 1800, 3600, 7200, 14400)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в формате Prometheus: счетчики, значения и гистограммы с метками.
+    Все значения хранятся в памяти и накапливаются с момента запуска процесса.
+    """
+
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self._meta: Dict[str, Tuple[str, str, Sequence[float]]] = {}
+        self._values: Dict[str, Dict[tuple, object]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Sequence[float] = REQUEST_BUCKETS):
+        with self._lock:
+            self._meta[name] = (kind, help_text, tuple(buckets))
+            self._values.setdefault(name, {})
+
+    def _series(self, name: str, labels: Dict) -> tuple:
+        if name not in self._meta:
+            raise KeyError(f"Метрика '{name}' не описана")
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            key = self._series(name, labels)
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][self._series(name, labels)] = value
+
+    def get(self, name: str, **labels) -> float:
+        with self._lock:
+            value = self._values[name].get(self._series(name, labels), 0.0)
+            return value if not isinstance(value, list) else value[-1]
+
+    def values(self, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+        """Значения всех серий метрики (для гистограмм - количество наблюдений)"""
+        with self._lock:
+            return {labels: value if not isinstance(value, list) else value[-1]
+                    for labels, value in self._values[name].items()}
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            key = self._series(name, labels)
+            buckets = self._meta[name][2]
+            series = self._values[name]
+            state = series.get(key)
+            if state is None:
+                # Счетчики по корзинам, затем сумма и количество
+                state = series[key] = [0] * len(buckets) + [0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        """Текст для /metrics (Prometheus text exposition format 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in sorted(self._meta.items()):
+                full_name = self.prefix + name
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in sorted(self._values[name].items()):
+                    if kind != HISTOGRAM:
+                        lines.append(f"{full_name}{_labels_text(labels)} {_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, value):
+                        cumulative += count
+                        bucket_labels = _labels_text(labels, 'le="%s"' % _number(bound))
+                        lines.append(f"{full_name}_bucket{bucket_labels} {cumulative}")
+                    bucket_labels = _labels_text(labels, 'le="+Inf"')
+                    lines.append(f"{full_name}_bucket{bucket_labels} {value[-1]}")
+                    lines.append(f"{full_name}_sum{_labels_text(labels)} {_number(value[-2])}")
+                    lines.append(f"{full_name}_count{_labels_text(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("job_runs_total", COUNTER, "Завершенные запуски задач по статусу")
+metrics.describe("job_duration_seconds", HISTOGRAM, "Длительность задач, секунды", JOB_BUCKETS)
+metrics.describe("job_last_duration_seconds", GAUGE, "Длительность последнего запуска задачи, секунды")
+metrics.describe("job_last_run_timestamp_seconds", GAUGE, "Время завершения последнего запуска задачи (unix)")
+metrics.describe("job_last_success_timestamp_seconds", GAUGE, "Время последнего успешного запуска задачи (unix)")
+metrics.describe("job_running", GAUGE, "Задача выполняется (1) или нет (0)")
+metrics.describe("job_timeouts_total", COUNTER, "Задачи, превысившие таймаут (продолжают выполняться)")
+metrics.describe("job_timed_out_running", GAUGE, "Задача выполняется после таймаута (1) или нет (0)")
+metrics.describe("job_late_completions_total", COUNTER, "Задачи, завершившиеся после таймаута")
+metrics.describe("job_skipped_total", COUNTER, "Запуски, пропущенные из-за незавершенного предыдущего запуска")
+metrics.describe("requests_total", COUNTER, "Запросы к внешним API по сервису, эндпоинту и статусу")
+metrics.describe("request_duration_seconds", HISTOGRAM, "Длительность запросов к внешним API, секунды")
+metrics.describe("request_bytes_total", COUNTER, "Объем данных запросов к внешним API, байт")
+metrics.describe("request_retries_total", COUNTER, "Повторы запросов к внешним API")
+metrics.describe("rate_limit_wait_seconds_total", COUNTER, "Время ожидания лимитов API, секунды")
+metrics.describe("rows_processed_total", COUNTER, "Обработанные строки (заказы, строки листов)")
+metrics.describe("cache_requests_total", COUNTER, "Обращения к кэшам по результату (hit/miss)")
+metrics.describe("google_token_refreshes_total", COUNTER, "Обновления токена доступа Google")
+metrics.describe("moysklad_token_refreshes_total", COUNTER, "Получения токена доступа МойСклад (security/token)")
+metrics.describe("task_queue_tasks", GAUGE, "Задачи в очереди (utils.task_queue) по статусу")
+metrics.describe("task_queue_runs_total", COUNTER, "Задачи очереди, выполненные исполнителем, по результату")
+metrics.describe("scheduler_heartbeat_timestamp_seconds", GAUGE, "Последняя итерация цикла планировщика (unix)")
+metrics.describe("start_time_seconds", GAUGE, "Время запуска процесса (unix)")
+metrics.set("start_time_seconds", metrics.started)
+
+
+def record_job(name: str, duration: float, ok: bool):
+    """Учитывает завершенный запуск задачи"""
+    now = time.time()
+    metrics.inc("job_runs_total", job=name, status="ok" if ok else "error")
+    metrics.observe("job_duration_seconds", duration, job=name)
+    metrics.set("job_last_duration_seconds", duration, job=name)
+    metrics.set("job_last_run_timestamp_seconds", now, job=name)
+    metrics.set("job_running", 0, job=name)
+    if ok:
+        metrics.set("job_last_success_timestamp_seconds", now, job=name)
+
+
+def record_rows(kind: str, count: int):
+    """Учитывает обработанные строки вида kind"""
+    if count:
+        metrics.inc("rows_processed_total", count, kind=kind)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    """Учитывает попадания и промахи кэша"""
+    if hits:
+        metrics.inc("cache_requests_total", hits, cache=cache, result="hit")
+    if misses:
+        metrics.inc("cache_requests_total", misses, cache=cache, result="miss")
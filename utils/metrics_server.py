@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Порт HTTP-сервера метрик (в docker-compose 5000 -> 9100), 0 - не запускать.
+# Порт непривилегированный: процессу не нужны права root
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+# Если цикл планировщика не отмечался дольше этого времени, /healthz отвечает 503
+HEALTH_MAX_HEARTBEAT_AGE = float(os.getenv("HEALTH_MAX_HEARTBEAT_AGE", "300"))
+# До первой отметки цикла /healthz отвечает 503; в первые HEALTH_STARTUP_GRACE
+# секунд после запуска процесса - 200 со статусом "starting"
+HEALTH_STARTUP_GRACE = float(os.getenv("HEALTH_STARTUP_GRACE", "0"))
+
+
+def health() -> Tuple[bool, Dict]:
+    """Состояние процесса для /healthz"""
+    now = time.time()
+    heartbeat = metrics.get("scheduler_heartbeat_timestamp_seconds")
+    heartbeat_age = now - heartbeat if heartbeat else None
+    uptime = now - metrics.started
+    if heartbeat_age is None:
+        healthy = uptime <= HEALTH_STARTUP_GRACE
+        status = "starting"
+    else:
+        healthy = heartbeat_age <= HEALTH_MAX_HEARTBEAT_AGE
+        status = "ok" if healthy else "stale"
+
+    jobs = {}
+    for metric, field in (("job_last_run_timestamp_seconds", "last_run"),
+                          ("job_last_success_timestamp_seconds", "last_success"),
+                          ("job_last_duration_seconds", "last_duration"),
+                          ("job_running", "running")):
+        for labels, value in metrics.values(metric).items():
+            jobs.setdefault(dict(labels)["job"], {})[field] = value
+
+    return healthy, {
+        "status": status,
+        "uptime_seconds": round(uptime, 1),
+        "scheduler_heartbeat_age_seconds": round(heartbeat_age, 1) if heartbeat_age is not None else None,
+        "jobs": jobs,
+    }
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics - метрики Prometheus, /healthz - состояние процесса"""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._send(200, metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/healthz":
+            healthy, data = health()
+            self._send(200 if healthy else 503, json.dumps(data, ensure_ascii=False), "application/json")
+        else:
+            self._send(404, "not found", "text/plain; charset=utf-8")
+
+    def _send(self, status: int, body: str, content_type: str):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Запросы Prometheus каждые несколько секунд не должны засорять логи
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Запускает HTTP-сервер метрик в фоновом потоке.
+
+    Returns:
+        ThreadingHTTPServer или None, если сервер отключен (port=0) или порт занят
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.error("Не удалось запустить сервер метрик на порту %s: %s", port, e)
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("Сервер метрик запущен: http://%s:%s/metrics, /healthz", host, port)
+    return server
@@ -0,0 +1,148 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.instrumentation import instrumentation
+from utils.job_executor import ERROR, OVERLAP, SKIPPED, TIMEOUT, Job, JobExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """
+    DAG стадий обработки. Каждая стадия выполняется один раз за запуск,
+    ее результат передается всем зависимым стадиям позиционными аргументами
+    в порядке, указанном в requires.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self._stages: Dict[str, Callable] = {}
+        self._requires: Dict[str, List[str]] = {}
+        self._timeouts: Dict[str, Optional[float]] = {}
+        self._retries: Dict[str, int] = {}
+        self.retry_delay = 60.0
+        self.errors: Dict[str, Exception] = {}
+
+    def add_stage(self, name: str, func: Callable, requires: Iterable[str] = (), timeout: Optional[float] = None,
+                  retries: int = 0):
+        """
+        Добавляет стадию name, зависящую от результатов стадий requires.
+        При ошибке стадия повторяется до retries раз с паузой retry_delay секунд.
+        """
+        if name in self._stages:
+            raise ValueError(f"Стадия '{name}' уже добавлена в {self.name}")
+        self._stages[name] = func
+        self._requires[name] = list(requires)
+        self._timeouts[name] = timeout
+        self._retries[name] = retries
+        return self
+
+    def dependencies(self, name: str) -> List[str]:
+        return list(self._requires[name])
+
+    def order(self) -> List[str]:
+        """Топологический порядок стадий (в порядке добавления среди независимых)"""
+        for name, requires in self._requires.items():
+            for dep in requires:
+                if dep not in self._stages:
+                    raise ValueError(f"Стадия '{name}' зависит от неизвестной стадии '{dep}'")
+
+        ordered = []
+        visiting = set()
+        done = set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Цикл зависимостей в {self.name} на стадии '{name}'")
+            visiting.add(name)
+            for dep in self._requires[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(name)
+
+        for name in self._stages:
+            visit(name)
+        return ordered
+
+    def run_stage(self, name: str, results: Dict[str, Any]) -> Any:
+        """Выполняет одну стадию на уже готовых результатах зависимостей"""
+        args = [results[dep] for dep in self._requires[name]]
+        attempt = 0
+        while True:
+            try:
+                return self._stages[name](*args)
+            except Exception as e:
+                if attempt >= self._retries[name]:
+                    raise
+                attempt += 1
+                logger.warning("[%s] Стадия '%s' завершилась ошибкой (%s), повтор %d/%d через %.0f с",
+                               self.name, name, e, attempt, self._retries[name], self.retry_delay)
+                time.sleep(self.retry_delay)
+
+    def run(self, executor: Optional[JobExecutor] = None) -> Dict[str, Any]:
+        """
+        Выполняет все стадии. Ошибка стадии не останавливает независимые от нее
+        стадии, зависимые стадии пропускаются. Ошибки сохраняются в self.errors.
+        Если передан executor, независимые стадии выполняются параллельно
+        с учетом таймаутов стадий. Таймаут не отменяет стадию: она дорабатывает
+        в пуле (и может писать в лист) параллельно со следующими стадиями, ее
+        результат не используется, зависимые стадии пропускаются. Стадия, не
+        запущенная потому, что ее предыдущий запуск еще выполняется, тоже
+        попадает в self.errors.
+
+        Returns:
+            Dict[str, Any]: {стадия: результат} для успешно выполненных стадий
+        """
+        if executor is not None:
+            return self._run_parallel(executor)
+
+        results = {}
+        self.errors = {}
+
+        for name in self.order():
+            failed_deps = [dep for dep in self._requires[name] if dep not in results]
+            if failed_deps:
+                logger.warning("[%s] Стадия '%s' пропущена: не выполнены %s", self.name, name, ", ".join(failed_deps))
+                continue
+            try:
+                # В параллельном режиме задачу стадии учитывает JobExecutor
+                with instrumentation.job_span(f"{self.name}.{name}"):
+                    results[name] = self.run_stage(name, results)
+            except Exception as e:
+                logger.exception("[%s] Ошибка на стадии '%s'", self.name, name)
+                self.errors[name] = e
+
+        return results
+
+    def _run_parallel(self, executor: JobExecutor) -> Dict[str, Any]:
+        results = {}
+        self.errors = {}
+        prefix = f"{self.name}."
+
+        def make_job(name):
+            def run():
+                try:
+                    results[name] = self.run_stage(name, results)
+                except Exception as e:
+                    self.errors[name] = e
+                    raise
+            return Job(prefix + name, run, tuple(prefix + dep for dep in self._requires[name]), self._timeouts[name])
+
+        status = executor.run_graph([make_job(name) for name in self.order()])
+        for name in self.order():
+            job_status = status.get(prefix + name)
+            if job_status == TIMEOUT:
+                self.errors[name] = TimeoutError(f"Стадия '{name}' превысила таймаут")
+            elif job_status == ERROR and name not in self.errors:
+                self.errors[name] = RuntimeError(f"Стадия '{name}' завершилась с ошибкой")
+            elif job_status == OVERLAP:
+                self.errors[name] = RuntimeError(f"Стадия '{name}' пропущена: предыдущий запуск еще выполняется")
+            elif job_status == SKIPPED and not any(dep in self.errors for dep in self._requires[name]):
+                # Без ошибки в зависимостях пропуск иначе выглядел бы как успешное выполнение
+                self.errors[name] = RuntimeError(f"Стадия '{name}' пропущена")
+        # Стадии, не уложившиеся в таймаут, могли дописать результат позже
+        return {name: result for name, result in results.items() if name not in self.errors}
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class RateLimiter:
+    """
+    Ограничивает частоту и параллельность запросов: не более max_requests
+    запросов за скользящее окно period секунд и не более max_concurrent
+    одновременных запросов. Используется как контекстный менеджер.
+    """
+
+    def __init__(self, max_requests: int, period: float, max_concurrent: int = None):
+        self.max_requests = max_requests
+        self.period = period
+        self._timestamps = deque()
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.waited = 0.0  # Суммарное время ожидания, секунды
+
+    def acquire(self) -> float:
+        """Ждет разрешения на запрос. Возвращает время ожидания в секундах."""
+        started = time.monotonic()
+        if self._semaphore:
+            self._semaphore.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self.period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.max_requests:
+                    self._timestamps.append(now)
+                    waited = now - started
+                    self.waited += waited
+                    return waited
+                delay = self.period - (now - self._timestamps[0])
+            time.sleep(delay)
+
+    def release(self):
+        if self._semaphore:
+            self._semaphore.release()
+
+    def pause(self, seconds: float):
+        """Блокирует новые запросы на seconds секунд (после ответа 429)"""
+        with self._lock:
+            until = time.monotonic() + seconds - self.period
+            self._timestamps.clear()
+            self._timestamps.extend([until] * self.max_requests)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+# Лимиты МойСклад: 45 запросов за 3 секунды и 5 параллельных запросов на пользователя
+MOYSKLAD_MAX_REQUESTS = 45
+MOYSKLAD_PERIOD = 3.0
+MOYSKLAD_MAX_CONCURRENT = 5
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str) -> RateLimiter:
+    """Общий лимитер МойСклад для учетной записи (ключ - токен)"""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(MOYSKLAD_MAX_REQUESTS, MOYSKLAD_PERIOD, MOYSKLAD_MAX_CONCURRENT)
+            _limiters[key] = limiter
+        return limiter
+
+
+# Квота Sheets API на пользователя (сервисный аккаунт): 60 чтений и 60 записей в минуту.
+# Квота общая для всех организаций процесса, 0 - без ограничения
+GOOGLE_READS_PER_MINUTE = int(os.getenv("GOOGLE_READS_PER_MINUTE", "60"))
+GOOGLE_WRITES_PER_MINUTE = int(os.getenv("GOOGLE_WRITES_PER_MINUTE", "60"))
+GOOGLE_PERIOD = 60.0
+
+_google_limiters: Dict[str, Optional[RateLimiter]] = {}
+
+
+def get_google_limiter(kind: str) -> Optional[RateLimiter]:
+    """Общий лимитер запросов Sheets API вида kind (read/write), None если квота не ограничена"""
+    with _limiters_lock:
+        if kind not in _google_limiters:
+            limit = GOOGLE_WRITES_PER_MINUTE if kind == "write" else GOOGLE_READS_PER_MINUTE
+            _google_limiters[kind] = RateLimiter(limit, GOOGLE_PERIOD) if limit > 0 else None
+        return _google_limiters[kind]
@@ -0,0 +1,94 @@
+"""
+Таблицы символов процесса: href'ы, коды товаров и имена (статусы, каналы продаж)
+получают небольшие целочисленные ID при первом появлении. Агрегация ведется по
+ID, строки восстанавливаются только при записи результата.
+
+Таблица хранит только нормализованные значения, поэтому ее размер ограничен
+количеством разных сущностей, а не вариантов их href (?expand=... и т. п.).
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def _strip_query(href: str) -> str:
+    return href.split('?')[0]
+
+
+class SymbolTable:
+    """
+    Словарь строк: нормализованное значение -> ID. Одинаковые значения разделяют
+    один объект строки (canonical).
+
+    Таблица передается в другой процесс (pickle) без блокировки; ID переданной
+    таблицы переводятся в ID текущей методом translate.
+    """
+
+    def __init__(self, name: str, normalize: Callable[[str], str] = None):
+        self.name = name
+        self.normalize = normalize
+        self._ids: Dict[str, int] = {}
+        self._values: List[str] = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"name": self.name, "normalize": self.normalize, "values": list(self._values)}
+
+    def __setstate__(self, state):
+        self.name = state["name"]
+        self.normalize = state["normalize"]
+        self._values = state["values"]
+        self._ids = {value: symbol for symbol, value in enumerate(self._values)}
+        self._lock = threading.Lock()
+
+    def _key(self, value: str) -> str:
+        return self.normalize(value) if self.normalize else value
+
+    def intern(self, value: str) -> int:
+        """ID значения, при первом появлении значение добавляется в таблицу"""
+        key = self._key(value)
+        symbol = self._ids.get(key)
+        if symbol is not None:
+            return symbol
+        with self._lock:
+            symbol = self._ids.get(key)
+            if symbol is None:
+                symbol = self._ids[key] = len(self._values)
+                self._values.append(key)
+        return symbol
+
+    def get(self, value: str) -> Optional[int]:
+        """ID значения без добавления в таблицу"""
+        return self._ids.get(self._key(value))
+
+    def value(self, symbol: int) -> str:
+        return self._values[symbol]
+
+    def values(self, symbols: Iterable[int]) -> List[str]:
+        return [self._values[symbol] for symbol in symbols]
+
+    def canonical(self, value: Optional[str]) -> Optional[str]:
+        """Нормализованное значение, общее для всех его вхождений"""
+        if value is None:
+            return None
+        return self._values[self.intern(value)]
+
+    def translate(self, other: "SymbolTable") -> List[int]:
+        """ID этой таблицы для ID таблицы other (индекс списка - ID в other)"""
+        if other is self:
+            return list(range(len(self._values)))
+        return [self.intern(value) for value in other._values]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class Symbols:
+    """Таблицы символов процесса: href'ы, коды товаров, имена (каналы, статусы)"""
+
+    def __init__(self):
+        self.hrefs = SymbolTable("href", _strip_query)
+        self.codes = SymbolTable("code")
+        self.names = SymbolTable("name")
+
+
+symbols = Symbols()
@@ -0,0 +1,234 @@
+"""
+Очередь задач на SQLite: планировщик ставит задачи, процессы-исполнители
+(python cli.py worker) забирают их. Несколько исполнителей на одном хосте или
+в контейнерах с общим томом работают с одним файлом базы.
+
+- Аренда (lease): взятая задача принадлежит исполнителю до lease_expires,
+  исполнитель продлевает аренду, пока задача выполняется. Задача исполнителя,
+  который перестал продлевать аренду (упал, контейнер остановлен), возвращается
+  в очередь или, если попытки исчерпаны, завершается ошибкой.
+- Дедупликация: пока задача с тем же dedup_key ждет или выполняется, повторная
+  постановка возвращает существующую задачу.
+- Блокировки: задача перечисляет блокировки (листы, в которые она пишет).
+  Задача не берется, пока любая из ее блокировок занята другой задачей, поэтому
+  каждый лист одновременно обновляет не больше одной задачи.
+
+SQLite на сетевых файловых системах (NFS, SMB) блокировки не гарантирует,
+файл очереди должен лежать на локальном диске или томе Docker.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from utils.checkpoint import CHECKPOINT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Файл очереди. Пустое значение - планировщик выполняет задачи сам, без очереди
+TASK_QUEUE_PATH = os.getenv("TASK_QUEUE_PATH", "")
+# Файл очереди для исполнителей и постановки задач, если TASK_QUEUE_PATH не задан
+DEFAULT_TASK_QUEUE_PATH = os.path.join(CHECKPOINT_DIR, "tasks.sqlite3")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    locks TEXT NOT NULL DEFAULT '[]',
+    dedup_key TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_active_dedup ON tasks(dedup_key)
+    WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks(status, available_at);
+CREATE TABLE IF NOT EXISTS task_locks (
+    lock_key TEXT PRIMARY KEY,
+    task_id INTEGER NOT NULL
+);
+"""
+
+# Сколько ожидающих задач просматривается за одну попытку взять задачу
+_CLAIM_SCAN = 100
+
+
+class Task(NamedTuple):
+    id: int
+    job: str
+    tenant: str
+    payload: Dict
+    locks: Tuple[str, ...]
+    attempts: int
+    max_attempts: int
+
+
+class TaskQueue:
+    """Очередь задач в файле SQLite (см. описание модуля)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            # WAL: исполнители читают очередь, не блокируя запись
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи с самого начала (BEGIN IMMEDIATE)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(self, job: str, tenant: str, payload: Dict = None, locks: Iterable[str] = (),
+                dedup_key: str = None, max_attempts: int = 1, delay: float = 0.0) -> Tuple[int, bool]:
+        """
+        Ставит задачу в очередь.
+
+        Returns:
+            Tuple[int, bool]: (ID задачи, True - создана новая, False - такая задача уже ждет или выполняется)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tasks (job, tenant, payload, locks, dedup_key, status, max_attempts, "
+                "available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job, tenant, json.dumps(payload or {}, ensure_ascii=False), json.dumps(sorted(set(locks))),
+                 dedup_key, QUEUED, max_attempts, now + delay, now))
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = conn.execute("SELECT id FROM tasks WHERE dedup_key = ? AND status IN (?, ?)",
+                               (dedup_key, QUEUED, RUNNING)).fetchone()
+            return row["id"], False
+
+    def _reap(self, conn: sqlite3.Connection, now: float) -> int:
+        """Возвращает в очередь задачи с истекшей арендой, задачи без попыток завершает ошибкой"""
+        expired = conn.execute("SELECT id, attempts, max_attempts, lease_owner FROM tasks "
+                               "WHERE status = ? AND lease_expires < ?", (RUNNING, now)).fetchall()
+        for row in expired:
+            conn.execute("DELETE FROM task_locks WHERE task_id = ?", (row["id"],))
+            if row["attempts"] >= row["max_attempts"]:
+                conn.execute("UPDATE tasks SET status = ?, finished_at = ?, error = ?, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ?",
+                             (FAILED, now, f"Аренда истекла у исполнителя {row['lease_owner']}", row["id"]))
+            else:
+                conn.execute("UPDATE tasks SET status = ?, available_at = ?, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ?", (QUEUED, now, row["id"]))
+            logger.warning("Аренда задачи %s у исполнителя %s истекла", row["id"], row["lease_owner"])
+        return len(expired)
+
+    def claim(self, owner: str, lease_seconds: float, jobs: Iterable[str] = None) -> Optional[Task]:
+        """
+        Берет самую раннюю готовую задачу, все блокировки которой свободны.
+
+        Args:
+            owner: Идентификатор исполнителя
+            lease_seconds: Срок аренды, секунды
+            jobs: Брать только задачи с этими именами
+
+        Returns:
+            Task или None, если подходящих задач нет
+        """
+        jobs = set(jobs) if jobs else None
+        now = time.time()
+        with self._transaction() as conn:
+            self._reap(conn, now)
+            held = {row["lock_key"] for row in conn.execute("SELECT lock_key FROM task_locks")}
+            rows = conn.execute("SELECT * FROM tasks WHERE status = ? AND available_at <= ? "
+                                "ORDER BY available_at, id LIMIT ?", (QUEUED, now, _CLAIM_SCAN)).fetchall()
+            for row in rows:
+                locks = tuple(json.loads(row["locks"]))
+                if (jobs is not None and row["job"] not in jobs) or held.intersection(locks):
+                    continue
+                conn.execute("UPDATE tasks SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                             "lease_expires = ? WHERE id = ?", (RUNNING, owner, now + lease_seconds, row["id"]))
+                conn.executemany("INSERT INTO task_locks (lock_key, task_id) VALUES (?, ?)",
+                                 [(lock, row["id"]) for lock in locks])
+                return Task(row["id"], row["job"], row["tenant"], json.loads(row["payload"]), locks,
+                            row["attempts"] + 1, row["max_attempts"])
+        return None
+
+    def extend(self, task: Task, owner: str, lease_seconds: float) -> bool:
+        """Продлевает аренду. False - аренда потеряна (истекла и задача передана другому)"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE tasks SET lease_expires = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                                  (time.time() + lease_seconds, task.id, RUNNING, owner))
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, owner: str) -> bool:
+        """Отмечает задачу выполненной и освобождает ее блокировки"""
+        return self._finish(task, owner, None, 0.0)
+
+    def fail(self, task: Task, owner: str, error: str, retry_delay: float = 60.0) -> bool:
+        """Возвращает задачу в очередь через retry_delay секунд или, если попытки исчерпаны, завершает ошибкой"""
+        return self._finish(task, owner, error, retry_delay)
+
+    def _finish(self, task: Task, owner: str, error: Optional[str], retry_delay: float) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM tasks WHERE id = ? AND status = ? "
+                               "AND lease_owner = ?", (task.id, RUNNING, owner)).fetchone()
+            if row is None:
+                logger.warning("Задача %s больше не принадлежит исполнителю %s, результат не сохранен", task.id, owner)
+                return False
+            conn.execute("DELETE FROM task_locks WHERE task_id = ?", (task.id,))
+            if error is None:
+                conn.execute("UPDATE tasks SET status = ?, finished_at = ?, error = NULL, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ?", (DONE, now, task.id))
+            elif row["attempts"] < row["max_attempts"]:
+                conn.execute("UPDATE tasks SET status = ?, available_at = ?, error = ?, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ?", (QUEUED, now + retry_delay, error, task.id))
+            else:
+                conn.execute("UPDATE tasks SET status = ?, finished_at = ?, error = ?, lease_owner = NULL, "
+                             "lease_expires = NULL WHERE id = ?", (FAILED, now, error, task.id))
+            return True
+
+    def counts(self) -> Dict[str, int]:
+        """Количество задач по статусам"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def recent(self, limit: int = 20) -> List[sqlite3.Row]:
+        with self._connect() as conn:
+            return conn.execute("SELECT id, job, tenant, status, attempts, lease_owner, created_at, finished_at, "
+                                "error FROM tasks ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def purge(self, older_than: float) -> int:
+        """Удаляет завершенные задачи старше older_than секунд"""
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM tasks WHERE status IN (?, ?) AND finished_at < ?",
+                                  (DONE, FAILED, time.time() - older_than))
+            return cursor.rowcount
@@ -0,0 +1,133 @@
+"""
+Организации (юрлица), которые обслуживает один процесс: у каждой свои учетные
+данные МойСклад, таблица Google и названия листов.
+
+Список читается из TENANTS_PATH (JSON). Если файла нет, используется одна
+организация "default" из config.py - как до появления нескольких организаций:
+с прежними именами задач и каталогом состояния.
+
+Пример config/tenants.json:
+    {"tenants": [
+        {"name": "ip-ivanov", "spreadsheet": "Остатки ИП Иванов", "google_credentials": "cred-bot.json",
+         "moysklad_credentials": "config/moysklad_ivanov.json"},
+        {"name": "ooo-romashka", "spreadsheet": "Остатки Ромашка", "google_credentials": "cred-bot.json",
+         "moysklad_token": "...", "sheets": {"sheet3": "Склад"}, "schedule": "01:10"},
+        {"name": "ooo-vasilek", "spreadsheet": "Остатки Василек", "google_credentials": "cred-bot.json",
+         "moysklad_token": "...", "jobs": ["sheet1", "sheet3_products", "sheet3"],
+         "schedule": {"sheet1": "00:10", "sheet3_products": "00:20", "sheet3": "00:25"}}
+    ]}
+
+"schedule" - время запуска всех задач организации или {задача: время}; задачи
+без своего времени запускаются в 00:10. Задачи одной организации с общим
+временем стартуют одновременно и делят квоту Google, поэтому задачам, которые
+пишут в один лист, стоит задать разное время (как 00:10/00:20/00:25 раньше).
+"""
+import json
+import logging
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.checkpoint import CHECKPOINT_DIR
+
+logger = logging.getLogger(__name__)
+
+TENANTS_PATH = os.getenv("TENANTS_PATH", "config/tenants.json")
+
+DEFAULT_TENANT = "default"
+
+# Задачи организации (поле jobs). Функции задач - sheet_processor.JOBS; имена
+# здесь, чтобы cli.py не импортировал sheet_processor ради списка задач
+JOB_NAMES = ("nightly", "sheet1", "sheet2", "sheet3_products", "sheet3", "sheet5")
+
+_TENANT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class SheetLayout(NamedTuple):
+    """Названия листов таблицы (Лист1 - всегда первый лист таблицы)"""
+    sheet2: str = "Лист2"
+    sheet3: str = "Лист6"
+    sheet5: str = "Лист5"
+
+
+class Tenant(NamedTuple):
+    name: str
+    spreadsheet: str
+    google_credentials: str
+    moysklad_credentials: Optional[str] = None
+    moysklad_token: Optional[str] = None
+    layout: SheetLayout = SheetLayout()
+    jobs: Tuple[str, ...] = ("nightly",)
+    schedule: str = "00:10"
+    job_schedules: Tuple[Tuple[str, str], ...] = ()  # (задача, время) - свое время задачи
+
+    def schedule_for(self, job: str) -> str:
+        """Время ежедневного запуска задачи (ЧЧ:ММ)"""
+        return dict(self.job_schedules).get(job, self.schedule)
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_TENANT
+
+    @property
+    def state_dir(self) -> str:
+        """Каталог контрольных точек и состояния (у default - общий, как раньше)"""
+        return CHECKPOINT_DIR if self.is_default else os.path.join(CHECKPOINT_DIR, self.name)
+
+    def job_name(self, job: str) -> str:
+        """Имя задачи в планировщике, метриках и логах"""
+        return job if self.is_default else f"{self.name}.{job}"
+
+
+def _tenant_from_json(item: Dict) -> Tenant:
+    name = item.get("name", "")
+    if not _TENANT_NAME.match(name):
+        raise ValueError(f"Недопустимое имя организации {name!r}: только латиница, цифры, '-' и '_'")
+    for field in ("spreadsheet", "google_credentials"):
+        if not item.get(field):
+            raise ValueError(f"У организации {name} не указано поле {field}")
+    if not item.get("moysklad_credentials") and not item.get("moysklad_token"):
+        raise ValueError(f"У организации {name} нет ни moysklad_credentials, ни moysklad_token")
+    unknown = set(item.get("sheets", {})) - set(SheetLayout._fields)
+    if unknown:
+        raise ValueError(f"У организации {name} неизвестные листы: {', '.join(sorted(unknown))}")
+    schedule = item.get("schedule", Tenant._field_defaults["schedule"])
+    job_schedules = schedule if isinstance(schedule, dict) else {}
+    unknown = (set(item.get("jobs", ())) | set(job_schedules)) - set(JOB_NAMES)
+    if unknown:
+        raise ValueError(f"У организации {name} неизвестные задачи: {', '.join(sorted(unknown))}")
+    return Tenant(
+        name=name,
+        spreadsheet=item["spreadsheet"],
+        google_credentials=item["google_credentials"],
+        moysklad_credentials=item.get("moysklad_credentials"),
+        moysklad_token=item.get("moysklad_token"),
+        layout=SheetLayout(**item.get("sheets", {})),
+        jobs=tuple(item.get("jobs", Tenant._field_defaults["jobs"])),
+        schedule=Tenant._field_defaults["schedule"] if job_schedules else schedule,
+        job_schedules=tuple(sorted(job_schedules.items())),
+    )
+
+
+def load_tenants(config, path: str = TENANTS_PATH) -> List[Tenant]:
+    """
+    Список организаций из path или одна организация из config.
+
+    Raises:
+        ValueError: если файл организаций некорректен
+    """
+    if not os.path.exists(path):
+        return [Tenant(DEFAULT_TENANT, config.SHEET_NAME, config.CREDENTIALS_PATH,
+                       moysklad_token=getattr(config, "MOYSKLAD_TOKEN", None) or None)]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tenants = [_tenant_from_json(item) for item in data.get("tenants", [])]
+    if not tenants:
+        raise ValueError(f"В {path} нет организаций")
+    names = [tenant.name for tenant in tenants]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Повторяющиеся имена организаций: {', '.join(duplicates)}")
+    logger.info("Загружено организаций: %s (%s)", len(tenants), ', '.join(names))
+    return tenants